@@ -0,0 +1,4 @@
+// Base URL of the Python ML service, shared by every backend caller
+const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5000';
+
+module.exports = { ML_SERVICE_URL };
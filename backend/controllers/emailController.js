@@ -1,8 +1,14 @@
 const EmailTemplate = require('../models/emailTemplateModel');
 const User = require('../models/userModel');
 const EmailHistory = require('../models/emailHistoryModel');
+const Product = require('../models/productModel');
 const asyncHandler = require('express-async-handler');
 const nodemailer = require('nodemailer');
+const axios = require('axios');
+const { ML_SERVICE_URL } = require('../config/mlService');
+
+// Products per recipient for the {{recommendations}} tag
+const EMAIL_RECOMMENDATION_LIMIT = 4;
 
 // Configure email transporter with fallback for development
 let transporter;
@@ -47,6 +53,76 @@ if ((process.env.EMAIL_USER || process.env.EMAIL_USER) &&
     });
 }
 
+// Fetch recommendations for all recipients in one streamed NDJSON call to the ML service
+const fetchBatchRecommendations = async (userIds, limit) => {
+    const recommendations = new Map();
+
+    try {
+        const response = await axios.post(`${ML_SERVICE_URL}/recommendations/personalized/batch`, {
+            userIds,
+            limit
+        }, { responseType: 'stream', timeout: 60000 });
+
+        let buffer = '';
+        for await (const chunk of response.data) {
+            buffer += chunk.toString();
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (line.trim()) {
+                    const result = JSON.parse(line);
+                    recommendations.set(result.userId, result.productIds);
+                }
+            }
+        }
+    } catch (mlError) {
+        console.log('ML service unavailable for batch recommendations, sending without them');
+    }
+
+    return recommendations;
+};
+
+const formatPrice = (amount) => new Intl.NumberFormat('en-IN', {
+    style: 'currency',
+    currency: 'INR',
+    minimumFractionDigits: 2,
+}).format(amount);
+
+const HTML_ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+
+// Catalog text is not trusted markup
+const escapeHtml = (text) => String(text).replace(/[&<>"']/g, char => HTML_ESCAPES[char]);
+
+// Render each recipient's recommended products as an HTML list, keyed by user ID
+const buildRecommendationBlocks = async (users) => {
+    const recommendations = await fetchBatchRecommendations(
+        users.map(user => user._id.toString()),
+        EMAIL_RECOMMENDATION_LIMIT
+    );
+
+    const productIds = [...new Set([...recommendations.values()].flat())];
+    const products = await Product.find({
+        _id: { $in: productIds },
+        status: 'Published'
+    }).select('name price discount images');
+    const productsById = new Map(products.map(product => [product._id.toString(), product]));
+
+    const frontendUrl = process.env.FRONTEND_URL || 'https://megabasket.vercel.app';
+    const blocks = new Map();
+    for (const [userId, ids] of recommendations) {
+        const items = ids
+            .map(id => productsById.get(id))
+            .filter(Boolean)
+            .map(product => {
+                const finalPrice = product.price - (product.price * product.discount / 100);
+                return `<li><a href="${frontendUrl}/product/${product._id}">${escapeHtml(product.name)}</a> - ${formatPrice(finalPrice)}</li>`;
+            });
+        blocks.set(userId, items.length > 0 ? `<ul>${items.join('')}</ul>` : '');
+    }
+
+    return blocks;
+};
+
 // @desc    Get all email templates
 // @route   GET /api/email/templates
 // @access  Private/Admin
@@ -232,12 +308,18 @@ const sendEmail = asyncHandler(async (req, res) => {
             console.warn('WARNING: Email configuration is incomplete. Check your .env file for EMAIL_USER and EMAIL_PASSWORD/EMAIL_PASS');
         }
         
+        // Recommendations for every recipient come from one batch call
+        const recommendationBlocks = body.includes('{{recommendations}}')
+            ? await buildRecommendationBlocks(users)
+            : new Map();
+
         // Send emails to each user
         const emailPromises = users.map(user => {
             // Replace placeholders with actual user data and environment variables
             let personalizedBody = body
                 .replace(/{{name}}/g, user.name)
-                .replace(/{{email}}/g, user.email);
+                .replace(/{{email}}/g, user.email)
+                .replace(/{{recommendations}}/g, recommendationBlocks.get(user._id.toString()) || '');
                 
             // Replace environment variables
             personalizedBody = personalizedBody
@@ -1,5 +1,6 @@
 const Event = require('../models/eventModel');
 const asyncHandler = require('express-async-handler');
+const { forwardEvent } = require('../utils/mlEventForwarder');
 
 // @desc    Track user event
 // @route   POST /api/events
@@ -33,6 +34,8 @@ const trackEvent = asyncHandler(async (req, res) => {
     }
 
     const event = await Event.create(eventData);
+    // Feed the ML service's session buffer without waiting for it
+    forwardEvent(event);
     res.status(201).json({ success: true, eventId: event._id });
 });
 
@@ -1,11 +1,29 @@
+const mongoose = require('mongoose');
 const Product = require('../models/productModel');
 const Event = require('../models/eventModel');
 const UserProfile = require('../models/userProfileModel');
 const asyncHandler = require('express-async-handler');
 const axios = require('axios');
-
-// Configuration for Python ML service
-const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5000';
+const { ML_SERVICE_URL } = require('../config/mlService');
+
+// Products of an ML service response, in recommendation order. Requests ask for
+// hydrate, so the service's product summaries (aligned with productIds) are used
+// as they are. IDs without a summary (null entries, or an older service that
+// returns bare IDs) are looked up here.
+const recommendedProducts = async (data) => {
+    const summaries = Array.isArray(data.products) ? data.products : [];
+    const missing = data.productIds.filter((id, index) => !summaries[index]);
+
+    let productsById = new Map();
+    if (missing.length > 0) {
+        const products = await Product.find({
+            _id: { $in: missing },
+            status: 'Published'
+        }).populate('category', 'name');
+        productsById = new Map(products.map(product => [product._id.toString(), product]));
+    }
+    return data.productIds.map((id, index) => summaries[index] || productsById.get(id)).filter(Boolean);
+};
 
 // @desc    Get personalized recommendations
 // @route   GET /api/recommendations/personalized
@@ -20,21 +38,12 @@ const getPersonalizedRecommendations = asyncHandler(async (req, res) => {
             userId: userId?.toString(),
             sessionId,
             limit,
-            context
+            context,
+            hydrate: true
         }, { timeout: 5000 });
 
         if (response.data.productIds && response.data.productIds.length > 0) {
-            const products = await Product.find({
-                _id: { $in: response.data.productIds },
-                status: 'Published'
-            }).populate('category', 'name');
-
-            // Reorder products according to ML recommendation order
-            const orderedProducts = response.data.productIds
-                .map(id => products.find(p => p._id.toString() === id))
-                .filter(Boolean);
-
-            return res.json(orderedProducts);
+            return res.json(await recommendedProducts(response.data));
         }
     } catch (mlError) {
         console.log('ML service unavailable, using fallback recommendations:', mlError.message);
@@ -101,16 +110,12 @@ const getAlsoBought = asyncHandler(async (req, res) => {
     try {
         const response = await axios.post(`${ML_SERVICE_URL}/recommendations/also-bought`, {
             productId,
-            limit
+            limit,
+            hydrate: true
         }, { timeout: 5000 });
 
         if (response.data.productIds) {
-            const products = await Product.find({
-                _id: { $in: response.data.productIds },
-                status: 'Published'
-            }).populate('category', 'name');
-
-            return res.json(products);
+            return res.json(await recommendedProducts(response.data));
         }
     } catch (mlError) {
         console.log('ML service unavailable for also-bought, using fallback');
@@ -142,6 +147,20 @@ const getAlsoViewed = asyncHandler(async (req, res) => {
     const { productId } = req.params;
     const { limit = 6 } = req.query;
 
+    try {
+        const response = await axios.post(`${ML_SERVICE_URL}/recommendations/also-viewed`, {
+            productId,
+            limit,
+            hydrate: true
+        }, { timeout: 5000 });
+
+        if (response.data.productIds && response.data.productIds.length > 0) {
+            return res.json(await recommendedProducts(response.data));
+        }
+    } catch (mlError) {
+        console.log('ML service unavailable for also-viewed, using fallback');
+    }
+
     // Get users who viewed this product
     const viewEvents = await Event.find({
         productId,
@@ -196,7 +215,22 @@ const getAlsoViewed = asyncHandler(async (req, res) => {
 // @route   GET /api/recommendations/trending
 // @access  Public
 const getTrending = asyncHandler(async (req, res) => {
-    const { limit = 10, days = 7 } = req.query;
+    const { limit = 10, days = 7, category } = req.query;
+
+    try {
+        const response = await axios.post(`${ML_SERVICE_URL}/recommendations/trending`, {
+            limit,
+            window: `${parseInt(days)}d`,
+            category,
+            hydrate: true
+        }, { timeout: 5000 });
+
+        if (response.data.productIds && response.data.productIds.length > 0) {
+            return res.json(await recommendedProducts(response.data));
+        }
+    } catch (mlError) {
+        console.log('ML service unavailable for trending, using fallback');
+    }
 
     const startDate = new Date();
     startDate.setDate(startDate.getDate() - parseInt(days));
@@ -0,0 +1,53 @@
+const axios = require('axios');
+const { ML_SERVICE_URL } = require('../config/mlService');
+
+// Events are sent in batches: at most this many, at least this often
+const BATCH_SIZE = 100;
+const FLUSH_INTERVAL_MS = 1000;
+// Events kept while the ML service is unreachable; older ones are dropped
+const MAX_QUEUED = 5000;
+
+let queue = [];
+let timer = null;
+
+const flushEvents = () => {
+    if (timer) {
+        clearTimeout(timer);
+        timer = null;
+    }
+    while (queue.length > 0) {
+        const events = queue.splice(0, BATCH_SIZE);
+        // Fire-and-forget: session recommendations are best effort, tracking must not wait on them
+        axios.post(`${ML_SERVICE_URL}/events`, { events }, { timeout: 2000 })
+            .catch((error) => {
+                if (error.code !== 'ECONNREFUSED') {
+                    console.warn('Failed to forward events to ML service:', error.message);
+                }
+            });
+    }
+};
+
+// Queue a stored event for the ML service's recent-activity buffer
+const forwardEvent = (event) => {
+    if (!event.productId) {
+        return;
+    }
+    queue.push({
+        userId: event.userId ? event.userId.toString() : undefined,
+        sessionId: event.sessionId,
+        productId: event.productId.toString(),
+        eventType: event.eventType
+    });
+    if (queue.length > MAX_QUEUED) {
+        queue = queue.slice(-MAX_QUEUED);
+    }
+
+    if (queue.length >= BATCH_SIZE) {
+        flushEvents();
+    } else if (!timer) {
+        timer = setTimeout(flushEvents, FLUSH_INTERVAL_MS);
+        timer.unref();
+    }
+};
+
+module.exports = { forwardEvent, flushEvents };
@@ -1,6 +1,5 @@
 const axios = require('axios');
-
-const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://127.0.0.1:5000';
+const { ML_SERVICE_URL } = require('../config/mlService');
 
 const trainMLModel = async () => {
     try {
@@ -12,7 +11,11 @@ const trainMLModel = async () => {
             }
         });
         
-        if (response.status === 200 || response.status === 201) {
+        if (response.status === 202) {
+            // Training runs in the background; progress is at /train/status
+            console.log('ML model training started, job:', response.data.jobId);
+            return response.data;
+        } else if (response.status === 200 || response.status === 201) {
             console.log('ML model trained successfully:', response.data);
             return response.data;
         } else {
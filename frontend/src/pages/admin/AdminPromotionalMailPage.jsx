@@ -530,6 +530,7 @@ For Gmail:
                                 <h4>Personalization Tags & HTML Tips:</h4>
                                 <p>Use <code>{'{'}{'{'}name{'}'}{'}'}</code> to insert recipient's name</p>
                                 <p>Use <code>{'{'}{'{'}email{'}'}{'}'}</code> to insert recipient's email</p>
+                                <p>Use <code>{'{'}{'{'}recommendations{'}'}{'}'}</code> to insert a list of products recommended for each recipient</p>
                                 <p>Use <code>${'{'}process.env.FRONTEND_URL{'}'}</code> to insert your site URL for images and links</p>
                                 <p>Use <code>${'{'}new Date().getFullYear(){'}'}</code> to insert current year (for copyright)</p>
                                 
@@ -0,0 +1,145 @@
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from sklearn.preprocessing import normalize
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbor index for cosine similarity.
+
+    Rows are L2-normalized and clustered with spherical k-means; each query
+    only scores the rows in its n_probe closest clusters. Raising n_probe
+    trades latency for recall, n_probe == n_lists is an exact search.
+    Accepts dense arrays or scipy CSR matrices.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, sample_size=50000, seed=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+        self.vectors = None
+        self.centroids = None
+        self.list_offsets = None
+        self.list_items = None
+
+    def fit(self, vectors):
+        """Cluster the rows of vectors and build the inverted lists"""
+        vectors = normalize(vectors.astype(np.float32))
+        n_rows = vectors.shape[0]
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+        rng = np.random.default_rng(self.seed)
+
+        # Spherical k-means on a sample of rows
+        sample = vectors[rng.choice(n_rows, min(n_rows, self.sample_size), replace=False)]
+        centroids = self._dense(sample[rng.choice(sample.shape[0], n_lists, replace=False)])
+        for _ in range(self.n_iter):
+            assignments = np.asarray(sample @ centroids.T).argmax(axis=1)
+            centroids = self._update_centroids(sample, assignments, centroids)
+
+        # Assign every row and store the lists contiguously
+        assignments = self._assign(vectors, centroids)
+        self.list_items = np.argsort(assignments, kind='stable').astype(np.int32)
+        self.list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]
+        ).astype(np.int64)
+        self.centroids = centroids
+        self.vectors = vectors
+        return self
+
+    def to_arrays(self):
+        """The fitted state as a dict of arrays, for persisting"""
+        return {
+            'vectors': self.vectors,
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets,
+            'list_items': self.list_items,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, n_probe=8):
+        """Rebuild a fitted index from to_arrays() output, e.g. memory-mapped files"""
+        index = cls(n_lists=len(arrays['centroids']), n_probe=n_probe)
+        index.vectors = arrays['vectors']
+        index.centroids = arrays['centroids']
+        index.list_offsets = arrays['list_offsets']
+        index.list_items = arrays['list_items']
+        return index
+
+    def search(self, query, k=10, n_probe=None, exclude=None, allowed=None):
+        """Return the row indices of the k most similar rows, best first.
+
+        allowed is an optional boolean mask over rows; other rows are skipped.
+        """
+        if self.vectors is None:
+            return np.empty(0, dtype=np.int64)
+
+        query = self._normalize_query(query)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+
+        # Pick the closest lists and gather their rows
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        candidates = np.concatenate(
+            [self.list_items[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes]
+        )
+        return self._rank(candidates, query, k, exclude, allowed)
+
+    def exact_search(self, query, k=10, exclude=None):
+        """Brute-force search over every row, used as the recall baseline"""
+        query = self._normalize_query(query)
+        return self._rank(np.arange(self.vectors.shape[0]), query, k, exclude)
+
+    def recall_at_k(self, queries, k=10, n_probe=None):
+        """Mean fraction of the exact top-k that search() also returns"""
+        hits = 0
+        total = 0
+        for query in queries:
+            exact = self.exact_search(query, k)
+            approx = self.search(query, k, n_probe)
+            hits += len(np.intersect1d(exact, approx))
+            total += len(exact)
+        return hits / total if total else 1.0
+
+    def _rank(self, candidates, query, k, exclude, allowed=None):
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        scores = np.asarray(self.vectors[candidates] @ query).ravel()
+        if exclude is not None and len(exclude):
+            scores[np.isin(candidates, exclude)] = -np.inf
+
+        k = min(k, len(candidates))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        best = best[np.isfinite(scores[best])]
+        return candidates[best]
+
+    def _assign(self, vectors, centroids, block_size=65536):
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], block_size):
+            block = vectors[start:start + block_size]
+            assignments[start:start + block_size] = np.asarray(block @ centroids.T).argmax(axis=1)
+        return assignments
+
+    def _update_centroids(self, sample, assignments, centroids):
+        membership = csr_matrix(
+            (np.ones(len(assignments), dtype=np.float32), (assignments, np.arange(len(assignments)))),
+            shape=(len(centroids), len(assignments))
+        )
+        sums = self._dense(membership @ sample)
+        # Keep the previous centroid for clusters that lost all their rows
+        empty = np.asarray(membership.sum(axis=1)).ravel() == 0
+        sums[empty] = centroids[empty]
+        return normalize(sums)
+
+    def _normalize_query(self, query):
+        query = self._dense(query).astype(np.float32).ravel()
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    @staticmethod
+    def _dense(matrix):
+        return matrix.toarray() if issparse(matrix) else np.asarray(matrix)
@@ -7,6 +7,11 @@ import os
 from dotenv import load_dotenv
 from collections import defaultdict, Counter
 
+from interaction_index import InteractionIndex
+from product_catalog import ProductCatalog
+from session_activity import SessionActivity
+from trending import TrendingCounters
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -16,6 +21,29 @@ CORS(app)
 mongo_client = pymongo.MongoClient(os.getenv('MONGO_URI'))
 db = mongo_client[os.getenv('MONGO_DB_NAME', 'ecommerce')]
 
+# Event types that get their own item-to-item co-occurrence index
+COOCCURRENCE_EVENTS = ('purchase', 'view')
+
+# Trending: longest window kept in memory and how often new events are folded in
+TRENDING_MAX_HOURS = int(os.getenv('TRENDING_MAX_HOURS', 7 * 24))
+TRENDING_REFRESH_SECONDS = float(os.getenv('TRENDING_REFRESH_SECONDS', 60))
+
+# Product catalog cache: delta refresh interval and full reload interval (drops deleted products)
+CATALOG_REFRESH_SECONDS = float(os.getenv('CATALOG_REFRESH_SECONDS', 60))
+CATALOG_RELOAD_SECONDS = float(os.getenv('CATALOG_RELOAD_SECONDS', 3600))
+
+# User/product interaction indexes: how often new events are folded in
+INTERACTIONS_REFRESH_SECONDS = float(os.getenv('INTERACTIONS_REFRESH_SECONDS', 60))
+
+# Recent-activity buffers of live sessions, fed by POST /events
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', 100000))
+SESSION_MAX_ITEMS = int(os.getenv('SESSION_MAX_ITEMS', 50))
+SESSION_IDLE_SECONDS = float(os.getenv('SESSION_IDLE_SECONDS', 1800))
+# Neighbors taken per buffered item, and the weight kept by each older item
+SESSION_NEIGHBORS = 20
+SESSION_DECAY = 0.85
+MAX_INGEST_EVENTS = 1000
+
 class SimpleRecommendationEngine:
     def __init__(self):
         self.event_weights = {
@@ -25,52 +53,85 @@ class SimpleRecommendationEngine:
             'wishlist': 5,
             'rating': 7
         }
+        self.cooccurrence = {}
+        self.trending = TrendingCounters(TRENDING_MAX_HOURS, refresh_seconds=TRENDING_REFRESH_SECONDS)
+        self.catalog = ProductCatalog(CATALOG_REFRESH_SECONDS, CATALOG_RELOAD_SECONDS)
+        self.interactions = InteractionIndex(self.event_weights, refresh_seconds=INTERACTIONS_REFRESH_SECONDS)
+        self.sessions = SessionActivity(SESSION_MAX_SESSIONS, SESSION_MAX_ITEMS, SESSION_IDLE_SECONDS)
     
-    def get_user_interactions(self, user_id, days=90):
-        """Get user's recent interactions"""
+    def build_cooccurrence(self, days=90, top_n=20, max_basket=100):
+        """Precompute the top co-occurring products per event type"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        # Check if user_id is a valid ObjectId
-        user_query = {}
-        if len(user_id) == 24:
-            try:
-                user_query = {'userId': ObjectId(user_id)}
-            except:
-                user_query = {'sessionId': user_id}
-        else:
-            user_query = {'sessionId': user_id}
-        
-        events = list(db.events.find({
-            '$or': [
-                user_query,
-                {'sessionId': user_id}
-            ],
-            'createdAt': {'$gte': cutoff_date}
-        }))
+        # Group each user's (or session's) products per event type
+        baskets = {event_type: defaultdict(set) for event_type in COOCCURRENCE_EVENTS}
+        cursor = db.events.find(
+            {
+                'createdAt': {'$gte': cutoff_date},
+                'eventType': {'$in': list(COOCCURRENCE_EVENTS)},
+                'productId': {'$ne': None}
+            },
+            {'_id': 0, 'userId': 1, 'sessionId': 1, 'productId': 1, 'eventType': 1},
+            batch_size=10000
+        )
+        for event in cursor:
+            user_key = str(event.get('userId') or event.get('sessionId'))
+            baskets[event['eventType']][user_key].add(str(event['productId']))
+        
+        # Count pairs, skipping huge baskets that pair with everything
+        cooccurrence = {}
+        for event_type, user_baskets in baskets.items():
+            pair_counts = defaultdict(Counter)
+            for items in user_baskets.values():
+                if len(items) > max_basket:
+                    continue
+                for product_id in items:
+                    pair_counts[product_id].update(items)
+            
+            cooccurrence[event_type] = {
+                product_id: [pid for pid, _ in counts.most_common(top_n + 1) if pid != product_id][:top_n]
+                for product_id, counts in pair_counts.items()
+            }
         
-        return events
+        self.cooccurrence = cooccurrence
+        return {event_type: len(index) for event_type, index in cooccurrence.items()}
+    
+    def related_products(self, product_id, event_type, limit=6):
+        """Products most often co-interacted with product_id, or None if not indexed yet"""
+        index = self.cooccurrence.get(event_type)
+        if index is None:
+            return None
+        return index.get(product_id, [])[:limit]
+    
+    def session_recommendations(self, user_id, limit=10):
+        """Co-occurrence neighbors of the products in a session's recent-activity buffer"""
+        seeds = self.sessions.seed_weights(user_id, self.event_weights, SESSION_DECAY)
+        scores = Counter()
+        for product_id, weight in seeds.items():
+            for event_type in COOCCURRENCE_EVENTS:
+                for rank, neighbor in enumerate(self.related_products(product_id, event_type, SESSION_NEIGHBORS) or []):
+                    scores[neighbor] += weight / (rank + 1)
+        return [product_id for product_id, _ in scores.most_common() if product_id not in seeds][:limit]
     
     def get_user_preferences(self, user_id):
         """Build user preference profile"""
-        events = self.get_user_interactions(user_id)
+        self.interactions.ensure_fresh(db.events)
+        self.catalog.ensure_fresh(db.products, db.categories)
         
         category_scores = defaultdict(int)
         product_scores = defaultdict(int)
         brand_scores = defaultdict(int)
         
-        for event in events:
-            if event.get('productId'):
-                product = db.products.find_one({'_id': event['productId']})
-                if product:
-                    weight = self.event_weights.get(event.get('eventType'), 1)
-                    
-                    if product.get('category'):
-                        category_scores[str(product['category'])] += weight
-                    
-                    product_scores[str(event['productId'])] += weight
-                    
-                    if product.get('brand'):
-                        brand_scores[product['brand']] += weight
+        for product_id, weight in self.interactions.user_items(user_id).items():
+            product = self.catalog.get(product_id)
+            if product:
+                if product.get('category'):
+                    category_scores[str(product['category'])] += weight
+                
+                product_scores[product_id] += weight
+                
+                if product.get('brand'):
+                    brand_scores[product['brand']] += weight
         
         return {
             'categories': category_scores,
@@ -80,71 +141,9 @@ class SimpleRecommendationEngine:
     
     def collaborative_filtering_simple(self, user_id, limit=10):
         """Simple collaborative filtering"""
-        # Get user's interacted products
-        user_events = self.get_user_interactions(user_id)
-        user_products = set(str(e['productId']) for e in user_events if e.get('productId'))
-        
-        if not user_products:
-            return []
-        
-        # Convert string product IDs to ObjectId for MongoDB query
-        product_object_ids = []
-        for pid in user_products:
-            try:
-                product_object_ids.append(ObjectId(pid))
-            except:
-                continue
-        
-        if not product_object_ids:
-            return []
-        
-        # Find similar users (users who interacted with same products)
-        try:
-            # Build query for similar users
-            user_id_query = {}
-            if len(user_id) == 24:
-                try:
-                    user_id_query = {'userId': {'$ne': ObjectId(user_id)}}
-                except:
-                    user_id_query = {'sessionId': {'$ne': user_id}}
-            else:
-                user_id_query = {'sessionId': {'$ne': user_id}}
-            
-            similar_users = list(db.events.aggregate([
-                {
-                    '$match': {
-                        'productId': {'$in': product_object_ids},
-                        **user_id_query
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': {'$ifNull': ['$userId', '$sessionId']},
-                        'commonProducts': {'$addToSet': '$productId'}
-                    }
-                },
-                {'$limit': 20}
-            ]))
-        except Exception as e:
-            print(f"Error in collaborative filtering aggregation: {e}")
-            return []
-        
-        # Get products from similar users
-        recommended_products = Counter()
-        for similar_user in similar_users:
-            similar_user_id = str(similar_user['_id'])
-            similar_events = self.get_user_interactions(similar_user_id, days=30)
-            
-            for event in similar_events:
-                if event.get('productId'):
-                    pid = str(event['productId'])
-                    if pid not in user_products:
-                        weight = self.event_weights.get(event.get('eventType'), 1)
-                        recommended_products[pid] += weight
-        
-        # Get top recommendations
-        top_products = [pid for pid, _ in recommended_products.most_common(limit)]
-        return top_products
+        # Neighbors share the most recent products; their last 30 days are scored in memory
+        self.interactions.ensure_fresh(db.events)
+        return self.interactions.recommend(user_id, limit, n_neighbors=20, neighbor_days=30)
     
     def content_based_filtering_simple(self, user_id, limit=10):
         """Simple content-based filtering"""
@@ -157,103 +156,93 @@ class SimpleRecommendationEngine:
         top_categories = sorted(preferences['categories'].items(), 
                                key=lambda x: x[1], reverse=True)[:3]
         
-        # Convert category IDs to ObjectId
-        category_ids = []
-        for cat_id, _ in top_categories:
-            try:
-                category_ids.append(ObjectId(cat_id))
-            except:
-                continue
-        
-        if not category_ids:
-            return []
-        
-        # Convert already viewed product IDs to ObjectId
-        viewed_product_ids = []
-        for pid in preferences['products'].keys():
-            try:
-                viewed_product_ids.append(ObjectId(pid))
-            except:
-                continue
-        
-        # Find products from preferred categories
-        products = list(db.products.find({
-            'category': {'$in': category_ids},
-            'status': 'Published',
-            '_id': {'$nin': viewed_product_ids}
-        }).sort('discount', -1).limit(limit))
-        
-        return [str(p['_id']) for p in products]
+        # Find products from preferred categories, skipping already viewed ones
+        return self.catalog.published_by_discount(
+            [cat_id for cat_id, _ in top_categories],
+            exclude=set(preferences['products']),
+            limit=limit
+        )
     
-    def get_trending(self, days=7, limit=10):
+    def get_trending(self, days=7, limit=10, window=None, weights=None, category=None):
         """Get trending products"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
         try:
-            pipeline = [
-                {
-                    '$match': {
-                        'createdAt': {'$gte': cutoff_date},
-                        'eventType': {'$in': ['view', 'purchase', 'add_to_cart']}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': '$productId',
-                        'score': {
-                            '$sum': {
-                                '$switch': {
-                                    'branches': [
-                                        {'case': {'$eq': ['$eventType', 'purchase']}, 'then': 10},
-                                        {'case': {'$eq': ['$eventType', 'add_to_cart']}, 'then': 3},
-                                        {'case': {'$eq': ['$eventType', 'view']}, 'then': 1}
-                                    ],
-                                    'default': 0
-                                }
-                            }
-                        }
-                    }
-                },
-                {'$sort': {'score': -1}},
-                {'$limit': limit}
-            ]
-            
-            results = list(db.events.aggregate(pipeline))
-            return [str(r['_id']) for r in results]
+            self.trending.ensure_fresh(db.events, db.products)
+            trending = self.trending.top(limit, window or days * 24, weights, category)
+            if trending:
+                return trending
         except Exception as e:
             print(f"Error getting trending products: {e}")
-            # Fallback: return some published products
-            try:
-                products = list(db.products.find({'status': 'Published'}).sort('discount', -1).limit(limit))
-                return [str(p['_id']) for p in products]
-            except:
-                return []
+        
+        # Fallback: return some published products
+        try:
+            self.catalog.ensure_fresh(db.products, db.categories)
+            return self.catalog.published_by_discount([category] if category else None, limit=limit)
+        except Exception as e:
+            print(f"Error reading product catalog: {e}")
+            return []
+    
+    def hydrate(self, response):
+        """Copy of response with summaries of its productIds as 'products', None for unknown or unpublished ones"""
+        self.catalog.ensure_fresh(db.products, db.categories)
+        return dict(response, products=self.catalog.summaries(response['productIds'], published_only=True))
 
 # Initialize engine
 engine = SimpleRecommendationEngine()
 
+def recommendation_response(data, response):
+    """JSON response, hydrated with product summaries if the request asks for them"""
+    return jsonify(engine.hydrate(response) if data.get('hydrate') else response)
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'version': 'simple'})
+    return jsonify({
+        'status': 'healthy',
+        'version': 'simple',
+        'catalog': engine.catalog.stats(),
+        'sessions': engine.sessions.stats()
+    })
 
 @app.route('/train', methods=['POST'])
 def train_model():
-    """Training endpoint (no-op for simple engine)"""
+    """Training endpoint (builds the co-occurrence indexes for the simple engine)"""
     try:
         event_count = db.events.count_documents({})
         product_count = db.products.count_documents({'status': 'Published'})
+        indexed = engine.build_cooccurrence()
         
         return jsonify({
             'success': True,
             'message': 'Simple recommendation engine is ready',
             'stats': {
                 'events': event_count,
-                'products': product_count
+                'products': product_count,
+                'cooccurrence': indexed
             }
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/events', methods=['POST'])
+def ingest_events():
+    """Buffer tracked events (one, or {'events': [...]}) for session recommendations"""
+    try:
+        data = request.get_json(silent=True) or {}
+        events = data.get('events', [data])
+        if not isinstance(events, list):
+            return jsonify({'error': 'events must be a list'}), 400
+        if len(events) > MAX_INGEST_EVENTS:
+            return jsonify({'error': f'At most {MAX_INGEST_EVENTS} events per request'}), 413
+        
+        accepted = 0
+        for event in events:
+            user_id = event.get('userId') or event.get('sessionId')
+            if user_id and event.get('productId') and event.get('eventType'):
+                engine.sessions.record(str(user_id), str(event['productId']), event['eventType'])
+                accepted += 1
+        return jsonify({'accepted': accepted}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/recommendations/personalized', methods=['POST'])
 def get_personalized_recommendations():
     """Get personalized recommendations"""
@@ -266,8 +255,12 @@ def get_personalized_recommendations():
             # Cold start - return trending
             recommendations = engine.get_trending(limit=limit)
         else:
-            # Try collaborative filtering first
-            collab_recs = engine.collaborative_filtering_simple(user_id, limit)
+            # Neighbors of what the session is browsing right now, then collaborative filtering
+            collab_recs = engine.session_recommendations(user_id, limit)
+            collab_recs += [
+                product_id for product_id in engine.collaborative_filtering_simple(user_id, limit)
+                if product_id not in collab_recs
+            ]
             
             if len(collab_recs) < limit:
                 # Supplement with content-based
@@ -283,7 +276,7 @@ def get_personalized_recommendations():
                 trending = engine.get_trending(limit=limit - len(recommendations))
                 recommendations.extend(trending)
         
-        return jsonify({
+        return recommendation_response(data, {
             'productIds': recommendations[:limit],
             'method': 'simple_hybrid' if user_id else 'trending'
         })
@@ -293,6 +286,22 @@ def get_personalized_recommendations():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/recommendations/trending', methods=['POST'])
+def get_trending():
+    """Trending products over a sliding window, optionally per category"""
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = int(data.get('limit', 10))
+        
+        trending = engine.get_trending(
+            limit=limit, window=data.get('window'), weights=data.get('weights'), category=data.get('category')
+        )
+        
+        return recommendation_response(data, {'productIds': trending})
+    except Exception as e:
+        print(f"Error in trending: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/recommendations/also-bought', methods=['POST'])
 def get_also_bought():
     """Get 'customers also bought' recommendations"""
@@ -301,6 +310,11 @@ def get_also_bought():
         product_id = data.get('productId')
         limit = int(data.get('limit', 6))
         
+        # Answer from the co-occurrence index once /train has built it
+        related = engine.related_products(str(product_id), 'purchase', limit)
+        if related is not None:
+            return recommendation_response(data, {'productIds': related})
+        
         # Convert product_id to ObjectId
         try:
             product_oid = ObjectId(product_id)
@@ -338,7 +352,7 @@ def get_also_bought():
             '$or': query_parts,
             'eventType': 'purchase',
             'productId': {'$ne': product_oid}
-        }))
+        }, {'productId': 1}).limit(1000))
         
         # Count occurrences
         product_counts = Counter()
@@ -349,15 +363,30 @@ def get_also_bought():
         # Get top recommendations
         top_products = [pid for pid, _ in product_counts.most_common(limit)]
         
-        return jsonify({'productIds': top_products})
+        return recommendation_response(data, {'productIds': top_products})
     except Exception as e:
         print(f"Error in also-bought: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/recommendations/also-viewed', methods=['POST'])
+def get_also_viewed():
+    """Get 'customers also viewed' recommendations"""
+    try:
+        data = request.json
+        product_id = data.get('productId')
+        limit = int(data.get('limit', 6))
+        
+        related = engine.related_products(str(product_id), 'view', limit)
+        
+        return recommendation_response(data, {'productIds': related or []})
+    except Exception as e:
+        print(f"Error in also-viewed: {e}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     port = int(os.getenv('ML_SERVICE_PORT', 5001))
     print(f"Starting Simple ML Recommendation Service on port {port}...")
     print("This version uses basic algorithms without heavy ML dependencies")
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG') == '1')
@@ -1,15 +1,38 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
-from scipy.sparse import csr_matrix
-from datetime import datetime, timedelta
+from scipy.sparse import csr_matrix, issparse
+from datetime import timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import pymongo
+from bson.objectid import ObjectId
+import json
 import os
+import threading
+import time
+import traceback
+import uuid
 from dotenv import load_dotenv
 
+from ann_index import IVFIndex
+from clock import INGEST_LAG, to_timestamp, utc_now
+from data_source import MongoSource, SnapshotSource
+from eligibility import ProductEligibility
+from event_loader import EVENT_TYPES, EVENT_CODES
+from factorization import ImplicitALS
+from metrics import Metrics, nbytes
+from model_snapshot import ModelSnapshot
+from model_store import current_version, load_snapshot, save_snapshot, training_lock
+from product_features import ProductFeaturizer
+from profiler import SamplingProfiler
+from request_control import AdmissionControl, Overloaded, SingleFlight
+from result_cache import ResultCache
+from session_activity import SessionActivity
+from trending import TrendingCounters
+from user_neighbors import build_user_neighbors, update_user_neighbors
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -19,316 +42,1360 @@ CORS(app)
 mongo_client = pymongo.MongoClient(os.getenv('MONGO_URI'))
 db = mongo_client[os.getenv('MONGO_DB_NAME', 'ecommerce')]
 
+# Prometheus metrics served on /metrics; gauges are registered below the engine
+metrics = Metrics()
+stage_seconds = metrics.histogram('ml_stage_seconds', 'Time spent in each training and serving stage', 'stage')
+request_seconds = metrics.histogram('ml_request_seconds', 'Request handling time per endpoint', 'endpoint')
+
+# Event weights
+EVENT_WEIGHTS = {
+    'view': 1,
+    'add_to_cart': 3,
+    'purchase': 10,
+    'wishlist': 5,
+    'rating': 7
+}
+EVENT_WEIGHT_BY_CODE = np.array([EVENT_WEIGHTS.get(event_type, 1) for event_type in EVENT_TYPES], dtype=np.float32)
+
+# Training window and incremental training policy
+TRAINING_WINDOW_DAYS = int(os.getenv('TRAINING_WINDOW_DAYS', 90))
+FULL_REBUILD_INTERVAL = timedelta(hours=float(os.getenv('FULL_REBUILD_INTERVAL_HOURS', 24 * 7)))
+
+# Train from an exported event snapshot (see offline_training.py) instead of MongoDB
+TRAINING_SNAPSHOT_DIR = os.getenv('TRAINING_SNAPSHOT_DIR')
+
+# Where trained model versions are persisted, and how many are kept
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+MODEL_KEEP_VERSIONS = int(os.getenv('MODEL_KEEP_VERSIONS', 3))
+
+# Finished training jobs kept for /train/status
+MAX_TRAINING_JOBS = 20
+
+# How often serving workers check MODEL_DIR for a newer published version
+MODEL_POLL_SECONDS = float(os.getenv('MODEL_POLL_SECONDS', 10))
+
+# Inverted lists scanned per content-based query (higher = better recall, slower)
+ANN_PROBES = int(os.getenv('ANN_PROBES', 8))
+
+# Personalized results cache: entries per worker and their lifetime (0 entries disables it)
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 100000))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL_SECONDS', 300))
+
+# Personalized load control: time budget before answering with trending (0 waits
+# indefinitely), requests allowed to wait before shedding (0 is unbounded), scoring threads
+PERSONALIZED_BUDGET_MS = float(os.getenv('PERSONALIZED_BUDGET_MS', 300))
+PERSONALIZED_MAX_PENDING = int(os.getenv('PERSONALIZED_MAX_PENDING', 256))
+SCORING_THREADS = int(os.getenv('SCORING_THREADS', 0)) or os.cpu_count()
+
+# Trending: longest window kept in memory and how often new events are folded in
+TRENDING_MAX_HOURS = int(os.getenv('TRENDING_MAX_HOURS', 7 * 24))
+TRENDING_REFRESH_SECONDS = float(os.getenv('TRENDING_REFRESH_SECONDS', 60))
+
+# Implicit ALS engine: latent factors (0 disables it), sweeps per full / incremental
+# training run, and the threads solving blocks of rows
+ALS_FACTORS = int(os.getenv('ALS_FACTORS', 64))
+ALS_ITERATIONS = int(os.getenv('ALS_ITERATIONS', 15))
+ALS_INCREMENTAL_ITERATIONS = int(os.getenv('ALS_INCREMENTAL_ITERATIONS', 2))
+ALS_REGULARIZATION = float(os.getenv('ALS_REGULARIZATION', 0.1))
+ALS_ALPHA = float(os.getenv('ALS_ALPHA', 10))
+ALS_THREADS = int(os.getenv('ALS_THREADS', 0)) or None
+
+# Similar users precomputed per user by training (0 computes them per request), and the
+# processes scoring them (default: one per CPU)
+USER_NEIGHBORS = int(os.getenv('USER_NEIGHBORS', 10))
+NEIGHBOR_PROCESSES = int(os.getenv('NEIGHBOR_PROCESSES', 0)) or None
+
+# Live product catalog (published / in-stock state, card fields): refresh and full reload intervals
+ELIGIBILITY_REFRESH_SECONDS = float(os.getenv('ELIGIBILITY_REFRESH_SECONDS', 60))
+ELIGIBILITY_RELOAD_SECONDS = float(os.getenv('ELIGIBILITY_RELOAD_SECONDS', 3600))
+
+# Engine used by /recommendations/personalized unless the request names one
+RECOMMENDATION_ENGINE = os.getenv('RECOMMENDATION_ENGINE', 'hybrid')
+RECOMMENDATION_ENGINES = ('hybrid', 'als')
+
+# Events read to fold a user who is not in the model into the ALS factors
+FOLD_IN_EVENTS = 200
+FOLD_IN_PROJECTION = {'_id': 0, 'productId': 1, 'eventType': 1}
+
+# Recent-activity buffers of live sessions, fed by POST /events
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', 100000))
+SESSION_MAX_ITEMS = int(os.getenv('SESSION_MAX_ITEMS', 50))
+SESSION_IDLE_SECONDS = float(os.getenv('SESSION_IDLE_SECONDS', 1800))
+# Neighbors taken per buffered item, and the weight kept by each older item
+SESSION_NEIGHBORS = 20
+SESSION_DECAY = 0.85
+MAX_INGEST_EVENTS = 1000
+
+# Users scored per sparse product in batch recommendations
+BATCH_BLOCK_SIZE = int(os.getenv('BATCH_BLOCK_SIZE', 1024))
+
+# On-demand sampling profiler (POST /debug/profile), off unless enabled
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED') == '1'
+PROFILE_MAX_SECONDS = 120
+
+# Event types that get their own item-to-item co-occurrence index
+COOCCURRENCE_EVENTS = ('purchase', 'view')
+
+def build_interaction_matrix(user_codes, product_codes, event_codes, shape):
+    """Aggregate interned (user, product, event code) columns into CSR matrices.
+    
+    Returns the weighted interaction matrix and a dict of user-item event
+    count matrices for each event type in COOCCURRENCE_EVENTS, all of the
+    given shape. Duplicate (user, product) pairs are summed, so matrices built
+    from disjoint event slices can be added and subtracted.
+    """
+    weights = EVENT_WEIGHT_BY_CODE[event_codes]
+    matrix = csr_matrix((weights, (user_codes, product_codes)), shape=shape)
+    matrix.sum_duplicates()
+    
+    event_matrices = {}
+    for event_type in COOCCURRENCE_EVENTS:
+        mask = event_codes == EVENT_CODES[event_type]
+        event_matrix = csr_matrix(
+            (np.ones(mask.sum(), dtype=np.float32), (user_codes[mask], product_codes[mask])),
+            shape=shape
+        )
+        event_matrix.sum_duplicates()
+        event_matrices[event_type] = event_matrix
+    
+    return matrix, event_matrices
+
+def recent_events_query(user_id):
+    """Mongo filter for the events of a user ID or session ID"""
+    query = {'sessionId': user_id}
+    if ObjectId.is_valid(user_id):
+        query = {'$or': [{'userId': ObjectId(user_id)}, query]}
+    return query
+
+def interaction_weights(events, model):
+    """Product columns and summed event weights of event documents, for fold-in"""
+    weights = {}
+    for event in events:
+        column = model.product_index.get(str(event.get('productId')))
+        if column is not None:
+            weights[column] = weights.get(column, 0) + EVENT_WEIGHTS.get(event.get('eventType'), 1)
+    return (np.fromiter(weights.keys(), dtype=np.int64, count=len(weights)),
+            np.fromiter(weights.values(), dtype=np.float32, count=len(weights)))
+
+def top_k(scores, k):
+    """Return the indices of the k largest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def merge_hybrid(collab_recs, content_recs, k):
+    """Rank-weighted merge of collaborative and content-based lists"""
+    combined = {}
+    for i, prod_id in enumerate(collab_recs):
+        combined[prod_id] = combined.get(prod_id, 0) + (len(collab_recs) - i) * 0.6
+    
+    for i, prod_id in enumerate(content_recs):
+        combined[prod_id] = combined.get(prod_id, 0) + (len(content_recs) - i) * 0.4
+    
+    sorted_recs = sorted(combined.items(), key=lambda x: x[1], reverse=True)[:k]
+    return [product_id for product_id, score in sorted_recs]
+
+def fill_to_limit(recommendations, fallback, k):
+    """recommendations topped up to k products from fallback, skipping ones already in them"""
+    if len(recommendations) >= k:
+        return recommendations
+    present = set(recommendations)
+    return recommendations + [product_id for product_id in fallback if product_id not in present][:k - len(recommendations)]
+
+def build_cooccurrence_index(event_matrix, items=None, top_n=20, max_basket=500, block_size=4096):
+    """Keep the top_n co-occurring items for items of a user-item event matrix.
+    
+    Two items co-occur once per user that has both, however many events
+    the user has on them. Returns (neighbors, counts): int32 and float32
+    arrays of shape (len(items), top_n), best first, padded with -1 / 0.
+    items defaults to every column. Users with more than max_basket distinct
+    items are ignored since they pair with everything. The item x item
+    product is computed in row blocks to bound memory.
+    """
+    basket_sizes = np.diff(event_matrix.indptr)
+    baskets = (event_matrix[basket_sizes <= max_basket] > 0).astype(np.float32)
+    item_users = baskets.T.tocsr()
+    
+    if items is None:
+        items = np.arange(event_matrix.shape[1])
+    neighbors = np.full((len(items), top_n), -1, dtype=np.int32)
+    counts = np.zeros((len(items), top_n), dtype=np.float32)
+    
+    for block_start in range(0, len(items), block_size):
+        block_items = items[block_start:block_start + block_size]
+        block = (item_users[block_items] @ baskets).tocsr()
+        for offset, item in enumerate(block_items):
+            start, end = block.indptr[offset], block.indptr[offset + 1]
+            others = block.indices[start:end]
+            scores = block.data[start:end].copy()
+            scores[others == item] = 0
+            
+            best = top_k(scores, top_n)
+            best = best[scores[best] > 0]
+            neighbors[block_start + offset, :len(best)] = others[best]
+            counts[block_start + offset, :len(best)] = scores[best]
+    
+    return neighbors, counts
+
+def update_cooccurrence(index, previous, event_matrix, changed_users):
+    """Return a co-occurrence index with the rows touched by changed_users recomputed.
+    
+    index is the (neighbors, counts) pair built from previous; it is left
+    untouched since it may belong to a published model.
+    """
+    if index is None:
+        return build_cooccurrence_index(event_matrix)
+    
+    # Copy, padding rows for products seen for the first time
+    neighbors, counts = index
+    extra = event_matrix.shape[1] - len(neighbors)
+    neighbors = np.vstack([neighbors, np.full((extra, neighbors.shape[1]), -1, dtype=np.int32)])
+    counts = np.vstack([counts, np.zeros((extra, counts.shape[1]), dtype=np.float32)])
+    
+    # Items whose pair counts may have changed, before or after this update
+    affected = np.union1d(previous[changed_users].indices, event_matrix[changed_users].indices)
+    if len(affected):
+        neighbors[affected], counts[affected] = build_cooccurrence_index(
+            event_matrix, affected, top_n=neighbors.shape[1]
+        )
+    return neighbors, counts
+
+def resize_csr(matrix, shape):
+    """Return a copy of matrix grown to shape, new rows/columns empty"""
+    matrix = matrix.copy()
+    matrix.resize(shape)
+    return matrix
+
 class RecommendationEngine:
     def __init__(self):
-        self.user_item_matrix = None
-        self.item_features = None
+        # Currently published model; replaced wholesale, never mutated
+        self.model = ModelSnapshot()
+        self.model_version = None
         self.user_features = None
-        self.scaler = StandardScaler()
+        # Product feature pipeline, refitted by every full training run
+        self.featurizer = None
         
-    def load_data(self, days=90):
-        """Load events and product data from MongoDB"""
-        cutoff_date = datetime.now() - timedelta(days=days)
+        # Training-side state, only touched by the training worker
+        self.events = None
+        self.watermark = None
+        self.last_full_train = None
+        # Persisted version the event log and watermark belong to; the watcher swaps in
+        # other processes' models without their event logs, so it can lag model_version
+        self.events_version = None
+        self.train_lock = threading.Lock()
         
-        # Load events
-        events = list(db.events.find({
-            'createdAt': {'$gte': cutoff_date}
-        }))
+        # Background training jobs, newest last
+        self.jobs = OrderedDict()
+        self.jobs_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='train')
+        self.progress = None
         
-        # Load products
-        products = list(db.products.find({'status': 'Published'}))
+        # Sliding-window trending counters for cold start
+        self.trending = TrendingCounters(TRENDING_MAX_HOURS, refresh_seconds=TRENDING_REFRESH_SECONDS)
         
-        # Load user profiles
-        user_profiles = list(db.userprofiles.find())
+        # Which products may be recommended now, as masks over the model's indexes;
+        # also the card fields of every product, for responses that ask to be hydrated
+        self.eligibility = ProductEligibility(ELIGIBILITY_REFRESH_SECONDS, ELIGIBILITY_RELOAD_SECONDS)
         
-        return events, products, user_profiles
+        # Recent events of live sessions, for users the model has not seen yet
+        self.sessions = SessionActivity(SESSION_MAX_SESSIONS, SESSION_MAX_ITEMS, SESSION_IDLE_SECONDS)
+        
+        # Offline training source (data_source.SnapshotSource); None reads the live database
+        self.source = SnapshotSource(TRAINING_SNAPSHOT_DIR) if TRAINING_SNAPSHOT_DIR else None
     
-    def build_user_item_matrix(self, events):
-        """Build user-item interaction matrix with weighted events"""
-        # Event weights
-        event_weights = {
-            'view': 1,
-            'add_to_cart': 3,
-            'purchase': 10,
-            'wishlist': 5,
-            'rating': 7
-        }
-        
-        interactions = []
-        for event in events:
-            user_id = str(event.get('userId') or event.get('sessionId'))
-            product_id = str(event.get('productId'))
-            event_type = event.get('eventType')
-            weight = event_weights.get(event_type, 1)
-            
-            if user_id and product_id:
-                interactions.append({
-                    'user_id': user_id,
-                    'product_id': product_id,
-                    'weight': weight
-                })
-        
-        df = pd.DataFrame(interactions)
-        if df.empty:
-            return None
+    def data_source(self):
+        """Where training reads events and products from"""
+        return self.source or MongoSource(db)
+        
+    def load_data(self, until, days=None):
+        """Load events (default: the training window) and product data from MongoDB or an exported snapshot"""
+        cutoff_date = until - timedelta(days=days or TRAINING_WINDOW_DAYS)
+        source = self.data_source()
         
-        # Aggregate weights
-        df = df.groupby(['user_id', 'product_id'])['weight'].sum().reset_index()
+        # Stream projected events into interned NumPy columns
+        with stage_seconds.time('load_events'):
+            events = source.load_events(until, since=cutoff_date)
         
-        # Create pivot table
-        matrix = df.pivot(index='user_id', columns='product_id', values='weight').fillna(0)
-        return matrix
+        # Load products
+        with stage_seconds.time('load_products'):
+            products = source.load_products()
+        
+        return events, products
     
+    @stage_seconds.time('build_user_item_matrix')
+    def build_user_item_matrix(self, events):
+        """Build sparse user-item interaction matrix with weighted events"""
+        if not len(events):
+            return None, None, None, {}
+        
+        user_codes, product_codes, event_codes, _ = events.columns()
+        shape = (len(events.users), len(events.products))
+        matrix, event_matrices = build_interaction_matrix(user_codes, product_codes, event_codes, shape)
+        return matrix, events.users.to_array(), events.products.to_array(), event_matrices
+    
+    @stage_seconds.time('extract_product_features')
     def extract_product_features(self, products):
-        """Extract features from products for content-based filtering"""
-        features = []
-        product_ids = []
+        """Fit the feature pipeline on the catalog and return (product IDs, CSR feature matrix)"""
+        if not products:
+            return None, None
+        
+        product_ids = pd.Index([str(product['_id']) for product in products])
+        self.featurizer = ProductFeaturizer()
+        return product_ids, self.featurizer.fit_transform(products)
+    
+    def train(self, mode='auto', until=None):
+        """Train the model, incrementally when possible, and publish a new generation.
         
-        for product in products:
-            product_id = str(product['_id'])
-            product_ids.append(product_id)
+        'auto' folds in new events unless there is no model yet or the last
+        full rebuild is older than FULL_REBUILD_INTERVAL, in which case the
+        whole window is reloaded, which also compacts interned IDs.
+        until ends the training window; it defaults to now minus INGEST_LAG,
+        replays of an exported snapshot pass the snapshot's end instead.
+        """
+        with self.train_lock, training_lock(MODEL_DIR):
+            # Another worker process may have published since our last run
+            self.sync_training_state()
             
-            # Numeric features
-            price = product.get('price', 0)
-            discount = product.get('discount', 0)
-            stock = product.get('stock', 0)
-            rating = product.get('rating', 0)
+            if mode == 'auto':
+                stale = self.last_full_train is None or utc_now() - self.last_full_train > FULL_REBUILD_INTERVAL
+                mode = 'full' if stale else 'incremental'
             
-            # Categorical features (one-hot encoded)
-            category_id = str(product.get('category', ''))
-            brand = product.get('brand', '')
+            # Folding an event log into a model it was not built with would count
+            # events twice or miss them, so that falls back to a full rebuild
+            if mode == 'incremental' and self.events is not None and self.events_version != self.model_version:
+                print("Event log does not belong to the loaded model, training full")
+                mode = 'full'
             
-            features.append({
-                'product_id': product_id,
-                'price': price,
-                'discount': discount,
-                'stock': stock,
-                'rating': rating,
-                'category': category_id,
-                'brand': brand
-            })
+            if mode == 'incremental' and self.events is not None:
+                with stage_seconds.time('train_incremental'):
+                    snapshot, training_state = self.train_incremental(until)
+            else:
+                with stage_seconds.time('train_full'):
+                    snapshot, training_state = self.train_full(until)
+            
+            # Single reference swap; requests holding the old snapshot finish on it
+            self.report_progress('publishing')
+            self.model = snapshot
+            # The event log and watermark only advance with a published model, so a
+            # failed run leaves them untouched and the retry loads the same events again
+            self.events = training_state['events']
+            self.watermark = training_state['watermark']
+            self.last_full_train = training_state['last_full_train']
+            
+            self.report_progress('saving')
+            with stage_seconds.time('save_model'):
+                version = self.save_model(snapshot)
+            # A failed save leaves the previous version current on disk; keep pointing at it so
+            # the watcher does not reload that older model over the one just published
+            if version is not None:
+                self.model_version = version
+                self.events_version = version
+            return dict(snapshot.stats, version=version)
+    
+    def sync_training_state(self):
+        """Reload the model and event log when the persisted version is not the one this process's log belongs to"""
+        version = current_version(MODEL_DIR)
+        if version is not None and (version != self.events_version or self.events is None):
+            self.load_model(with_training_state=True, version=version)
+    
+    def save_model(self, snapshot):
+        """Persist a published snapshot and the training state; failures only log"""
+        try:
+            return save_snapshot(
+                snapshot, MODEL_DIR, self.events, self.watermark, self.last_full_train,
+                keep=MODEL_KEEP_VERSIONS
+            )
+        except Exception as e:
+            print(f"Error saving model: {e}")
+            return None
+    
+    def load_model(self, with_training_state=True, version=None):
+        """Publish the newest persisted model, if any. Returns True when one was loaded."""
+        version = version or current_version(MODEL_DIR)
+        snapshot, training_state = load_snapshot(MODEL_DIR, version, with_training_state=with_training_state)
+        if snapshot is None:
+            return False
+        
+        # Generations key the result cache and must only move forward, also when the
+        # persisted model is older than the one served (after a failed save)
+        if snapshot.generation <= self.model.generation:
+            snapshot.generation = self.model.generation + 1
         
-        df = pd.DataFrame(features)
+        if training_state is not None:
+            self.events = training_state['events']
+            self.watermark = training_state['watermark']
+            self.last_full_train = training_state['last_full_train']
+            self.events_version = version
+        self.model = snapshot
+        self.model_version = version
+        return True
+    
+    def watch_model(self, interval=MODEL_POLL_SECONDS):
+        """Poll MODEL_DIR and hot-swap in versions published by other processes"""
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    version = current_version(MODEL_DIR)
+                    # Skip while this process is training; it publishes on its own
+                    if version is None or version == self.model_version or not self.train_lock.acquire(blocking=False):
+                        continue
+                    try:
+                        self.load_model(with_training_state=False, version=version)
+                    finally:
+                        self.train_lock.release()
+                    print(f"Reloaded model generation {self.model.generation} ({version})")
+                except Exception:
+                    traceback.print_exc()
+        
+        threading.Thread(target=poll, name='model-watcher', daemon=True).start()
+    
+    def start_serving(self):
+        """Per-worker startup for the pre-fork server (see gunicorn.conf.py).
+        
+        Memory-maps the published model so all workers share one copy in the
+        page cache, queues a first training run if nothing is published yet,
+        and starts the watcher that picks up new generations. The first
+        trending and eligibility loads are synchronous full scans, so they
+        are done here rather than in a worker's first requests, where they
+        would blow the personalized budget and stall its trending fallback.
+        """
+        if self.load_model(with_training_state=False):
+            print(f"Worker {os.getpid()} serving model generation {self.model.generation}")
+        else:
+            print(f"Worker {os.getpid()} found no model in {MODEL_DIR}, training")
+            self.submit_training('auto')
+        self.watch_model()
+        
+        try:
+            self.trending.ensure_fresh(db.events, db.products)
+            self.eligibility.ensure_fresh(db.products, db.categories)
+        except Exception as e:
+            print(f"Error warming trending counters and eligibility: {e}")
+    
+    def train_full(self, until=None):
+        """Load fresh data and build a complete model snapshot; returns it with its training state"""
+        until = until or utc_now() - INGEST_LAG
+        self.report_progress('loading data')
+        events, products = self.load_data(until)
+        
+        self.report_progress('building matrices')
+        matrix, user_ids, product_ids, event_matrices = self.build_user_item_matrix(events)
+        
+        self.report_progress('building co-occurrence indexes')
+        with stage_seconds.time('build_cooccurrence'):
+            cooccurrence = {
+                event_type: build_cooccurrence_index(event_matrix)
+                for event_type, event_matrix in event_matrices.items()
+            }
+        
+        user_neighbors = None
+        if USER_NEIGHBORS and matrix is not None:
+            self.report_progress('precomputing user neighbors')
+            with stage_seconds.time('build_user_neighbors'):
+                user_neighbors = build_user_neighbors(matrix, k=USER_NEIGHBORS, processes=NEIGHBOR_PROCESSES)
+        
+        self.report_progress('building content index')
+        item_ids, item_vectors, item_index = self.build_content_model(products)
+        
+        self.report_progress('factorizing')
+        factors = self.fit_factors(matrix, ALS_ITERATIONS)
+        
+        snapshot = ModelSnapshot(
+            self.model.generation + 1, matrix, user_ids, product_ids, event_matrices,
+            cooccurrence, item_ids, item_vectors, item_index, factors=factors, user_neighbors=user_neighbors
+        )
+        snapshot.stats.update({
+            'mode': 'full',
+            'source': self.data_source().describe()['kind'],
+            'generation': snapshot.generation,
+            'events': len(events),
+            'products': len(products),
+            'users': matrix.shape[0] if matrix is not None else 0,
+            'interactions': int(matrix.nnz) if matrix is not None else 0,
+            'contentRecallAt10': self.content_index_recall(snapshot)
+        })
+        return snapshot, {'events': events, 'watermark': until, 'last_full_train': until}
+    
+    def train_incremental(self, until=None):
+        """Fold events newer than the watermark into a copy of the current model.
+        
+        New events are appended to, and expired ones compacted out of, a copy
+        of the event log, returned with the snapshot for train() to commit.
+        """
+        previous_model = self.model
+        until = until or utc_now() - INGEST_LAG
+        cutoff = to_timestamp(until - timedelta(days=TRAINING_WINDOW_DAYS))
+        events = self.events.copy()
+        previous_size = len(events)
+        
+        self.report_progress('loading new events')
+        with stage_seconds.time('load_events'):
+            self.data_source().load_events(until, after=self.watermark, log=events)
+        
+        self.report_progress('updating matrices')
+        user_codes, product_codes, event_codes, timestamps = events.columns()
+        added = slice(previous_size, len(events))
+        expired = np.flatnonzero(timestamps[:previous_size] < cutoff)
+        shape = (len(events.users), len(events.products))
+        
+        # Delta matrices for the new and the expired events
+        added_matrix, added_events = build_interaction_matrix(
+            user_codes[added], product_codes[added], event_codes[added], shape
+        )
+        expired_matrix, expired_events = build_interaction_matrix(
+            user_codes[expired], product_codes[expired], event_codes[expired], shape
+        )
+        changed_users = np.union1d(user_codes[added], user_codes[expired])
+        
+        if len(expired):
+            keep = np.ones(len(events), dtype=bool)
+            keep[expired] = False
+            events.compact(keep)
+        
+        base = previous_model.user_item_matrix
+        base = resize_csr(base, shape) if base is not None else csr_matrix(shape, dtype=np.float32)
+        matrix = base + added_matrix - expired_matrix
+        matrix.eliminate_zeros()
+        
+        self.report_progress('updating co-occurrence indexes')
+        event_matrices = {}
+        cooccurrence = {}
+        for event_type in COOCCURRENCE_EVENTS:
+            previous = previous_model.event_matrices.get(event_type)
+            previous = resize_csr(previous, shape) if previous is not None else csr_matrix(shape, dtype=np.float32)
+            event_matrix = previous + added_events[event_type] - expired_events[event_type]
+            event_matrix.eliminate_zeros()
+            event_matrices[event_type] = event_matrix
+            cooccurrence[event_type] = update_cooccurrence(
+                previous_model.cooccurrence.get(event_type), previous, event_matrix, changed_users
+            )
+        
+        user_neighbors = None
+        if USER_NEIGHBORS:
+            self.report_progress('updating user neighbors')
+            with stage_seconds.time('update_user_neighbors'):
+                user_neighbors = update_user_neighbors(
+                    previous_model.user_neighbors, base, matrix, changed_users,
+                    k=USER_NEIGHBORS, processes=NEIGHBOR_PROCESSES
+                )
+        
+        # A few sweeps warm-started from the previous factors; codes only grow between rebuilds
+        self.report_progress('factorizing')
+        factors = self.fit_factors(matrix, ALS_INCREMENTAL_ITERATIONS, previous_model.factors)
+        
+        # Product features are only refreshed by full rebuilds
+        snapshot = ModelSnapshot(
+            previous_model.generation + 1, matrix, events.users.to_array(), events.products.to_array(),
+            event_matrices, cooccurrence, previous_model.item_ids,
+            previous_model.item_vectors, previous_model.item_index, factors=factors,
+            user_neighbors=user_neighbors
+        )
+        snapshot.stats.update({
+            'mode': 'incremental',
+            'generation': snapshot.generation,
+            'events': len(events),
+            'newEvents': added.stop - added.start,
+            'expiredEvents': len(expired),
+            'users': matrix.shape[0],
+            'interactions': int(matrix.nnz)
+        })
+        return snapshot, {'events': events, 'watermark': until, 'last_full_train': self.last_full_train}
+    
+    @stage_seconds.time('factorize')
+    def fit_factors(self, matrix, iterations, previous=None):
+        """Fit implicit ALS on the weighted interaction matrix, or None when disabled"""
+        if not ALS_FACTORS or matrix is None or not matrix.nnz:
+            return None
+        
+        factors = ImplicitALS(
+            ALS_FACTORS, ALS_REGULARIZATION, ALS_ALPHA, iterations, n_threads=ALS_THREADS
+        )
+        if previous is None:
+            return factors.fit(matrix)
+        return factors.fit(matrix, previous.user_factors, previous.item_factors)
+    
+    @stage_seconds.time('build_content_model')
+    def build_content_model(self, products):
+        """Extract product features and build the approximate nearest-neighbor index over them"""
+        item_ids, item_vectors = self.extract_product_features(products)
+        if item_ids is None:
+            return None, None, None
+        
+        item_index = IVFIndex(n_probe=ANN_PROBES).fit(item_vectors)
+        return item_ids, item_vectors, item_index
+    
+    def report_progress(self, stage):
+        """Record the current training stage on the running job, if any"""
+        job = self.progress
+        if job is not None:
+            job['progress'] = stage
+    
+    def submit_training(self, mode='auto'):
+        """Queue a training run on the background worker and return its job.
+        
+        While a job is queued or running, further requests join it instead
+        of stacking up more rebuilds behind it.
+        """
+        with self.jobs_lock:
+            for job in reversed(self.jobs.values()):
+                if job['status'] in ('queued', 'running'):
+                    return dict(job)
+            
+            job = {
+                'jobId': uuid.uuid4().hex,
+                'mode': mode,
+                'status': 'queued',
+                'progress': None,
+                'submittedAt': utc_now().isoformat() + 'Z',
+                'startedAt': None,
+                'finishedAt': None,
+                'generation': None,
+                'stats': None,
+                'error': None
+            }
+            self.jobs[job['jobId']] = job
+            while len(self.jobs) > MAX_TRAINING_JOBS:
+                self.jobs.popitem(last=False)
+        
+        self.save_job(job)
+        self.executor.submit(self.run_training_job, job)
+        return dict(job)
+    
+    def run_training_job(self, job):
+        """Worker body: train and record the outcome on the job"""
+        job['status'] = 'running'
+        job['startedAt'] = utc_now().isoformat() + 'Z'
+        self.progress = job
+        self.save_job(job)
+        try:
+            job['stats'] = self.train(job['mode'])
+            job['generation'] = self.model.generation
+            job['progress'] = 'done'
+            job['status'] = 'succeeded'
+        except Exception as e:
+            traceback.print_exc()
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            self.progress = None
+            job['finishedAt'] = utc_now().isoformat() + 'Z'
+            self.save_job(job)
+    
+    def save_job(self, job):
+        """Record a job under MODEL_DIR so any worker process can report on it"""
+        jobs_dir = os.path.join(MODEL_DIR, 'jobs')
+        try:
+            os.makedirs(jobs_dir, exist_ok=True)
+            path = os.path.join(jobs_dir, f"{job['jobId']}.json")
+            with open(path + '.tmp', 'w') as f:
+                json.dump(job, f, default=str)
+            os.replace(path + '.tmp', path)
+            
+            finished = sorted(
+                (os.path.join(jobs_dir, name) for name in os.listdir(jobs_dir) if name.endswith('.json')),
+                key=os.path.getmtime
+            )
+            for stale in finished[:-MAX_TRAINING_JOBS]:
+                os.remove(stale)
+        except OSError:
+            traceback.print_exc()
+    
+    def training_status(self, job_id=None):
+        """A job by ID, or the most recent one when job_id is None"""
+        with self.jobs_lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+            else:
+                job = next(reversed(self.jobs.values()), None)
+            if job is not None:
+                return dict(job)
         
-        # One-hot encode categorical features
-        df = pd.get_dummies(df, columns=['category', 'brand'])
+        # Submitted to another worker process
+        if job_id is not None:
+            try:
+                with open(os.path.join(MODEL_DIR, 'jobs', f'{os.path.basename(job_id)}.json')) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return None
+    
+    def content_index_recall(self, model=None, k=10, n_queries=100, n_probe=None):
+        """Recall@k of the content index against exact search, on sampled product vectors"""
+        model = model or self.model
+        if model.item_index is None:
+            return None
         
-        return df.set_index('product_id')
+        rng = np.random.default_rng(0)
+        n_items = model.item_vectors.shape[0]
+        rows = rng.choice(n_items, min(n_queries, n_items), replace=False)
+        return round(model.item_index.recall_at_k(model.item_vectors[rows], k, n_probe), 4)
     
-    def collaborative_filtering(self, user_id, k=10):
+    @stage_seconds.time('collaborative_filtering')
+    def collaborative_filtering(self, user_id, k=10, n_neighbors=10, model=None, category=None):
         """Collaborative filtering recommendations"""
-        if self.user_item_matrix is None or user_id not in self.user_item_matrix.index:
+        model = model or self.model
+        if model.user_item_matrix is None or user_id not in model.user_index:
             return []
+        eligible = self.eligible(model, category)
         
         # Get user vector
-        user_vector = self.user_item_matrix.loc[user_id].values.reshape(1, -1)
-        
-        # Calculate similarity with all users
-        similarities = cosine_similarity(user_vector, self.user_item_matrix.values)[0]
+        user_row = model.user_index[user_id]
+        user_vector = model.user_item_matrix[user_row]
         
         # Get top similar users
-        similar_users_idx = np.argsort(similarities)[::-1][1:11]  # Top 10, excluding self
+        neighbors, similarities = self.similar_users(user_row, n_neighbors, model)
+        if not len(neighbors):
+            return []
         
-        # Aggregate items from similar users
-        recommendations = {}
-        for idx in similar_users_idx:
-            similar_user_id = self.user_item_matrix.index[idx]
-            user_items = self.user_item_matrix.loc[similar_user_id]
-            
-            for product_id, score in user_items.items():
-                if score > 0 and product_id not in self.user_item_matrix.loc[user_id]:
-                    recommendations[product_id] = recommendations.get(product_id, 0) + score * similarities[idx]
+        # Similarity-weighted sum of the neighbors' rows in one sparse product
+        weights = csr_matrix(
+            (similarities, (np.zeros(len(neighbors), dtype=np.int32), neighbors)),
+            shape=(1, model.user_item_matrix.shape[0])
+        )
+        scores = (weights @ model.user_item_matrix).tocsr()
+        scores.sort_indices()
+        
+        # Mask items the user already has
+        candidates = scores.indices
+        candidate_scores = scores.data.copy()
+        candidate_scores[np.isin(candidates, user_vector.indices)] = -np.inf
+        candidate_scores[~eligible.products[candidates]] = -np.inf
+        
+        best = top_k(candidate_scores, k)
+        best = best[np.isfinite(candidate_scores[best]) & (candidate_scores[best] > 0)]
+        return model.product_ids[candidates[best]].tolist()
+    
+    def similar_users(self, user_row, n_neighbors=10, model=None):
+        """Rows and cosine similarities of a user row's nearest neighbors, best first"""
+        model = model or self.model
+        if model.user_neighbors is not None and n_neighbors <= model.user_neighbors[0].shape[1]:
+            # Precomputed by training
+            neighbors = model.user_neighbors[0][user_row, :n_neighbors]
+            present = neighbors >= 0
+            return neighbors[present], model.user_neighbors[1][user_row, :n_neighbors][present]
+        
+        # Cosine similarity with every user sharing at least one item
+        overlap = (model.user_item_matrix[user_row] @ model.item_user_matrix).tocsr()
+        overlap.sort_indices()
+        neighbors = overlap.indices
+        similarities = overlap.data / (model.user_norms[neighbors] * model.user_norms[user_row])
+        similarities[neighbors == user_row] = 0
         
-        # Sort and return top k
-        sorted_recs = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:k]
-        return [product_id for product_id, score in sorted_recs]
+        top = top_k(similarities, n_neighbors)
+        top = top[similarities[top] > 0]
+        return neighbors[top], similarities[top]
     
-    def content_based_filtering(self, user_id, k=10):
+    @stage_seconds.time('content_based_filtering')
+    def content_based_filtering(self, user_id, k=10, n_probe=None, model=None, category=None):
         """Content-based recommendations based on user preferences"""
-        if self.user_item_matrix is None or user_id not in self.user_item_matrix.index:
+        model = model or self.model
+        if model.user_item_matrix is None or user_id not in model.user_index:
             return []
         
         # Get user's previously interacted items
-        user_items = self.user_item_matrix.loc[user_id]
-        interacted_items = user_items[user_items > 0].index.tolist()
+        user_vector = model.user_item_matrix[model.user_index[user_id]]
+        interacted_items = model.product_ids[user_vector.indices[user_vector.data > 0]]
         
-        if not interacted_items or self.item_features is None:
+        if not len(interacted_items) or model.item_index is None:
             return []
         
         # Calculate average features of items user liked
-        interacted_features = self.item_features.loc[
-            self.item_features.index.isin(interacted_items)
+        interacted_rows = model.item_ids.get_indexer(interacted_items)
+        interacted_rows = interacted_rows[interacted_rows >= 0]
+        if not len(interacted_rows):
+            return []
+        avg_features = model.item_vectors[interacted_rows].mean(axis=0)
+        
+        # Find similar items, excluding already interacted ones
+        top_indices = model.item_index.search(
+            avg_features, k, n_probe, exclude=interacted_rows, allowed=self.eligible(model, category).items
+        )
+        return model.item_ids[top_indices].tolist()
+    
+    def related_products(self, product_id, event_type, k=6, model=None):
+        """Products most often co-interacted with product_id for an event type"""
+        model = model or self.model
+        index = model.cooccurrence.get(event_type)
+        if index is None or product_id not in model.product_index:
+            return []
+        
+        with stage_seconds.time(f'related_{event_type}'):
+            neighbors, counts = index
+            # Neighbors are stored best first, so the first k eligible ones are the answer
+            item_neighbors = neighbors[model.product_index[product_id]]
+            item_neighbors = item_neighbors[item_neighbors >= 0]
+            item_neighbors = item_neighbors[self.eligible(model).products[item_neighbors]]
+            return model.product_ids[item_neighbors[:k]].tolist()
+    
+    @stage_seconds.time('matrix_factorization')
+    def matrix_factorization(self, user_id, k=10, model=None, history=None, category=None):
+        """Implicit ALS recommendations: one item-factor product, independent of the user count.
+        
+        history is the user's recent event documents when the caller already
+        fetched them (see async_app.py); otherwise unseen users are looked up.
+        """
+        model = model or self.model
+        factors = model.factors
+        if factors is None:
+            return []
+        
+        if user_id in model.user_index:
+            user_row = model.user_index[user_id]
+            user_factor = factors.user_factors[user_row]
+            seen = model.user_item_matrix[user_row].indices
+        else:
+            # New users and sessions are folded in from their recent events
+            if history is None:
+                history = self.session_history(user_id) or self.recent_interactions(user_id)
+            seen, weights = interaction_weights(history, model)
+            if not len(seen):
+                return []
+            user_factor = factors.fold_in(seen, weights)
+        
+        best = factors.recommend(user_factor, k, exclude=seen, allowed=self.eligible(model, category).products)
+        return model.product_ids[best].tolist()
+    
+    @stage_seconds.time('recent_interactions')
+    def recent_interactions(self, user_id):
+        """A user's or session's latest events, for fold-in"""
+        return list(
+            db.events.find(recent_events_query(user_id), FOLD_IN_PROJECTION).sort('createdAt', -1).limit(FOLD_IN_EVENTS)
+        )
+    
+    def record_events(self, events):
+        """Buffer tracked event documents under their user or session ID; returns how many were kept"""
+        accepted = 0
+        for event in events:
+            user_id = event.get('userId') or event.get('sessionId')
+            product_id = event.get('productId')
+            if not user_id or not product_id or not event.get('eventType'):
+                continue
+            self.sessions.record(str(user_id), str(product_id), event['eventType'])
+            accepted += 1
+        return accepted
+    
+    def session_history(self, user_id):
+        """Buffered events of a session as event documents, newest first"""
+        return [
+            {'productId': product_id, 'eventType': event_type}
+            for product_id, event_type, _ in self.sessions.recent(user_id)
         ]
-        avg_features = interacted_features.mean().values.reshape(1, -1)
+    
+    @stage_seconds.time('session_recommendations')
+    def session_recommendations(self, user_id, k=10, model=None, history=None, category=None):
+        """Recommendations for a user the model has not seen, from their latest events.
+        
+        Each buffered product (or, when this worker has none, each product in
+        history or the stored recent events) is expanded through its
+        co-occurrence neighbors and the content index around the weighted
+        mean of their features; the two lists are merged like the hybrid.
+        """
+        model = model or self.model
+        seeds = self.sessions.seed_weights(user_id, EVENT_WEIGHTS, SESSION_DECAY)
+        if not seeds:
+            if history is None:
+                history = self.recent_interactions(user_id)
+            for position, event in enumerate(history):
+                product_id = str(event.get('productId'))
+                seeds[product_id] = seeds.get(product_id, 0) + (
+                    EVENT_WEIGHTS.get(event.get('eventType'), 1) * SESSION_DECAY ** position
+                )
+        
+        columns = np.array([model.product_index.get(product_id, -1) for product_id in seeds], dtype=np.int64)
+        weights = np.fromiter(seeds.values(), dtype=np.float32, count=len(seeds))
+        known = columns >= 0
+        columns, weights = columns[known], weights[known]
+        if not len(columns):
+            return []
+        
+        eligible = self.eligible(model, category)
         
-        # Find similar items
-        similarities = cosine_similarity(avg_features, self.item_features.values)[0]
+        # Rank-discounted neighbor scores, summed over seeds and event types
+        candidates, scores = [], []
+        rank_weights = 1 / np.arange(1, SESSION_NEIGHBORS + 1, dtype=np.float32)
+        for event_type in COOCCURRENCE_EVENTS:
+            index = model.cooccurrence.get(event_type)
+            if index is None:
+                continue
+            neighbors = index[0][columns, :SESSION_NEIGHBORS]
+            neighbor_scores = weights[:, None] * rank_weights[None, :neighbors.shape[1]]
+            present = neighbors >= 0
+            candidates.append(neighbors[present])
+            scores.append(neighbor_scores[present])
+        collab_recs = []
+        if candidates:
+            products, positions = np.unique(np.concatenate(candidates), return_inverse=True)
+            totals = np.bincount(positions, weights=np.concatenate(scores))
+            totals[np.isin(products, columns) | ~eligible.products[products]] = 0
+            best = top_k(totals, k * 2)
+            collab_recs = model.product_ids[products[best[totals[best] > 0]]].tolist()
         
-        # Exclude already interacted items
-        for item in interacted_items:
-            if item in self.item_features.index:
-                item_idx = self.item_features.index.get_loc(item)
-                similarities[item_idx] = -1
+        content_recs = []
+        if model.item_index is not None:
+            rows = model.item_ids.get_indexer(model.product_ids[columns])
+            liked = rows >= 0
+            if liked.any():
+                mean = weights[liked] @ model.item_vectors[rows[liked]] / weights[liked].sum()
+                top_indices = model.item_index.search(
+                    np.asarray(mean).ravel(), k * 2, exclude=rows[liked], allowed=eligible.items
+                )
+                content_recs = model.item_ids[top_indices].tolist()
         
-        # Get top k
-        top_indices = np.argsort(similarities)[::-1][:k]
-        return [self.item_features.index[idx] for idx in top_indices]
+        return merge_hybrid(collab_recs, content_recs, k)
     
-    def hybrid_recommendations(self, user_id, k=10):
+    def hybrid_recommendations(self, user_id, k=10, model=None, category=None):
         """Hybrid approach combining collaborative and content-based"""
-        collab_recs = self.collaborative_filtering(user_id, k * 2)
-        content_recs = self.content_based_filtering(user_id, k * 2)
+        # Read the published model once so both scorers see the same generation
+        model = model or self.model
+        collab_recs = self.collaborative_filtering(user_id, k * 2, model=model, category=category)
+        content_recs = self.content_based_filtering(user_id, k * 2, model=model, category=category)
+        
+        with stage_seconds.time('hybrid_merge'):
+            return merge_hybrid(collab_recs, content_recs, k)
+    
+    def batch_recommendations(self, user_ids=None, k=10, block_size=BATCH_BLOCK_SIZE, model=None):
+        """Yield hybrid recommendations for many users, scoring them in blocks.
         
-        # Merge with weighted scores
-        combined = {}
-        for i, prod_id in enumerate(collab_recs):
-            combined[prod_id] = combined.get(prod_id, 0) + (len(collab_recs) - i) * 0.6
+        user_ids defaults to every user in the model (everyone active in the
+        training window). Users without recommendations get trending products.
+        Results are dicts with userId, productIds and method, in input order.
+        """
+        model = model or self.model
+        if user_ids is None:
+            user_ids = model.user_ids.tolist() if model.user_ids is not None else []
         
-        for i, prod_id in enumerate(content_recs):
-            combined[prod_id] = combined.get(prod_id, 0) + (len(content_recs) - i) * 0.4
+        # Product column -> content row, shared by every block
+        content_map = None
+        if model.item_index is not None and model.product_ids is not None:
+            content_rows = model.item_ids.get_indexer(model.product_ids)
+            known = np.flatnonzero(content_rows >= 0)
+            content_map = csr_matrix(
+                (np.ones(len(known), dtype=np.float32), (known, content_rows[known])),
+                shape=(len(model.product_ids), len(model.item_ids))
+            )
         
-        sorted_recs = sorted(combined.items(), key=lambda x: x[1], reverse=True)[:k]
-        return [product_id for product_id, score in sorted_recs]
+        fallback = None
+        for start in range(0, len(user_ids), block_size):
+            block_ids = user_ids[start:start + block_size]
+            rows = np.array([model.user_index.get(user_id, -1) for user_id in block_ids], dtype=np.int64)
+            known = np.flatnonzero(rows >= 0)
+            
+            collab = self.batch_collaborative_filtering(rows[known], k * 2, model=model)
+            content = self.batch_content_based_filtering(rows[known], k * 2, content_map, model=model)
+            recommendations = [[] for _ in block_ids]
+            for i, position in enumerate(known):
+                recommendations[position] = merge_hybrid(collab[i], content[i], k)
+            
+            for user_id, product_ids in zip(block_ids, recommendations):
+                if len(product_ids) < k and fallback is None:
+                    fallback = self.cold_start_recommendations(k * 2)
+                if product_ids:
+                    yield {'userId': user_id, 'productIds': fill_to_limit(product_ids, fallback, k), 'method': 'hybrid'}
+                    continue
+                yield {'userId': user_id, 'productIds': fallback[:k], 'method': 'cold_start'}
     
-    def cold_start_recommendations(self, k=10):
-        """Recommendations for new users with no history"""
-        # Return trending/popular items
-        cutoff_date = datetime.now() - timedelta(days=7)
-        
-        pipeline = [
-            {
-                '$match': {
-                    'createdAt': {'$gte': cutoff_date},
-                    'eventType': {'$in': ['view', 'purchase', 'add_to_cart']}
-                }
-            },
-            {
-                '$group': {
-                    '_id': '$productId',
-                    'score': {
-                        '$sum': {
-                            '$switch': {
-                                'branches': [
-                                    {'case': {'$eq': ['$eventType', 'purchase']}, 'then': 10},
-                                    {'case': {'$eq': ['$eventType', 'add_to_cart']}, 'then': 3},
-                                    {'case': {'$eq': ['$eventType', 'view']}, 'then': 1}
-                                ],
-                                'default': 0
-                            }
-                        }
-                    }
-                }
-            },
-            {'$sort': {'score': -1}},
-            {'$limit': k}
-        ]
+    @stage_seconds.time('batch_collaborative_filtering')
+    def batch_collaborative_filtering(self, rows, k=10, n_neighbors=10, model=None):
+        """collaborative_filtering for a block of user rows, one sparse product per step"""
+        model = model or self.model
+        if not len(rows):
+            return []
+        eligible = self.eligible(model)
+        
+        block = model.user_item_matrix[rows]
+        shape = (len(rows), model.user_item_matrix.shape[0])
+        if model.user_neighbors is not None and n_neighbors <= model.user_neighbors[0].shape[1]:
+            # Each user's precomputed top neighbors as a (block x users) weight matrix
+            neighbors = model.user_neighbors[0][rows, :n_neighbors]
+            present = neighbors >= 0
+            weights = csr_matrix(
+                (model.user_neighbors[1][rows, :n_neighbors][present], (np.nonzero(present)[0], neighbors[present])),
+                shape=shape
+            )
+        else:
+            # Cosine similarity of every block user with every overlapping user
+            overlap = (block @ model.item_user_matrix).tocsr()
+            overlap.sort_indices()
+            row_of_entry = np.repeat(np.arange(len(rows)), np.diff(overlap.indptr))
+            similarities = overlap.data / (model.user_norms[overlap.indices] * model.user_norms[rows[row_of_entry]])
+            similarities[overlap.indices == rows[row_of_entry]] = 0
+            
+            # Keep each user's top neighbors as a (block x users) weight matrix
+            weight_rows, weight_cols, weight_data = [], [], []
+            for i in range(len(rows)):
+                start, end = overlap.indptr[i], overlap.indptr[i + 1]
+                top = top_k(similarities[start:end], n_neighbors) + start
+                top = top[similarities[top] > 0]
+                weight_rows.append(np.full(len(top), i))
+                weight_cols.append(overlap.indices[top])
+                weight_data.append(similarities[top])
+            weights = csr_matrix(
+                (np.concatenate(weight_data), (np.concatenate(weight_rows), np.concatenate(weight_cols))),
+                shape=shape
+            )
+        scores = (weights @ model.user_item_matrix).tocsr()
+        scores.sort_indices()
         
-        results = list(db.events.aggregate(pipeline))
-        return [str(r['_id']) for r in results]
+        results = []
+        for i in range(len(rows)):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            candidates = scores.indices[start:end]
+            candidate_scores = scores.data[start:end].copy()
+            candidate_scores[np.isin(candidates, block.indices[block.indptr[i]:block.indptr[i + 1]])] = -np.inf
+            candidate_scores[~eligible.products[candidates]] = -np.inf
+            
+            best = top_k(candidate_scores, k)
+            best = best[np.isfinite(candidate_scores[best]) & (candidate_scores[best] > 0)]
+            results.append(model.product_ids[candidates[best]].tolist())
+        return results
+    
+    @stage_seconds.time('batch_content_based_filtering')
+    def batch_content_based_filtering(self, rows, k=10, content_map=None, n_probe=None, model=None):
+        """content_based_filtering for a block of user rows, averaging features in one sparse product"""
+        model = model or self.model
+        if content_map is None or not len(rows):
+            return [[] for _ in rows]
+        
+        # Positively weighted items of each user, mapped onto content rows
+        block = model.user_item_matrix[rows]
+        liked = block.copy()
+        liked.data = (liked.data > 0).astype(np.float32)
+        liked.eliminate_zeros()
+        liked = (liked @ content_map).tocsr()
+        counts = np.diff(liked.indptr)
+        feature_sums = liked @ model.item_vectors
+        allowed = self.eligible(model).items
+        
+        results = []
+        for i in range(len(rows)):
+            if not counts[i]:
+                results.append([])
+                continue
+            interacted_rows = liked.indices[liked.indptr[i]:liked.indptr[i + 1]]
+            row = feature_sums[i].toarray() if issparse(feature_sums) else np.asarray(feature_sums[i])
+            avg_features = row.ravel() / counts[i]
+            top_indices = model.item_index.search(avg_features, k, n_probe, exclude=interacted_rows, allowed=allowed)
+            results.append(model.item_ids[top_indices].tolist())
+        return results
+    
+    @stage_seconds.time('cold_start_recommendations')
+    def cold_start_recommendations(self, k=10, window=None, weights=None, category=None):
+        """Recommendations for new users with no history"""
+        # Return trending/popular items from the in-memory counters, skipping ineligible ones
+        self.trending.ensure_fresh(db.events, db.products)
+        self.eligibility.ensure_fresh(db.products, db.categories)
+        return self.trending.top(k, window, weights, category, allowed=self.eligibility.allows)
+    
+    def eligible(self, model, category=None):
+        """Eligibility masks over model's product columns and content rows"""
+        self.eligibility.ensure_fresh(db.products, db.categories)
+        return self.eligibility.masks(model, category)
+    
+    def hydrate(self, response):
+        """Copy of response with summaries of its productIds as 'products', None for unknown products"""
+        self.eligibility.ensure_fresh(db.products, db.categories)
+        return dict(response, products=self.eligibility.summaries(response['productIds']))
 
 # Initialize engine
 engine = RecommendationEngine()
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+scoring_executor = ThreadPoolExecutor(max_workers=SCORING_THREADS, thread_name_prefix='score')
+flights = SingleFlight(scoring_executor)
+admission = AdmissionControl(PERSONALIZED_MAX_PENDING, backlog=lambda: len(flights.flights))
+profiler = SamplingProfiler()
+
+def model_memory_bytes():
+    """Bytes held by the published model, per part (memory-mapped arrays included)"""
+    model = engine.model
+    factors = model.factors
+    index = model.item_index
+    return {
+        'interactions': nbytes([model.user_item_matrix, model.item_user_matrix, model.user_norms]),
+        'event_matrices': nbytes(model.event_matrices),
+        'cooccurrence': nbytes(model.cooccurrence),
+        'content': nbytes(model.item_vectors) + (
+            nbytes([index.vectors, index.centroids, index.list_offsets, index.list_items]) if index is not None else 0
+        ),
+        'factors': nbytes([factors.user_factors, factors.item_factors]) if factors is not None else 0,
+        'user_neighbors': nbytes(model.user_neighbors)
+    }
+
+metrics.gauge('ml_model_generation', 'Generation of the published model', lambda: engine.model.generation)
+metrics.gauge('ml_model_users', 'Users in the published model', lambda: engine.model.describe()['users'])
+metrics.gauge('ml_model_products', 'Products in the published model', lambda: engine.model.describe()['products'])
+metrics.gauge('ml_model_matrix_nnz', 'Non-zero user-item interactions', lambda: engine.model.describe()['interactions'])
+metrics.gauge('ml_model_memory_bytes', 'Array memory of the published model', model_memory_bytes, label='part')
+metrics.counter('ml_result_cache_hits_total', 'Result cache hits', lambda: result_cache.stats()['hits'])
+metrics.counter('ml_result_cache_misses_total', 'Result cache misses', lambda: result_cache.stats()['misses'])
+metrics.counter('ml_result_cache_evictions_total', 'Result cache LRU evictions', lambda: result_cache.stats()['evictions'])
+metrics.gauge('ml_result_cache_entries', 'Entries in the result cache', lambda: result_cache.stats()['entries'])
+metrics.gauge('ml_result_cache_hit_ratio', 'Result cache hits per lookup', lambda: result_cache.stats()['hitRate'])
+metrics.counter('ml_personalized_coalesced_total', 'Requests that joined an identical in-flight computation',
+                lambda: flights.stats()['coalesced'])
+metrics.counter('ml_personalized_shed_total', 'Requests rejected by admission control', lambda: admission.stats()['shed'])
+metrics.counter('ml_personalized_deadline_fallbacks_total', 'Requests answered with trending after missing the budget',
+                lambda: admission.stats()['deadlineFallbacks'])
+metrics.gauge('ml_eligible_products', 'Published, in-stock products', lambda: engine.eligibility.stats()['eligible'])
+metrics.gauge('ml_sessions_active', 'Sessions with buffered recent activity', lambda: engine.sessions.stats()['sessions'])
+metrics.counter('ml_session_events_total', 'Events recorded through /events', lambda: engine.sessions.stats()['recorded'])
+metrics.counter('ml_session_evictions_total', 'Idle or least recently active sessions evicted',
+                lambda: engine.sessions.stats()['evicted'])
+metrics.gauge('ml_personalized_pending', 'Requests waiting on scoring', lambda: admission.stats()['pending'])
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed responses are timed until their first chunk is ready
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_seconds.observe(endpoint, time.perf_counter() - started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint for this worker"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['POST'])
+def profile():
+    """Sample this worker's threads for a while and return flame-graph stacks"""
+    if not PROFILING_ENABLED:
+        return jsonify({'error': 'Profiling is disabled, set PROFILING_ENABLED=1'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    seconds = min(float(data.get('seconds', 10)), PROFILE_MAX_SECONDS)
+    try:
+        stacks = profiler.profile(seconds, float(data.get('intervalMs', 5)) / 1000)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    return Response(stacks, mimetype='text/plain', headers={'X-Profile-Samples': str(profiler.samples)})
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy'})
+    return jsonify({
+        'status': 'healthy',
+        'pid': os.getpid(),
+        'generation': engine.model.generation,
+        'cache': result_cache.stats(),
+        'trending': engine.trending.stats(),
+        'admission': dict(admission.stats(), **flights.stats()),
+        'sessions': engine.sessions.stats(),
+        'eligibility': engine.eligibility.stats()
+    })
 
 @app.route('/train', methods=['POST'])
 def train_model():
-    """Train/update the recommendation models"""
+    """Start a background training run and return its job ID"""
     try:
-        events, products, user_profiles = engine.load_data()
-        
-        # Build matrices
-        engine.user_item_matrix = engine.build_user_item_matrix(events)
-        engine.item_features = engine.extract_product_features(products)
+        data = request.get_json(silent=True) or {}
+        job = engine.submit_training(data.get('mode', 'auto'))
         
         return jsonify({
             'success': True,
-            'message': 'Model trained successfully',
-            'stats': {
-                'events': len(events),
-                'products': len(products),
-                'users': len(engine.user_item_matrix.index) if engine.user_item_matrix is not None else 0
-            }
-        })
+            'message': 'Training started',
+            'jobId': job['jobId'],
+            'status': job['status'],
+            'generation': engine.model.generation
+        }), 202
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/train/status', methods=['GET'])
+def get_training_status():
+    """Report a training job's progress and the currently served generation"""
+    job_id = request.args.get('jobId')
+    job = engine.training_status(job_id)
+    if job_id and job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    return jsonify({
+        'job': job,
+        'model': engine.model.describe()
+    })
+
+@app.route('/events', methods=['POST'])
+def ingest_events():
+    """Buffer tracked events for session recommendations.
+    
+    Takes one event or {'events': [...]} with userId/sessionId, productId
+    and eventType, as the backend stores them; it posts without waiting.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        events = data.get('events', [data])
+        if not isinstance(events, list):
+            return jsonify({'error': 'events must be a list'}), 400
+        if len(events) > MAX_INGEST_EVENTS:
+            return jsonify({'error': f'At most {MAX_INGEST_EVENTS} events per request'}), 413
+        
+        return jsonify({'accepted': engine.record_events(events)}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def personalized_cache_key(user_id, limit, engine_name, model, category=None):
+    """Result cache key; new activity of a user the model lacks makes a new key"""
+    activity = engine.sessions.version(user_id) if user_id and user_id not in model.user_index else 0
+    return (user_id, limit, engine_name, category, activity)
+
+def personalized_response(user_id, limit, engine_name, model, cache_key, category=None):
+    """Compute and cache one personalized response; runs on the scoring pool"""
+    if not user_id:
+        # Cold start
+        recommendations = engine.cold_start_recommendations(limit, category=category)
+    else:
+        if engine_name == 'als':
+            # Matrix factorization, folding in users the model has not seen
+            recommendations = engine.matrix_factorization(user_id, limit, model=model, category=category)
+        elif user_id in model.user_index:
+            # Hybrid recommendations
+            recommendations = engine.hybrid_recommendations(user_id, limit, model=model, category=category)
+        else:
+            # Not trained on yet: expand the session's latest products
+            recommendations = engine.session_recommendations(user_id, limit, model=model, category=category)
+            if recommendations:
+                engine_name = 'session'
+        
+        # Top up with cold start when eligibility filtering left fewer than limit
+        if len(recommendations) < limit:
+            recommendations = fill_to_limit(
+                recommendations, engine.cold_start_recommendations(limit * 2, category=category), limit
+            )
+    
+    response = {
+        'productIds': recommendations,
+        'method': 'cold_start' if not user_id else engine_name
+    }
+    result_cache.put(cache_key, model.generation, response)
+    return response
+
 @app.route('/recommendations/personalized', methods=['POST'])
 def get_personalized_recommendations():
-    """Get personalized recommendations for a user"""
+    """Get personalized recommendations for a user.
+    
+    Only published, in-stock products (optionally in the request's
+    category) are returned; with hydrate set, their summaries come along
+    as 'products' so the caller needs no product lookup. Identical
+    concurrent requests share one computation. A request whose computation
+    misses PERSONALIZED_BUDGET_MS gets trending products with method
+    'trending_fallback', while the computation finishes into the cache;
+    past PERSONALIZED_MAX_PENDING waiting requests, new ones get 503.
+    """
+    started = time.monotonic()
     try:
         data = request.json
         user_id = data.get('userId') or data.get('sessionId')
         limit = int(data.get('limit', 10))
+        engine_name = data.get('engine') or RECOMMENDATION_ENGINE
+        category = str(data['category']) if data.get('category') else None
+        hydrate = bool(data.get('hydrate'))
+        if engine_name not in RECOMMENDATION_ENGINES:
+            return jsonify({'error': f"Unknown engine '{engine_name}'"}), 400
         
-        if not user_id:
-            # Cold start
-            recommendations = engine.cold_start_recommendations(limit)
-        else:
-            # Hybrid recommendations
-            recommendations = engine.hybrid_recommendations(user_id, limit)
-            
-            # Fallback to cold start if no recommendations
-            if not recommendations:
-                recommendations = engine.cold_start_recommendations(limit)
+        # Results only change with the model, so cache them per generation, but not
+        # past a product becoming ineligible
+        model = engine.model
+        cache_key = personalized_cache_key(user_id, limit, engine_name, model, category)
+        response = result_cache.get(cache_key, model.generation)
+        if response is not None and all(engine.eligibility.allows(p, category) for p in response['productIds']):
+            return jsonify(engine.hydrate(response) if hydrate else response)
         
-        return jsonify({
-            'productIds': recommendations,
-            'method': 'cold_start' if not user_id else 'hybrid'
-        })
+        with admission.admit():
+            future = flights.submit(cache_key + (model.generation,), personalized_response,
+                                    user_id, limit, engine_name, model, cache_key, category)
+            budget = PERSONALIZED_BUDGET_MS / 1000 - (time.monotonic() - started) if PERSONALIZED_BUDGET_MS else None
+            try:
+                response = future.result(timeout=max(budget, 0) if budget is not None else None)
+            except FutureTimeout:
+                admission.record_fallback()
+                response = {
+                    'productIds': engine.cold_start_recommendations(limit, category=category),
+                    'method': 'trending_fallback'
+                }
+        
+        if hydrate:
+            with stage_seconds.time('hydrate'):
+                response = engine.hydrate(response)
+        with stage_seconds.time('serialize'):
+            return jsonify(response)
+    except Overloaded:
+        return jsonify({'error': 'Too many pending requests, retry later'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/recommendations/also-bought', methods=['POST'])
-def get_also_bought():
-    """Get 'customers also bought' recommendations"""
+@app.route('/recommendations/trending', methods=['POST'])
+def get_trending():
+    """Trending products over a sliding window, optionally per category"""
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = int(data.get('limit', 10))
+        
+        recommendations = engine.cold_start_recommendations(
+            limit, data.get('window'), data.get('weights'), data.get('category')
+        )
+        
+        response = {'productIds': recommendations}
+        return jsonify(engine.hydrate(response) if data.get('hydrate') else response)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/recommendations/personalized/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Stream personalized recommendations for many users as NDJSON"""
+    try:
+        data = request.get_json(silent=True) or {}
+        user_ids = data.get('userIds')
+        limit = int(data.get('limit', 10))
+        
+        if not user_ids and not data.get('allActive'):
+            return jsonify({'error': 'userIds or allActive is required'}), 400
+        
+        results = engine.batch_recommendations([str(user_id) for user_id in user_ids] if user_ids else None, limit)
+        return Response((json.dumps(result) + '\n' for result in results), mimetype='application/x-ndjson')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def related_products_response(event_type):
+    """Answer a related-products request from the co-occurrence index"""
     try:
         data = request.json
         product_id = data.get('productId')
         limit = int(data.get('limit', 6))
         
-        # Find users who purchased this product
-        purchase_events = list(db.events.find({
-            'productId': pymongo.ObjectId(product_id),
-            'eventType': 'purchase'
-        }).limit(100))
-        
-        user_ids = [str(e.get('userId') or e.get('sessionId')) for e in purchase_events]
-        
-        # Find what else they bought
-        other_purchases = list(db.events.find({
-            '$or': [
-                {'userId': {'$in': [pymongo.ObjectId(uid) for uid in user_ids if uid.startswith('session_') is False]}},
-                {'sessionId': {'$in': [uid for uid in user_ids if uid.startswith('session_')]}}
-            ],
-            'eventType': 'purchase',
-            'productId': {'$ne': pymongo.ObjectId(product_id)}
-        }))
-        
-        # Count occurrences
-        product_counts = {}
-        for event in other_purchases:
-            pid = str(event['productId'])
-            product_counts[pid] = product_counts.get(pid, 0) + 1
-        
-        # Sort and return top
-        sorted_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:limit]
-        recommendations = [pid for pid, count in sorted_products]
-        
-        return jsonify({'productIds': recommendations})
+        recommendations = engine.related_products(str(product_id), event_type, limit)
+        
+        response = {'productIds': recommendations}
+        return jsonify(engine.hydrate(response) if data.get('hydrate') else response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/recommendations/also-bought', methods=['POST'])
+def get_also_bought():
+    """Get 'customers also bought' recommendations"""
+    return related_products_response('purchase')
+
+@app.route('/recommendations/also-viewed', methods=['POST'])
+def get_also_viewed():
+    """Get 'customers also viewed' recommendations"""
+    return related_products_response('view')
+
 if __name__ == '__main__':
-    # Train model on startup
-    print("Training initial model...")
+    # Load the last persisted model, training only when there is none
     try:
-        events, products, user_profiles = engine.load_data()
-        engine.user_item_matrix = engine.build_user_item_matrix(events)
-        engine.item_features = engine.extract_product_features(products)
-        print("Model trained successfully!")
+        if engine.load_model():
+            print(f"Loaded model generation {engine.model.generation} from {MODEL_DIR}")
+        else:
+            print("Training initial model...")
+            engine.train('full')
+            print("Model trained successfully!")
     except Exception as e:
         print(f"Error training model: {e}")
     
@@ -0,0 +1,333 @@
+"""asyncio serving mode for the recommendation service.
+
+Usage (from ml-service/):
+    python async_app.py
+    gunicorn -c gunicorn.conf.py -k aiohttp.GunicornWebWorker async_app:app
+
+The serving and training endpoints of app.py, with the same responses,
+served by aiohttp on one event loop per worker. Request-time Mongo reads
+(the fold-in history of users the ALS model has not seen) go through
+motor with a bounded connection pool, so a slow query parks a coroutine
+instead of a worker thread, and independent work in one request runs
+concurrently: the history query overlaps with the trending fallback.
+Model scoring is CPU-bound and runs on a thread pool; training, the model
+watcher and the trending refresh keep using the synchronous client from
+app.py in their own background threads.
+
+Environment (in addition to app.py's):
+    ASYNC_MONGO_POOL_SIZE            motor connections per worker (default 100)
+    ASYNC_MONGO_MIN_POOL_SIZE        connections kept open when idle (default 10)
+    ASYNC_MONGO_WAIT_QUEUE_TIMEOUT_MS  wait for a free connection before failing (default 2000)
+    ASYNC_SCORING_THREADS            threads for model scoring (default: CPU count)
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from aiohttp import web
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import app as service
+from app import (
+    BATCH_BLOCK_SIZE, FOLD_IN_EVENTS, FOLD_IN_PROJECTION, MAX_INGEST_EVENTS, PERSONALIZED_BUDGET_MS,
+    PERSONALIZED_MAX_PENDING, RECOMMENDATION_ENGINE, RECOMMENDATION_ENGINES, engine, fill_to_limit, metrics,
+    personalized_cache_key, recent_events_query, request_seconds, result_cache, stage_seconds
+)
+from request_control import AdmissionControl, AsyncSingleFlight, Overloaded
+
+ASYNC_MONGO_POOL_SIZE = int(os.getenv('ASYNC_MONGO_POOL_SIZE', 100))
+ASYNC_MONGO_MIN_POOL_SIZE = int(os.getenv('ASYNC_MONGO_MIN_POOL_SIZE', 10))
+ASYNC_MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('ASYNC_MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+ASYNC_SCORING_THREADS = int(os.getenv('ASYNC_SCORING_THREADS', 0)) or os.cpu_count()
+
+# Worker-wide state; the Motor client must be created on the running loop
+scoring_executor = ThreadPoolExecutor(max_workers=ASYNC_SCORING_THREADS, thread_name_prefix='score')
+state = {'db': None}
+
+# Personalized load control as in app.py, with coalescing on the loop instead of a thread pool;
+# app.py's /metrics and /health read these through its module globals
+flights = service.flights = AsyncSingleFlight()
+admission = service.admission = AdmissionControl(PERSONALIZED_MAX_PENDING, backlog=lambda: len(flights.flights))
+
+
+async def run_scoring(function, *args, **kwargs):
+    """Run CPU-bound model code on the scoring pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(scoring_executor, partial(function, *args, **kwargs))
+
+
+async def recent_interactions(user_id):
+    """engine.recent_interactions through the async driver"""
+    with stage_seconds.time('recent_interactions'):
+        cursor = state['db'].events.find(
+            recent_events_query(user_id), FOLD_IN_PROJECTION
+        ).sort('createdAt', -1).limit(FOLD_IN_EVENTS)
+        return await cursor.to_list(FOLD_IN_EVENTS)
+
+
+async def hydrate(response, data):
+    """engine.hydrate when the request asks for it, off the loop while the catalog is first loaded"""
+    if not data.get('hydrate'):
+        return response
+    if engine.eligibility.refreshed_at is None:
+        return await run_scoring(engine.hydrate, response)
+    return engine.hydrate(response)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+
+
+def error_response(e):
+    return web.json_response({'error': str(e)}, status=500)
+
+
+@web.middleware
+async def record_request_time(request, handler):
+    started = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        resource = request.match_info.route.resource
+        request_seconds.observe(resource.canonical if resource else 'unmatched', time.perf_counter() - started)
+
+
+async def health_check(request):
+    return web.json_response({
+        'status': 'healthy',
+        'mode': 'async',
+        'pid': os.getpid(),
+        'generation': engine.model.generation,
+        'cache': result_cache.stats(),
+        'trending': engine.trending.stats(),
+        'admission': dict(admission.stats(), **flights.stats()),
+        'sessions': engine.sessions.stats(),
+        'eligibility': engine.eligibility.stats()
+    })
+
+
+async def get_metrics(request):
+    return web.Response(text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+
+async def train_model(request):
+    """Start a background training run and return its job ID"""
+    try:
+        data = await read_json(request)
+        job = engine.submit_training(data.get('mode', 'auto'))
+        return web.json_response({
+            'success': True,
+            'message': 'Training started',
+            'jobId': job['jobId'],
+            'status': job['status'],
+            'generation': engine.model.generation
+        }, status=202)
+    except Exception as e:
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+
+async def get_training_status(request):
+    job_id = request.query.get('jobId')
+    job = engine.training_status(job_id)
+    if job_id and job is None:
+        return web.json_response({'error': 'Unknown job'}, status=404)
+    return web.json_response({'job': job, 'model': engine.model.describe()})
+
+
+async def ingest_events(request):
+    """Buffer tracked events for session recommendations; in memory, so on the loop"""
+    try:
+        data = await read_json(request)
+        events = data.get('events', [data])
+        if not isinstance(events, list):
+            return web.json_response({'error': 'events must be a list'}, status=400)
+        if len(events) > MAX_INGEST_EVENTS:
+            return web.json_response({'error': f'At most {MAX_INGEST_EVENTS} events per request'}, status=413)
+        return web.json_response({'accepted': engine.record_events(events)}, status=202)
+    except Exception as e:
+        return error_response(e)
+
+
+async def personalized_response(user_id, limit, engine_name, model, cache_key, category=None):
+    """Compute and cache one personalized response; Mongo reads are awaited, scoring runs on the pool"""
+    cold_start = partial(engine.cold_start_recommendations, category=category)
+    fallback = None
+    method = engine_name
+    if not user_id:
+        recommendations = await run_scoring(cold_start, limit)
+    elif user_id in model.user_index:
+        scorer = engine.matrix_factorization if engine_name == 'als' else engine.hybrid_recommendations
+        recommendations = await run_scoring(scorer, user_id, limit, model, category=category)
+    else:
+        # Unseen user: buffered session events, else the stored ones fetched with the likely fallback
+        history = engine.session_history(user_id)
+        if not history:
+            history, fallback = await asyncio.gather(
+                recent_interactions(user_id),
+                run_scoring(cold_start, limit * 2)
+            )
+        scorer = engine.matrix_factorization if engine_name == 'als' else engine.session_recommendations
+        recommendations = await run_scoring(scorer, user_id, limit, model, history, category=category)
+        if recommendations and engine_name != 'als':
+            method = 'session'
+
+    if len(recommendations) < limit:
+        # Top up with cold start when eligibility filtering left fewer than limit
+        fallback = fallback or await run_scoring(cold_start, limit * 2)
+        recommendations = fill_to_limit(recommendations, fallback, limit)
+
+    response = {
+        'productIds': recommendations,
+        'method': 'cold_start' if not user_id else method
+    }
+    result_cache.put(cache_key, model.generation, response)
+    return response
+
+
+async def get_personalized_recommendations(request):
+    """Personalized recommendations under the same load control as app.py.
+
+    Identical concurrent requests await one computation; one missing
+    PERSONALIZED_BUDGET_MS gets trending with method 'trending_fallback'
+    while the computation finishes into the cache, and past
+    PERSONALIZED_MAX_PENDING waiting requests new ones get 503.
+    """
+    started = time.monotonic()
+    try:
+        data = await read_json(request)
+        user_id = data.get('userId') or data.get('sessionId')
+        limit = int(data.get('limit', 10))
+        engine_name = data.get('engine') or RECOMMENDATION_ENGINE
+        category = str(data['category']) if data.get('category') else None
+        if engine_name not in RECOMMENDATION_ENGINES:
+            return web.json_response({'error': f"Unknown engine '{engine_name}'"}, status=400)
+
+        model = engine.model
+        cache_key = personalized_cache_key(user_id, limit, engine_name, model, category)
+        response = result_cache.get(cache_key, model.generation)
+        if response is not None and all(engine.eligibility.allows(p, category) for p in response['productIds']):
+            return web.json_response(await hydrate(response, data))
+
+        with admission.admit():
+            task = flights.submit(cache_key + (model.generation,), personalized_response,
+                                  user_id, limit, engine_name, model, cache_key, category)
+            budget = PERSONALIZED_BUDGET_MS / 1000 - (time.monotonic() - started) if PERSONALIZED_BUDGET_MS else None
+            try:
+                # Shielded: giving up on the task must not cancel it for the other waiters
+                response = await asyncio.wait_for(asyncio.shield(task), max(budget, 0) if budget is not None else None)
+            except asyncio.TimeoutError:
+                admission.record_fallback()
+                response = {
+                    'productIds': await run_scoring(engine.cold_start_recommendations, limit, category=category),
+                    'method': 'trending_fallback'
+                }
+
+        return web.json_response(await hydrate(response, data))
+    except Overloaded:
+        return web.json_response({'error': 'Too many pending requests, retry later'}, status=503,
+                                 headers={'Retry-After': '1'})
+    except Exception as e:
+        return error_response(e)
+
+
+async def get_trending(request):
+    try:
+        data = await read_json(request)
+        limit = int(data.get('limit', 10))
+        recommendations = await run_scoring(
+            engine.cold_start_recommendations, limit, data.get('window'), data.get('weights'), data.get('category')
+        )
+        return web.json_response(await hydrate({'productIds': recommendations}, data))
+    except Exception as e:
+        return error_response(e)
+
+
+async def get_batch_recommendations(request):
+    """Stream personalized recommendations for many users as NDJSON, one block per pool task"""
+    try:
+        data = await read_json(request)
+        user_ids = data.get('userIds')
+        limit = int(data.get('limit', 10))
+        if not user_ids and not data.get('allActive'):
+            return web.json_response({'error': 'userIds or allActive is required'}, status=400)
+
+        results = engine.batch_recommendations([str(user_id) for user_id in user_ids] if user_ids else None, limit)
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        while True:
+            chunk = await run_scoring(lambda: list(islice(results, BATCH_BLOCK_SIZE)))
+            if not chunk:
+                break
+            await response.write(''.join(json.dumps(result) + '\n' for result in chunk).encode())
+        await response.write_eof()
+        return response
+    except Exception as e:
+        return error_response(e)
+
+
+async def related_products_response(request, event_type):
+    """Co-occurrence lookups are in-memory and fast enough for the loop itself"""
+    try:
+        data = await read_json(request)
+        limit = int(data.get('limit', 6))
+        recommendations = engine.related_products(str(data.get('productId')), event_type, limit)
+        return web.json_response(await hydrate({'productIds': recommendations}, data))
+    except Exception as e:
+        return error_response(e)
+
+
+async def get_also_bought(request):
+    return await related_products_response(request, 'purchase')
+
+
+async def get_also_viewed(request):
+    return await related_products_response(request, 'view')
+
+
+async def start_serving(application):
+    """Per-worker startup: async client, model, and a warm trending table"""
+    client = AsyncIOMotorClient(
+        os.getenv('MONGO_URI'),
+        maxPoolSize=ASYNC_MONGO_POOL_SIZE,
+        minPoolSize=ASYNC_MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=ASYNC_MONGO_WAIT_QUEUE_TIMEOUT_MS
+    )
+    state['db'] = client[service.db.name]
+    application['mongo_client'] = client
+
+    # Also warms the trending counters and eligibility, off the loop
+    await asyncio.get_running_loop().run_in_executor(None, engine.start_serving)
+
+
+async def stop_serving(application):
+    application['mongo_client'].close()
+
+
+def create_app():
+    application = web.Application(middlewares=[record_request_time])
+    application.router.add_get('/health', health_check)
+    application.router.add_get('/metrics', get_metrics)
+    application.router.add_post('/train', train_model)
+    application.router.add_get('/train/status', get_training_status)
+    application.router.add_post('/events', ingest_events)
+    application.router.add_post('/recommendations/personalized', get_personalized_recommendations)
+    application.router.add_post('/recommendations/trending', get_trending)
+    application.router.add_post('/recommendations/personalized/batch', get_batch_recommendations)
+    application.router.add_post('/recommendations/also-bought', get_also_bought)
+    application.router.add_post('/recommendations/also-viewed', get_also_viewed)
+    application.on_startup.append(start_serving)
+    application.on_cleanup.append(stop_serving)
+    return application
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    web.run_app(app, host='0.0.0.0', port=int(os.getenv('PORT', 5001)))
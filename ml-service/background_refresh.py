@@ -0,0 +1,71 @@
+"""Base class of the in-memory copies of Mongo collections.
+
+Trending counters, interaction indexes and the product catalog all keep
+a copy of some collection in memory and fold in changes periodically.
+BackgroundRefresh holds the shared part. The first ensure_fresh() loads
+synchronously, so the first request waits for a complete copy. Later
+calls start at most one daemon thread per refresh_seconds, and readers
+keep using the current state in the meantime. Subclasses implement
+_refresh(), which always runs under self.lock. Those that reload
+everything now and then (e.g. to drop deleted documents) check
+full_reload_due() and call loaded() once they have.
+
+Pure Python, importable without NumPy.
+"""
+import threading
+import time
+
+
+class BackgroundRefresh:
+    """Load on first use, then refresh in a background thread when stale"""
+
+    # Used in the refresh thread's name and error messages
+    name = 'cache'
+
+    def __init__(self, refresh_seconds=60, full_reload_seconds=None):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.refreshed_at = None
+        self.loaded_at = None
+
+    def ensure_fresh(self, *collections):
+        if self.refreshed_at is None:
+            with self.lock:
+                if self.refreshed_at is None:
+                    self._run(collections)
+            return
+
+        if time.monotonic() - self.refreshed_at < self.refresh_seconds or self.refreshing:
+            return
+        self.refreshing = True
+        threading.Thread(
+            target=self.refresh, args=collections, name=f"{self.name.replace(' ', '-')}-refresh", daemon=True
+        ).start()
+
+    def refresh(self, *collections):
+        try:
+            with self.lock:
+                self._run(collections)
+        except Exception as e:
+            print(f"Error refreshing {self.name}: {e}")
+        finally:
+            self.refreshing = False
+
+    def full_reload_due(self):
+        """Whether this refresh should reload everything: first load, or full_reload_seconds passed"""
+        return self.loaded_at is None or (
+            self.full_reload_seconds is not None and time.monotonic() - self.loaded_at >= self.full_reload_seconds
+        )
+
+    def loaded(self):
+        """Record a completed full reload"""
+        self.loaded_at = time.monotonic()
+
+    def _run(self, collections):
+        self._refresh(*collections)
+        self.refreshed_at = time.monotonic()
+
+    def _refresh(self, *collections):
+        raise NotImplementedError
@@ -0,0 +1,55 @@
+"""Offline batch recommendations as NDJSON.
+
+Usage:
+    python batch_recommend.py --all --limit 8 --output recommendations.ndjson
+    python batch_recommend.py --users user_ids.txt --limit 8
+
+Scores users against the newest persisted model in MODEL_DIR (train one
+with POST /train first) without going through the HTTP service. One line
+per user: {"userId": ..., "productIds": [...], "method": "hybrid"}.
+MongoDB is only queried for trending fallbacks of users without history.
+"""
+import argparse
+import json
+import sys
+import time
+
+from app import BATCH_BLOCK_SIZE, MODEL_DIR, engine
+
+
+def read_user_ids(path):
+    """One user or session ID per line, blank lines ignored"""
+    with (sys.stdin if path == '-' else open(path)) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--users', help="file with one user ID per line, '-' for stdin")
+    source.add_argument('--all', action='store_true', help='every user active in the training window')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--block-size', type=int, default=BATCH_BLOCK_SIZE)
+    parser.add_argument('--output', help='output file (default stdout)')
+    args = parser.parse_args()
+
+    if not engine.load_model(with_training_state=False):
+        sys.exit(f'No trained model in {MODEL_DIR}')
+    user_ids = None if args.all else read_user_ids(args.users)
+
+    start = time.perf_counter()
+    count = 0
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in engine.batch_recommendations(user_ids, args.limit, args.block_size):
+            out.write(json.dumps(result) + '\n')
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f'{count} users in {time.perf_counter() - start:.1f}s '
+          f'(model generation {engine.model.generation})', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
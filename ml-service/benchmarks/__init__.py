@@ -0,0 +1,11 @@
+"""Performance benchmarks for the ML service.
+
+    synthetic.py            Zipf-skewed synthetic products, users, sessions and events
+    harness.py              end-to-end train time, RSS and endpoint latency/QPS for both engines
+    matrix_build.py         sparse CSR vs dense pivot user-item matrix construction
+    content_index.py        IVF content index recall and latency
+    serving_throughput.py   /recommendations/personalized throughput per gunicorn worker count
+
+Run them from ml-service/, e.g. `python -m benchmarks.harness --scale small`.
+Extra dependencies are listed in benchmarks/requirements.txt.
+"""
@@ -0,0 +1,73 @@
+"""Recall and latency of the IVF content index against exact search.
+
+Usage:
+    python benchmarks/content_index.py --products 500000 --probes 1 4 8 16 32
+
+Builds synthetic product feature vectors (scaled numeric columns plus
+one-hot category and brand), fits an IVFIndex and, for each n_probe,
+reports recall@k and per-query latency against brute-force search over
+the same rows.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex
+
+
+def synthetic_features(n_products, n_categories=50, n_brands=500, seed=42):
+    """Numeric block plus one-hot category/brand columns, as CSR"""
+    rng = np.random.default_rng(seed)
+    numeric = rng.standard_normal((n_products, 4)).astype(np.float32)
+    categories = rng.integers(0, n_categories, n_products)
+    brands = np.minimum(rng.zipf(1.5, n_products) - 1, n_brands - 1)
+    rows = np.arange(n_products)
+    ones = np.ones(n_products, dtype=np.float32)
+    return hstack([
+        csr_matrix(numeric),
+        csr_matrix((ones, (rows, categories)), shape=(n_products, n_categories)),
+        csr_matrix((ones, (rows, brands)), shape=(n_products, n_brands)),
+    ]).tocsr()
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=500_000)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    features = synthetic_features(args.products)
+    start = time.perf_counter()
+    index = IVFIndex().fit(features)
+    print(f'fit {args.products} products into {len(index.centroids)} lists in '
+          f'{time.perf_counter() - start:.1f}s')
+
+    rng = np.random.default_rng(0)
+    queries = [features[row] for row in rng.choice(args.products, args.queries, replace=False)]
+    exact_ms = timed(lambda q: index.exact_search(q, args.k), queries)
+    print(f'exact\t\t{exact_ms:.2f} ms/query')
+
+    print('n_probe\trecall@k\tms/query')
+    for n_probe in args.probes:
+        recall = index.recall_at_k(queries, args.k, n_probe)
+        latency = timed(lambda q: index.search(q, args.k, n_probe), queries)
+        print(f'{n_probe}\t{recall:.3f}\t\t{latency:.2f}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""End-to-end benchmark of both ML engines on synthetic data.
+
+Usage (from ml-service/):
+    python -m benchmarks.harness --scale small
+    python -m benchmarks.harness --scale medium --engines app --requests 500
+    python -m benchmarks.harness --scale medium --mongo-uri mongodb://localhost:27017
+
+Each engine (app.py, app-simple.py) runs in its own process so peak RSS
+is attributable. The process fills a Mongo stand-in (mongomock, in memory)
+or, with --mongo-uri, a scratch database on a local mongod; trains; then
+sends --requests sequential requests to every endpoint through Flask's
+test client. Train wall time, RSS, p50/p95/p99 latency and QPS per
+endpoint are printed and written as JSON (default
+benchmarks/results/<timestamp>.json) so runs can be compared over time.
+With mongomock the RSS includes the in-memory dataset; baselineRssMb is
+the peak before training.
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+from benchmarks.synthetic import SCALES, populate
+
+ENGINE_FILES = {'app': 'app.py', 'app-simple': 'app-simple.py'}
+
+# (name, path, payload builder) per engine; builders take a RequestSampler
+ENDPOINTS = {
+    'app': [
+        ('personalized_hybrid', '/recommendations/personalized', lambda s: {'userId': s.user(), 'limit': 10}),
+        ('personalized_als', '/recommendations/personalized', lambda s: {'userId': s.user(), 'limit': 10, 'engine': 'als'}),
+        ('personalized_session', '/recommendations/personalized', lambda s: {'sessionId': s.session(), 'limit': 10}),
+        ('personalized_anonymous', '/recommendations/personalized', lambda s: {'limit': 10}),
+        ('trending_24h', '/recommendations/trending', lambda s: {'limit': 10, 'window': '24h'}),
+        ('trending_category', '/recommendations/trending', lambda s: {'limit': 10, 'category': s.category()}),
+        ('also_bought', '/recommendations/also-bought', lambda s: {'productId': s.product(), 'limit': 6}),
+        ('also_viewed', '/recommendations/also-viewed', lambda s: {'productId': s.product(), 'limit': 6}),
+    ],
+    'app-simple': [
+        ('personalized', '/recommendations/personalized', lambda s: {'userId': s.user(), 'limit': 10}),
+        ('personalized_session', '/recommendations/personalized', lambda s: {'sessionId': s.session(), 'limit': 10}),
+        ('personalized_anonymous', '/recommendations/personalized', lambda s: {'limit': 10}),
+        ('trending_24h', '/recommendations/trending', lambda s: {'limit': 10, 'window': '24h'}),
+        ('also_bought', '/recommendations/also-bought', lambda s: {'productId': s.product(), 'limit': 6}),
+        ('also_viewed', '/recommendations/also-viewed', lambda s: {'productId': s.product(), 'limit': 6}),
+    ],
+}
+
+
+class RequestSampler:
+    """Random IDs from the generated dataset, reproducible per seed"""
+
+    def __init__(self, dataset, seed=0):
+        self.dataset = dataset
+        self.rng = np.random.default_rng(seed)
+
+    def _pick(self, name):
+        values = self.dataset[name]
+        return values[self.rng.integers(len(values))]
+
+    def user(self):
+        return self._pick('users')
+
+    def session(self):
+        return self._pick('sessions')
+
+    def product(self):
+        return self._pick('products')
+
+    def category(self):
+        return self._pick('categories')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(latencies, elapsed, errors, first_ms):
+    latencies = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (None, None, None)
+    return {
+        'requests': int(len(latencies)),
+        'errors': errors,
+        'firstRequestMs': round(first_ms, 2),
+        'meanMs': round(float(latencies.mean()), 3) if len(latencies) else None,
+        'p50Ms': round(float(p50), 3) if p50 is not None else None,
+        'p95Ms': round(float(p95), 3) if p95 is not None else None,
+        'p99Ms': round(float(p99), 3) if p99 is not None else None,
+        'qps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def load_engine(name):
+    """Import app.py or app-simple.py as a module"""
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(SERVICE_DIR, ENGINE_FILES[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def connect(config):
+    if config['mongo_uri']:
+        import pymongo
+        return pymongo.MongoClient(config['mongo_uri'])[config['db_name']]
+    import mongomock
+    return mongomock.MongoClient()[config['db_name']]
+
+
+def run_engine(name, config, results):
+    """Child process body: load data, train, time every endpoint"""
+    # Measure computation, not the result cache
+    os.environ.setdefault('RESULT_CACHE_SIZE', '0' if not config['cache'] else '100000')
+    os.environ['MODEL_DIR'] = tempfile.mkdtemp(prefix='ml-bench-model-')
+
+    db = connect(config)
+    start = time.perf_counter()
+    if config['mongo_uri']:
+        with open(config['dataset_path']) as f:
+            dataset = json.load(f)
+    else:
+        dataset = populate(db, config['scale'], config['seed'], config['days'])
+    load_seconds = time.perf_counter() - start
+    baseline_rss = peak_rss_mb()
+
+    module = load_engine(name)
+    module.db = db
+    client = module.app.test_client()
+
+    start = time.perf_counter()
+    if name == 'app':
+        train_stats = module.engine.train('full')
+    else:
+        train_stats = client.post('/train').get_json()
+    train_seconds = time.perf_counter() - start
+    train_rss = peak_rss_mb()
+
+    endpoints = {}
+    for endpoint, path, payload in ENDPOINTS[name]:
+        sampler = RequestSampler(dataset, config['seed'])
+        start = time.perf_counter()
+        client.post(path, json=payload(sampler))
+        first_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(config['requests']):
+            body = payload(sampler)
+            start = time.perf_counter()
+            response = client.post(path, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+        endpoints[endpoint] = summarize(latencies, time.perf_counter() - started, errors, first_ms)
+
+    results.put({
+        'engine': name,
+        'loadSeconds': round(load_seconds, 2),
+        'trainSeconds': round(train_seconds, 2),
+        'trainStats': train_stats,
+        'baselineRssMb': baseline_rss,
+        'trainPeakRssMb': train_rss,
+        'peakRssMb': peak_rss_mb(),
+        'endpoints': endpoints,
+    })
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(report):
+    print('engine\tendpoint\t\t\tp50 ms\tp95 ms\tp99 ms\tqps\terrors')
+    for result in report['results']:
+        print(f"{result['engine']}\ttrain {result['trainSeconds']}s, peak RSS {result['peakRssMb']} MB "
+              f"(baseline {result['baselineRssMb']} MB)")
+        for endpoint, stats in result['endpoints'].items():
+            print(f"{result['engine']}\t{endpoint:<24}\t{stats['p50Ms']}\t{stats['p95Ms']}\t"
+                  f"{stats['p99Ms']}\t{stats['qps']}\t{stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--users', type=int, help='override the scale')
+    parser.add_argument('--sessions', type=int)
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--events', type=int)
+    parser.add_argument('--days', type=int, default=30, help='events are spread over this many days')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINE_FILES), default=['app', 'app-simple'])
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    parser.add_argument('--cache', action='store_true', help='leave the personalized result cache on')
+    parser.add_argument('--mongo-uri', help='load into a local mongod instead of mongomock')
+    parser.add_argument('--db-name', default='ml_benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='JSON report path')
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    for key in ('users', 'sessions', 'products', 'events'):
+        if getattr(args, key):
+            scale[key] = getattr(args, key)
+
+    config = {
+        'scale': scale,
+        'days': args.days,
+        'requests': args.requests,
+        'cache': args.cache,
+        'mongo_uri': args.mongo_uri,
+        'db_name': args.db_name,
+        'seed': args.seed,
+        'dataset_path': None,
+    }
+
+    # A real mongod is filled once here and shared; mongomock lives inside each engine process
+    if args.mongo_uri:
+        dataset = populate(connect(config), scale, args.seed, args.days)
+        config['dataset_path'] = os.path.join(tempfile.mkdtemp(prefix='ml-bench-'), 'dataset.json')
+        with open(config['dataset_path'], 'w') as f:
+            json.dump(dataset, f)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in args.engines:
+        queue = context.Queue()
+        process = context.Process(target=run_engine, args=(name, config, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'mongo': 'mongod' if args.mongo_uri else 'mongomock',
+            'config': {key: value for key, value in config.items() if key != 'dataset_path'},
+        },
+        'results': results,
+    }
+
+    output = args.output or os.path.join(
+        SERVICE_DIR, 'benchmarks', 'results', datetime.now().strftime('%Y%m%dT%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print_summary(report)
+    print(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    main()
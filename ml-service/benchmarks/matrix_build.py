@@ -0,0 +1,90 @@
+"""Compare the dense pandas pivot against the sparse CSR user-item matrix.
+
+Usage:
+    python benchmarks/matrix_build.py --events 1000000 10000000 50000000
+
+For each event count a synthetic (user, product, event type) stream is
+generated as interned integer columns and both builders are timed. Peak memory is measured with
+tracemalloc. The dense pivot is skipped (and only its size estimated) when
+users x products x 8 bytes would exceed --max-dense-gb.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import EVENT_WEIGHT_BY_CODE, build_interaction_matrix
+from benchmarks.synthetic import interaction_columns
+
+
+def measure(fn):
+    """Run fn and return (result, seconds, peak MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def build_pivot(users, products, event_codes):
+    """The original dense builder: groupby + pivot + fillna"""
+    weights = EVENT_WEIGHT_BY_CODE[event_codes]
+    df = pd.DataFrame({'user_id': users, 'product_id': products, 'weight': weights})
+    df = df.groupby(['user_id', 'product_id'])['weight'].sum().reset_index()
+    return df.pivot(index='user_id', columns='product_id', values='weight').fillna(0)
+
+
+def run(n_events, max_dense_gb):
+    n_users = max(n_events // 50, 1)
+    n_products = min(max(n_events // 200, 1), 100_000)
+    users, products, event_codes = interaction_columns(n_events, n_users, n_products)
+
+    (matrix, _), csr_time, csr_peak = measure(
+        lambda: build_interaction_matrix(users, products, event_codes, (n_users, n_products))
+    )
+    csr_bytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    row = {
+        'events': n_events,
+        'users': matrix.shape[0],
+        'products': matrix.shape[1],
+        'nnz': int(matrix.nnz),
+        'csr_seconds': round(csr_time, 2),
+        'csr_peak_mb': round(csr_peak, 1),
+        'csr_matrix_mb': round(csr_bytes / 1e6, 1),
+        'dense_matrix_mb': round(matrix.shape[0] * matrix.shape[1] * 8 / 1e6, 1),
+        'pivot_seconds': None,
+        'pivot_peak_mb': None,
+    }
+    del matrix
+
+    if row['dense_matrix_mb'] <= max_dense_gb * 1000:
+        _, pivot_time, pivot_peak = measure(lambda: build_pivot(users, products, event_codes))
+        row['pivot_seconds'] = round(pivot_time, 2)
+        row['pivot_peak_mb'] = round(pivot_peak, 1)
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument('--max-dense-gb', type=float, default=2.0)
+    args = parser.parse_args()
+
+    header = ('events', 'users', 'products', 'nnz', 'csr_seconds', 'csr_peak_mb',
+              'csr_matrix_mb', 'dense_matrix_mb', 'pivot_seconds', 'pivot_peak_mb')
+    print('\t'.join(header))
+    for n_events in args.events:
+        row = run(n_events, args.max_dense_gb)
+        print('\t'.join('skipped' if row[key] is None else str(row[key]) for key in header), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Throughput of /recommendations/personalized as gunicorn workers are added.
+
+Usage:
+    python benchmarks/serving_throughput.py --workers 1 2 4 8 --duration 20
+
+Publishes a synthetic model into a temporary MODEL_DIR, then for each
+worker count starts `gunicorn -c gunicorn.conf.py app:app`, drives it with
+--clients concurrent keep-alive connections (spread over several client
+processes so the load generator is not the bottleneck) and reports
+requests/s and latency percentiles. Requests only hit users in the model,
+so MongoDB is never queried.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from ann_index import IVFIndex
+from app import EVENT_WEIGHTS, build_interaction_matrix
+from event_loader import EVENT_CODES
+from model_snapshot import ModelSnapshot
+from model_store import save_snapshot
+
+
+def publish_synthetic_model(model_dir, n_events, n_users, n_products, seed=42):
+    """Train-free model: Zipf-skewed interactions plus random content vectors"""
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, n_users, n_events, dtype=np.int32)
+    products = np.minimum(rng.zipf(1.3, n_events) - 1, n_products - 1).astype(np.int32)
+    weighted_codes = np.array([EVENT_CODES[event_type] for event_type in EVENT_WEIGHTS], dtype=np.int8)
+    event_codes = weighted_codes[rng.integers(0, len(weighted_codes), n_events)]
+    matrix, event_matrices = build_interaction_matrix(users, products, event_codes, (n_users, n_products))
+
+    user_ids = np.array([f'u{i}' for i in range(n_users)], dtype=object)
+    product_ids = np.array([f'p{i}' for i in range(n_products)], dtype=object)
+    item_vectors = np.hstack([
+        rng.standard_normal((n_products, 4)),
+        np.eye(50)[rng.integers(0, 50, n_products)],
+    ]).astype(np.float32)
+    snapshot = ModelSnapshot(
+        1, matrix, user_ids, product_ids, event_matrices, {},
+        pd.Index(product_ids), item_vectors, IVFIndex().fit(item_vectors)
+    )
+    save_snapshot(snapshot, model_dir)
+    return [user_ids[row] for row in np.unique(users)]
+
+
+def wait_healthy(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            health = json.loads(conn.getresponse().read())
+            if health.get('generation'):
+                return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('server did not become healthy')
+
+
+def client_process(port, user_ids, threads, duration, seed):
+    """Run `threads` keep-alive clients for duration seconds, return latencies in ms"""
+    latencies = []
+    errors = [0]
+    deadline = time.time() + duration
+
+    def run(thread_seed):
+        rng = np.random.default_rng(thread_seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Content-Type': 'application/json'}
+        while time.time() < deadline:
+            body = json.dumps({'userId': user_ids[rng.integers(len(user_ids))], 'limit': 10})
+            start = time.perf_counter()
+            try:
+                conn.request('POST', '/recommendations/personalized', body, headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[0] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, errors[0]
+
+
+def measure(port, user_ids, clients, client_processes, duration):
+    threads = max(1, clients // client_processes)
+    with multiprocessing.Pool(client_processes) as pool:
+        results = pool.starmap(
+            client_process, [(port, user_ids, threads, duration, seed) for seed in range(client_processes)]
+        )
+    latencies = np.concatenate([np.asarray(lat) for lat, _ in results]) if results else np.empty(0)
+    errors = sum(err for _, err in results)
+    return len(latencies) / duration, np.percentile(latencies, [50, 99]) if len(latencies) else (0, 0), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent connections')
+    parser.add_argument('--client-processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--products', type=int, default=20_000)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    model_dir = tempfile.mkdtemp(prefix='ml-bench-')
+    try:
+        user_ids = publish_synthetic_model(model_dir, args.events, args.users, args.products)
+        print(f'{os.cpu_count()} CPUs, {args.clients} clients, {args.threads} threads/worker')
+        print('workers\treq/s\tp50 ms\tp99 ms\terrors')
+        for n_workers in args.workers:
+            env = dict(os.environ, MODEL_DIR=model_dir, PORT=str(args.port),
+                       ML_WORKERS=str(n_workers), ML_THREADS=str(args.threads))
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_healthy(args.port)
+                # Let the remaining workers finish mapping the model
+                time.sleep(2)
+                qps, (p50, p99), errors = measure(
+                    args.port, user_ids, args.clients, args.client_processes, args.duration
+                )
+                print(f'{n_workers}\t{qps:.0f}\t{p50:.1f}\t{p99:.1f}\t{errors}', flush=True)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
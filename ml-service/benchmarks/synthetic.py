@@ -0,0 +1,149 @@
+"""Synthetic marketplace data for the benchmarks.
+
+Products, users and anonymous sessions are drawn with Zipfian popularity
+so a few products and a few heavy users dominate, as in production. Every
+generator takes a seed, so a given scale always produces the same data.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from bson.objectid import ObjectId
+
+# Share of each event type in the generated stream
+EVENT_MIX = {
+    'view': 0.70,
+    'click': 0.08,
+    'add_to_cart': 0.08,
+    'purchase': 0.05,
+    'wishlist': 0.04,
+    'remove_from_cart': 0.02,
+    'rating': 0.01,
+    'search': 0.02,
+}
+
+# Named dataset sizes for --scale
+SCALES = {
+    'small': {'users': 2_000, 'sessions': 4_000, 'products': 1_000, 'categories': 20, 'events': 100_000},
+    'medium': {'users': 50_000, 'sessions': 100_000, 'products': 20_000, 'categories': 100, 'events': 2_000_000},
+    'large': {'users': 500_000, 'sessions': 1_000_000, 'products': 200_000, 'categories': 500, 'events': 20_000_000},
+}
+
+
+def zipf_choice(rng, n_items, size, a=1.1):
+    """size draws from range(n_items) where rank r has probability proportional to 1 / (r + 1) ** a"""
+    weights = 1.0 / np.arange(1, n_items + 1) ** a
+    return rng.choice(n_items, size, p=weights / weights.sum())
+
+
+def interaction_columns(n_events, n_users, n_products, seed=42):
+    """Interned user/product/event code columns with a Zipf-like product skew, for matrix benchmarks"""
+    from event_loader import EVENT_CODES
+    from app import EVENT_WEIGHTS
+
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, n_users, n_events, dtype=np.int32)
+    products = np.minimum(rng.zipf(1.3, n_events) - 1, n_products - 1).astype(np.int32)
+    weighted_codes = np.array([EVENT_CODES[event_type] for event_type in EVENT_WEIGHTS], dtype=np.int8)
+    event_codes = weighted_codes[rng.integers(0, len(weighted_codes), n_events)]
+    return users, products, event_codes
+
+
+def generate_catalog(n_products, n_categories, rng):
+    """Category and product documents shaped like the backend's Mongoose models"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    categories = [{'_id': ObjectId(), 'name': f'Category {i}'} for i in range(n_categories)]
+    category_ids = [category['_id'] for category in categories]
+    brands = [f'Brand {i}' for i in range(max(1, n_products // 50))]
+
+    product_categories = zipf_choice(rng, n_categories, n_products, a=0.8)
+    product_brands = zipf_choice(rng, len(brands), n_products, a=1.0)
+    statuses = rng.choice(['Published', 'Draft', 'Hidden'], n_products, p=[0.9, 0.07, 0.03])
+    products = [
+        {
+            '_id': ObjectId(),
+            'name': f'Product {i}',
+            'description': f'Synthetic product {i}',
+            'price': float(round(rng.lognormal(6, 1), 2)),
+            'discount': int(rng.choice([0, 0, 5, 10, 20, 30, 50])),
+            'category': category_ids[product_categories[i]],
+            'brand': brands[product_brands[i]],
+            'stock': int(rng.integers(0, 200)),
+            'images': [f'https://example.com/products/{i}.jpg'],
+            'rating': float(round(rng.uniform(1, 5), 1)),
+            'status': str(statuses[i]),
+            'createdAt': now - timedelta(days=int(rng.integers(1, 365))),
+            'updatedAt': now - timedelta(days=int(rng.integers(0, 30))),
+        }
+        for i in range(n_products)
+    ]
+    return categories, products
+
+
+def generate_events(n_events, user_ids, session_ids, product_ids, rng, days=30,
+                    logged_in=0.6, batch_size=50_000):
+    """Yield batches of event documents spread uniformly over the last days.
+
+    Product and user activity are Zipf-skewed over a random permutation,
+    so the popular IDs are not simply the first ones generated.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    product_order = rng.permutation(len(product_ids))
+    user_order = rng.permutation(len(user_ids))
+    session_order = rng.permutation(len(session_ids))
+    event_types = list(EVENT_MIX)
+    event_probabilities = np.array(list(EVENT_MIX.values()))
+    event_probabilities /= event_probabilities.sum()
+
+    for start in range(0, n_events, batch_size):
+        size = min(batch_size, n_events - start)
+        products = product_order[zipf_choice(rng, len(product_ids), size)]
+        users = user_order[zipf_choice(rng, len(user_ids), size, a=1.0)]
+        sessions = session_order[zipf_choice(rng, len(session_ids), size, a=1.0)]
+        has_user = rng.random(size) < logged_in
+        types = rng.choice(len(event_types), size, p=event_probabilities)
+        ages = rng.uniform(0, days * 86400, size)
+
+        batch = []
+        for i in range(size):
+            event = {
+                'sessionId': session_ids[sessions[i]],
+                'eventType': event_types[types[i]],
+                'productId': product_ids[products[i]],
+                'createdAt': now - timedelta(seconds=float(ages[i])),
+            }
+            if has_user[i]:
+                event['userId'] = user_ids[users[i]]
+            batch.append(event)
+        yield batch
+
+
+def populate(db, scale, seed=42, days=30):
+    """Replace products, categories and events in db with a synthetic dataset.
+
+    Returns the generated IDs (as strings) for building requests.
+    """
+    rng = np.random.default_rng(seed)
+    categories, products = generate_catalog(scale['products'], scale['categories'], rng)
+    user_ids = [ObjectId() for _ in range(scale['users'])]
+    session_ids = [f'session_{seed}_{i}' for i in range(scale['sessions'])]
+    product_ids = [product['_id'] for product in products]
+
+    for name in ('categories', 'products', 'events'):
+        db[name].drop()
+    db.categories.insert_many(categories)
+    db.products.insert_many(products)
+    for batch in generate_events(scale['events'], user_ids, session_ids, product_ids, rng, days):
+        db.events.insert_many(batch, ordered=False)
+
+    # The indexes declared in backend/models/eventModel.js
+    db.events.create_index([('createdAt', -1)])
+    db.events.create_index([('userId', 1), ('eventType', 1), ('createdAt', -1)])
+    db.events.create_index([('sessionId', 1), ('eventType', 1), ('createdAt', -1)])
+    db.events.create_index([('productId', 1), ('eventType', 1), ('createdAt', -1)])
+
+    return {
+        'users': [str(user_id) for user_id in user_ids],
+        'sessions': session_ids,
+        'products': [str(product_id) for product_id in product_ids],
+        'categories': [str(category['_id']) for category in categories],
+    }
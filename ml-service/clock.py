@@ -0,0 +1,22 @@
+"""Time helpers shared by training and the in-memory caches.
+
+pymongo returns naive UTC datetimes, so every watermark and window bound
+is one too. Pure Python: app-simple.py and its helpers import it without
+NumPy.
+"""
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1)
+
+# Events newer than this are left for the next run or refresh so in-flight inserts are not skipped
+INGEST_LAG = timedelta(seconds=5)
+
+
+def utc_now():
+    """Current time as a naive UTC datetime, matching what pymongo returns"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_timestamp(value):
+    """Seconds since the epoch for a naive UTC datetime as returned by pymongo"""
+    return int((value - EPOCH).total_seconds()) if value else 0
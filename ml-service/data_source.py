@@ -0,0 +1,195 @@
+"""Where training reads events and products from.
+
+MongoSource queries the live collections. SnapshotSource reads a columnar
+export so training can run off-box, without load on the production
+primary, and the same data can be replayed for benchmarks:
+
+    snapshot/
+        events/
+            2026-10-15.npz      one UTC day: int32 user/product codes, int8 event
+            2026-10-16.npz      codes, int64 epoch seconds, and that day's ID tables
+        products.npz            catalog columns as of the last export
+
+Each daily partition interns its own IDs, so partitions are written
+independently and appended without rewriting older ones. The reader maps
+every partition's local codes onto one EventLog's intern tables with a
+NumPy gather, after one dictionary lookup per distinct ID.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from clock import to_timestamp
+from event_loader import EventLog, load_events
+
+# Product fields training uses, and their column dtypes in the snapshot
+PRODUCT_COLUMNS = {
+    'price': np.float64,
+    'discount': np.float64,
+    'stock': np.float64,
+    'rating': np.float64,
+    'category': str,
+    'brand': str,
+    'status': str,
+}
+PRODUCT_PROJECTION = {name: 1 for name in PRODUCT_COLUMNS}
+
+EVENTS_DIR = 'events'
+PRODUCTS_FILE = 'products.npz'
+DAY_FORMAT = '%Y-%m-%d'
+
+
+def _event_query(until, since=None, after=None):
+    created = {'$lte': until}
+    if since is not None:
+        created['$gte'] = since
+    if after is not None:
+        created['$gt'] = after
+    return {'createdAt': created, 'productId': {'$ne': None}}
+
+
+class MongoSource:
+    """Events and published products straight from MongoDB"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def describe(self):
+        return {'kind': 'mongo', 'database': self.db.name}
+
+    def load_events(self, until, since=None, after=None, log=None):
+        """Events with since <= createdAt (or after < createdAt) <= until, appended to log"""
+        return load_events(self.db.events, _event_query(until, since, after), log=log)
+
+    def load_products(self):
+        return list(self.db.products.find({'status': 'Published'}, PRODUCT_PROJECTION))
+
+
+class SnapshotSource:
+    """Events and products from a directory written by export_events/export_products.
+
+    Timestamps are whole seconds, so bounds are compared at second precision.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def describe(self):
+        return {'kind': 'snapshot', 'path': self.path, 'partitions': len(self.partitions())}
+
+    def partitions(self, first=None, last=None):
+        """(day, path) of the event partitions between the dates first and last, oldest first"""
+        directory = os.path.join(self.path, EVENTS_DIR)
+        if not os.path.isdir(directory):
+            return []
+        partitions = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.npz'):
+                continue
+            day = datetime.strptime(name[:-4], DAY_FORMAT).date()
+            if (first is None or day >= first) and (last is None or day <= last):
+                partitions.append((day, os.path.join(directory, name)))
+        return partitions
+
+    def load_events(self, until, since=None, after=None, log=None):
+        if log is None:
+            log = EventLog()
+        lower = since if since is not None else after
+        upper = to_timestamp(until)
+
+        for _, path in self.partitions(lower.date() if lower else None, until.date()):
+            with np.load(path) as partition:
+                user_codes = partition['user_codes']
+                product_codes = partition['product_codes']
+                event_codes = partition['event_codes']
+                timestamps = partition['timestamps']
+                user_ids = partition['user_ids']
+                product_ids = partition['product_ids']
+
+            keep = timestamps <= upper
+            if since is not None:
+                keep &= timestamps >= to_timestamp(since)
+            if after is not None:
+                keep &= timestamps > to_timestamp(after)
+            if not keep.any():
+                continue
+
+            users = self._intern(log.users, user_ids, user_codes[keep])
+            products = self._intern(log.products, product_ids, product_codes[keep])
+            log.append_batch(users, products, event_codes[keep], timestamps[keep])
+        return log
+
+    def load_products(self):
+        """Published products in the shape MongoSource returns"""
+        path = os.path.join(self.path, PRODUCTS_FILE)
+        if not os.path.exists(path):
+            return []
+        with np.load(path) as columns:
+            columns = {name: columns[name] for name in columns.files}
+
+        ids = np.char.decode(columns.pop('_id'), 'utf-8')
+        published = np.flatnonzero(columns['status'] == 'Published')
+        products = []
+        for row in published:
+            product = {'_id': ids[row]}
+            for name, values in columns.items():
+                value = values[row].item()
+                # Missing and null strings were exported as ''
+                product[name] = None if value == '' else value
+            products.append(product)
+        return products
+
+    @staticmethod
+    def _intern(table, ids, local_codes):
+        """Global codes for a partition's local codes; only IDs actually used are interned"""
+        used = np.unique(local_codes)
+        mapping = np.full(len(ids), -1, dtype=np.int32)
+        mapping[used] = [table.intern(value.decode('utf-8')) for value in ids[used]]
+        return mapping[local_codes]
+
+
+def _encode(ids):
+    """IDs as a UTF-8 bytes array, a quarter the size of NumPy's fixed-width unicode"""
+    return np.char.encode(np.array(ids, dtype=str), 'utf-8')
+
+
+def _write_npz(path, arrays):
+    """Write arrays compressed to path, replacing it atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    work_path = path + '.tmp'
+    with open(work_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(work_path, path)
+
+
+def export_events(db, path, day):
+    """Export one UTC day of events (a date) as a partition. Returns the event count."""
+    start = datetime(day.year, day.month, day.day)
+    end = start + timedelta(days=1)
+    log = load_events(db.events, {'createdAt': {'$gte': start, '$lt': end}, 'productId': {'$ne': None}})
+    user_codes, product_codes, event_codes, timestamps = log.columns()
+
+    _write_npz(os.path.join(path, EVENTS_DIR, day.strftime(DAY_FORMAT) + '.npz'), {
+        'user_codes': user_codes,
+        'product_codes': product_codes,
+        'event_codes': event_codes,
+        'timestamps': timestamps,
+        'user_ids': _encode(log.users.ids),
+        'product_ids': _encode(log.products.ids),
+    })
+    return len(log)
+
+
+def export_products(db, path):
+    """Export the whole catalog's training columns. Returns the product count."""
+    products = list(db.products.find({}, PRODUCT_PROJECTION))
+    columns = {'_id': _encode([str(product['_id']) for product in products])}
+    for name, dtype in PRODUCT_COLUMNS.items():
+        values = [product.get(name) for product in products]
+        if dtype is str:
+            columns[name] = np.array(['' if value is None else str(value) for value in values], dtype=str)
+        else:
+            columns[name] = np.array([0 if value is None else value for value in values], dtype=dtype)
+    _write_npz(os.path.join(path, PRODUCTS_FILE), columns)
+    return len(products)
@@ -0,0 +1,135 @@
+"""Which products may be recommended right now.
+
+A model only changes at /train, but products are unpublished, sell out
+and move between categories in between. ProductEligibility is the product
+catalog (product_catalog.py), refreshed from `products` by updatedAt with
+a periodic full reload that drops deleted products, plus NumPy arrays
+derived from it: after every refresh that changed something, the refresh
+thread copies each catalog row's published-and-in-stock flag and category
+code into arrays and swaps them in. A model's product columns and content
+rows are mapped to catalog rows once per generation (again only when a
+full reload renumbers the rows), so a mask is one indexing expression.
+The scorers apply the masks before their top-k selection, so an
+ineligible product never takes one of the k slots and no over-fetching
+is needed.
+
+Masks are built once per (model generation, catalog version, category)
+and shared read-only by every request until either changes.
+"""
+import numpy as np
+
+from product_catalog import ProductCatalog
+
+# Distinct (generation, category) masks kept; the default mask is one of them
+MAX_MASKS = 256
+
+# Model generations whose product-to-catalog-row mapping is kept
+MAX_MAPPED_GENERATIONS = 4
+
+
+class EligibilityMasks:
+    """Boolean masks of one model generation: product columns and content rows"""
+
+    def __init__(self, version, products, items):
+        self.version = version
+        self.products = products
+        self.items = items
+
+
+class EligibilityState:
+    """Eligibility and category code of every row of one catalog table"""
+
+    def __init__(self, table, version):
+        self.table = table
+        self.version = version
+        published = table.label_codes['status'].get('Published')
+        if published is None:
+            self.eligible = np.zeros(len(table.ids), dtype=bool)
+        else:
+            self.eligible = (np.array(table.status, dtype=np.int32) == published) & (
+                np.array(table.stock, dtype=np.int64) > 0
+            )
+        self.category = np.array(table.category, dtype=np.int32)
+
+
+class ProductEligibility(ProductCatalog):
+    """Live published / in-stock / category state of every product"""
+
+    name = 'product eligibility'
+
+    def __init__(self, refresh_seconds=60, full_reload_seconds=3600):
+        super().__init__(refresh_seconds, full_reload_seconds)
+        self.state = EligibilityState(self.table, 0)
+        # model generation -> (catalog table, its size, product column rows, content rows, no misses)
+        self.rows_cache = {}
+        self.masks_cache = {}
+
+    def allows(self, product_id, category=None):
+        """Whether a product is published, in stock and (if given) in category"""
+        state = self.state
+        row = state.table.rows.get(product_id)
+        if row is None or row >= len(state.eligible) or not state.eligible[row]:
+            return False
+        return category is None or bool(state.category[row] == state.table.label_codes['category'].get(category))
+
+    def masks(self, model, category=None):
+        """EligibilityMasks for model, optionally restricted to a category ID"""
+        state = self.state
+        key = (model.generation, category)
+        masks = self.masks_cache.get(key)
+        if masks is not None and masks.version == state.version:
+            return masks
+
+        product_rows, item_rows = self._rows(model, state.table)
+        allowed = state.eligible
+        if category is not None:
+            code = state.table.label_codes['category'].get(category)
+            allowed = allowed & (state.category == code) if code is not None else np.zeros_like(allowed)
+        masks = EligibilityMasks(state.version, self._mask(allowed, product_rows), self._mask(allowed, item_rows))
+        if len(self.masks_cache) >= MAX_MASKS:
+            self.masks_cache = {}
+        self.masks_cache[key] = masks
+        return masks
+
+    def stats(self):
+        state = self.state
+        return dict(super().stats(), eligible=int(state.eligible.sum()), version=state.version)
+
+    def _rows(self, model, table):
+        """Catalog rows of model's product columns and content rows, -1 for products not in the catalog"""
+        cached = self.rows_cache.get(model.generation)
+        # Rows only move on a full reload; products added since may fill earlier misses
+        if cached is not None and cached[0] is table and (cached[1] == len(table.ids) or cached[4]):
+            return cached[2], cached[3]
+
+        size = len(table.ids)
+        product_rows = self._map(table, model.product_ids)
+        item_rows = self._map(table, model.item_ids)
+        complete = all(rows is None or (rows >= 0).all() for rows in (product_rows, item_rows))
+        if len(self.rows_cache) >= MAX_MAPPED_GENERATIONS:
+            self.rows_cache = {}
+        self.rows_cache[model.generation] = (table, size, product_rows, item_rows, complete)
+        return product_rows, item_rows
+
+    @staticmethod
+    def _map(table, ids):
+        if ids is None:
+            return None
+        rows = table.rows
+        return np.fromiter((rows.get(product_id, -1) for product_id in ids.tolist()), dtype=np.int64, count=len(ids))
+
+    @staticmethod
+    def _mask(allowed, rows):
+        if rows is None:
+            return None
+        mask = np.zeros(len(rows), dtype=bool)
+        known = (rows >= 0) & (rows < len(allowed))
+        mask[known] = allowed[rows[known]]
+        return mask
+
+    def _refresh(self, products, categories=None):
+        table = self.table
+        changes = table.changes
+        super()._refresh(products, categories)
+        if self.table is not table or self.table.changes != changes:
+            self.state = EligibilityState(self.table, self.state.version + 1)
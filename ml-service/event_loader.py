@@ -0,0 +1,143 @@
+import numpy as np
+
+from clock import to_timestamp
+
+# Event types in code order; anything unknown is stored as 'other'
+EVENT_TYPES = ('view', 'add_to_cart', 'purchase', 'wishlist', 'rating',
+               'search', 'click', 'remove_from_cart', 'other')
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+OTHER_EVENT = EVENT_CODES['other']
+
+# Only the fields training needs; context, metadata etc. never leave Mongo
+EVENT_PROJECTION = {'_id': 0, 'userId': 1, 'sessionId': 1, 'productId': 1, 'eventType': 1, 'createdAt': 1}
+
+class InternTable:
+    """Maps string IDs to dense int codes and back"""
+
+    def __init__(self):
+        self.codes = {}
+        self.ids = []
+
+    def intern(self, key):
+        code = self.codes.get(key)
+        if code is None:
+            code = len(self.ids)
+            self.codes[key] = code
+            self.ids.append(key)
+        return code
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copy(self):
+        table = InternTable()
+        table.codes = dict(self.codes)
+        table.ids = list(self.ids)
+        return table
+
+    def to_array(self):
+        return np.asarray(self.ids, dtype=object)
+
+
+class EventLog:
+    """Columnar event storage with interned user and product IDs.
+
+    Events live in preallocated NumPy columns (int32 user/product codes,
+    int8 event codes, int64 epoch seconds) that grow geometrically, so
+    memory is ~17 bytes per event instead of one dict per document.
+    """
+
+    def __init__(self, capacity=0):
+        self.users = InternTable()
+        self.products = InternTable()
+        self.user_codes = np.empty(capacity, dtype=np.int32)
+        self.product_codes = np.empty(capacity, dtype=np.int32)
+        self.event_codes = np.empty(capacity, dtype=np.int8)
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, capacity):
+        """Grow the columns so they can hold at least capacity events"""
+        if capacity <= len(self.user_codes):
+            return
+        for name in ('user_codes', 'product_codes', 'event_codes', 'timestamps'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def append_batch(self, user_codes, product_codes, event_codes, timestamps):
+        """Append parallel lists of already interned values"""
+        count = len(user_codes)
+        end = self.size + count
+        if end > len(self.user_codes):
+            self.reserve(max(end, 2 * len(self.user_codes)))
+        self.user_codes[self.size:end] = user_codes
+        self.product_codes[self.size:end] = product_codes
+        self.event_codes[self.size:end] = event_codes
+        self.timestamps[self.size:end] = timestamps
+        self.size = end
+
+    def compact(self, keep):
+        """Drop the events where the boolean mask keep is False.
+
+        Interned IDs are kept so existing codes stay valid.
+        """
+        for name in ('user_codes', 'product_codes', 'event_codes', 'timestamps'):
+            column = getattr(self, name)[:self.size][keep]
+            setattr(self, name, column)
+        self.size = len(self.user_codes)
+
+    def copy(self):
+        """Independent copy of the filled part, interned IDs included, for changes that may be abandoned"""
+        log = EventLog()
+        log.users = self.users.copy()
+        log.products = self.products.copy()
+        for name in ('user_codes', 'product_codes', 'event_codes', 'timestamps'):
+            setattr(log, name, np.array(getattr(self, name)[:self.size]))
+        log.size = self.size
+        return log
+
+    def columns(self):
+        """Views of the filled part of each column"""
+        return (self.user_codes[:self.size], self.product_codes[:self.size],
+                self.event_codes[:self.size], self.timestamps[:self.size])
+
+
+def load_events(collection, query, log=None, batch_size=20000):
+    """Stream projected events matching query into an EventLog.
+
+    Documents are read with a large cursor batch and converted in chunks of
+    batch_size, so at most one chunk of Python objects is alive at a time.
+    Events without a product or without a user/session are skipped.
+    """
+    if log is None:
+        log = EventLog()
+    log.reserve(log.size + collection.count_documents(query))
+
+    intern_user = log.users.intern
+    intern_product = log.products.intern
+    user_codes, product_codes, event_codes, timestamps = [], [], [], []
+
+    cursor = collection.find(query, EVENT_PROJECTION, batch_size=batch_size)
+    for event in cursor:
+        user_id = event.get('userId') or event.get('sessionId')
+        product_id = event.get('productId')
+        if not user_id or not product_id:
+            continue
+
+        user_codes.append(intern_user(str(user_id)))
+        product_codes.append(intern_product(str(product_id)))
+        event_codes.append(EVENT_CODES.get(event.get('eventType'), OTHER_EVENT))
+        timestamps.append(to_timestamp(event.get('createdAt')))
+
+        if len(user_codes) >= batch_size:
+            log.append_batch(user_codes, product_codes, event_codes, timestamps)
+            user_codes, product_codes, event_codes, timestamps = [], [], [], []
+
+    if user_codes:
+        log.append_batch(user_codes, product_codes, event_codes, timestamps)
+    return log
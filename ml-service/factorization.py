@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class ImplicitALS:
+    """Implicit-feedback matrix factorization (Hu, Koren & Volinsky 2008).
+
+    Each weighted interaction r becomes a preference of 1 with confidence
+    1 + alpha * r. Alternating least squares solves every user (then item)
+    row with a few conjugate-gradient steps, vectorized over blocks of rows;
+    blocks run on a thread pool since NumPy releases the GIL in its kernels.
+    Serving a user is one item_factors @ user_factor product, so its cost
+    depends on the catalog size only, not on the number of users.
+    """
+
+    def __init__(self, factors=64, regularization=0.1, alpha=10.0, iterations=15,
+                 cg_steps=3, block_size=4096, block_nnz=1_000_000, n_threads=None, seed=42):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.block_size = block_size
+        self.block_nnz = block_nnz
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.seed = seed
+        self.user_factors = None
+        self.item_factors = None
+        self.item_gram = None
+
+    def fit(self, user_items, user_factors=None, item_factors=None):
+        """Factorize a weighted user-item CSR matrix.
+
+        Existing factors (e.g. from the previous model) warm-start the
+        solve; rows beyond them are initialized randomly.
+        """
+        user_items = user_items.tocsr().astype(np.float32)
+        item_users = user_items.T.tocsr()
+        rng = np.random.default_rng(self.seed)
+        self.user_factors = self._init(user_factors, user_items.shape[0], rng)
+        self.item_factors = self._init(item_factors, user_items.shape[1], rng)
+
+        with ThreadPoolExecutor(max_workers=self.n_threads, thread_name_prefix='als') as pool:
+            for _ in range(self.iterations):
+                self._solve(pool, user_items, self.user_factors, self.item_factors)
+                self._solve(pool, item_users, self.item_factors, self.user_factors)
+        self.item_gram = None
+        return self
+
+    def recommend(self, user_factor, k=10, exclude=None, allowed=None):
+        """Item columns with the k highest scores for a factor vector, best first.
+
+        allowed is an optional boolean mask over item columns; other items are skipped.
+        """
+        scores = self.item_factors @ user_factor
+        if exclude is not None and len(exclude):
+            scores[exclude] = -np.inf
+        if allowed is not None:
+            scores[~allowed] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return best[np.isfinite(scores[best])]
+
+    def fold_in(self, item_columns, weights):
+        """Factor vector for a user who is not in the model, from their weighted items"""
+        item_columns = np.asarray(item_columns, dtype=np.int64)
+        confidence = self.alpha * np.asarray(weights, dtype=np.float32)
+        items = self.item_factors[item_columns]
+        if self.item_gram is None:
+            self.item_gram = self.item_factors.T @ self.item_factors
+        a = self.item_gram + (items.T * confidence) @ items + self.regularization * np.eye(self.factors, dtype=np.float32)
+        b = items.T @ (1 + confidence)
+        return np.linalg.solve(a, b).astype(np.float32)
+
+    @classmethod
+    def from_factors(cls, user_factors, item_factors, **params):
+        """Rebuild a fitted model from persisted factor arrays"""
+        model = cls(factors=item_factors.shape[1], **params)
+        model.user_factors = user_factors
+        model.item_factors = item_factors
+        return model
+
+    def _init(self, previous, n_rows, rng):
+        factors = (rng.standard_normal((n_rows, self.factors)) * 0.01).astype(np.float32)
+        if previous is not None:
+            rows = min(n_rows, len(previous))
+            factors[:rows] = previous[:rows]
+        return factors
+
+    def _solve(self, pool, matrix, target, fixed):
+        """Recompute every row of target given the fixed factors, in parallel blocks"""
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=np.float32)
+        list(pool.map(lambda bounds: self._solve_block(matrix, target, fixed, gram, *bounds), self._blocks(matrix)))
+
+    def _blocks(self, matrix):
+        """Row ranges of at most block_size rows and (unless one row exceeds it) block_nnz entries"""
+        n_rows = matrix.shape[0]
+        bounds = []
+        start = 0
+        while start < n_rows:
+            end = int(np.searchsorted(matrix.indptr, matrix.indptr[start] + self.block_nnz, side='right')) - 1
+            end = min(max(end, start + 1), start + self.block_size, n_rows)
+            bounds.append((start, end))
+            start = end
+        return bounds
+
+    def _solve_block(self, matrix, target, fixed, gram, start, end):
+        block = matrix[start:end]
+        confidence = self.alpha * block.data
+        rows = np.repeat(np.arange(end - start), np.diff(block.indptr))
+        gathered = fixed[block.indices]
+
+        def product(p):
+            # (YtY + lambda I + Yt (C - I) Y) p for every row at once
+            weighted = np.einsum('ij,ij->i', gathered, p[rows]) * confidence
+            return p @ gram + csr_matrix((weighted, block.indices, block.indptr), shape=block.shape) @ fixed
+
+        # Warm-started conjugate gradient on (YtCY + lambda I) x = YtC p
+        x = target[start:end]
+        rhs = csr_matrix((1 + confidence, block.indices, block.indptr), shape=block.shape) @ fixed
+        residual = rhs - product(x)
+        direction = residual.copy()
+        residual_norm = np.einsum('ij,ij->i', residual, residual)
+        for _ in range(self.cg_steps):
+            step = product(direction)
+            alpha = residual_norm / np.maximum(np.einsum('ij,ij->i', direction, step), 1e-12)
+            x += alpha[:, None] * direction
+            residual -= alpha[:, None] * step
+            new_norm = np.einsum('ij,ij->i', residual, residual)
+            direction = residual + (new_norm / np.maximum(residual_norm, 1e-12))[:, None] * direction
+            residual_norm = new_norm
+        target[start:end] = x
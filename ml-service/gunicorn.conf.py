@@ -0,0 +1,45 @@
+"""Production serving config: a pre-fork gunicorn server with threaded workers.
+
+Usage (from ml-service/):
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py app-simple:app
+    gunicorn -c gunicorn.conf.py -k aiohttp.GunicornWebWorker async_app:app   (asyncio mode)
+
+Each worker memory-maps the newest model under MODEL_DIR, so N workers
+share one copy of the matrices through the page cache, and polls CURRENT
+every MODEL_POLL_SECONDS to swap in generations published by whichever
+worker ran /train. Training is serialized across workers by a file lock.
+`kill -HUP <master pid>` restarts the workers gracefully, which also
+reloads the model. gunicorn does not run on Windows; use `python app.py`
+there for development.
+
+Environment:
+    PORT                 listen port (default 5001, ML_SERVICE_PORT also honoured)
+    ML_WORKERS           worker processes (default: CPU count)
+    ML_THREADS           request threads per worker (default 4)
+    ML_TIMEOUT           seconds before a silent worker is restarted (default 120)
+"""
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', os.getenv('ML_SERVICE_PORT', 5001))}"
+workers = int(os.getenv('ML_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('ML_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('ML_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app in each worker, not the master: training threads and
+# Mongo connections must not be inherited across fork()
+preload_app = False
+
+
+def post_worker_init(worker):
+    """Load the model and start the reload watcher once the worker has imported the app"""
+    flask_app = worker.wsgi
+    module = sys.modules.get(getattr(flask_app, 'import_name', ''))
+    engine = getattr(module, 'engine', None)
+    if hasattr(engine, 'start_serving'):
+        engine.start_serving()
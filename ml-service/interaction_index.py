@@ -0,0 +1,148 @@
+"""In-memory user <-> product interaction indexes for the simple engine.
+
+User/session and product IDs are interned to dense ints. The forward index
+keeps each user's recent (timestamp, product, weight) events in time order;
+the inverted index keeps each product's most recent interactors. Both are
+refreshed incrementally from events newer than a createdAt watermark, so a
+collaborative-filtering request expands neighbors without querying Mongo.
+"""
+import time
+from collections import Counter, defaultdict, deque
+from datetime import timedelta
+
+from background_refresh import BackgroundRefresh
+from clock import INGEST_LAG, to_timestamp, utc_now
+
+# Expired events are dropped at most this often
+EXPIRE_SECONDS = 3600
+
+
+class InteractionIndex(BackgroundRefresh):
+    """Forward (user -> recent weighted items) and inverted (product -> recent users) indexes"""
+
+    name = 'interaction index'
+
+    def __init__(self, weights, days=90, max_user_events=500, max_product_users=200, refresh_seconds=60):
+        super().__init__(refresh_seconds)
+        self.weights = weights
+        self.days = days
+        self.max_user_events = max_user_events
+        self.max_product_users = max_product_users
+
+        self.user_codes = {}
+        self.user_ids = []
+        self.product_codes = {}
+        self.product_ids = []
+        # user code -> deque of (timestamp, product code, weight), oldest first
+        self.user_events = []
+        # product code -> {user code: last timestamp}, least recent first
+        self.product_users = []
+
+        self.watermark = None
+        self.expired_at = 0
+
+    def user_items(self, user_id, days=None):
+        """Summed event weight per product ID for a user over the last days"""
+        code = self.user_codes.get(user_id)
+        if code is None:
+            return {}
+        cutoff = to_timestamp(utc_now() - timedelta(days=days or self.days))
+        items = defaultdict(float)
+        for timestamp, product, weight in list(self.user_events[code]):
+            if timestamp >= cutoff:
+                items[self.product_ids[product]] += weight
+        return items
+
+    def similar_users(self, user_id, n_neighbors=20):
+        """User codes sharing the most recent products with user_id, most overlap first"""
+        code = self.user_codes.get(user_id)
+        if code is None:
+            return []
+        cutoff = to_timestamp(utc_now() - timedelta(days=self.days))
+        products = {product for timestamp, product, _ in list(self.user_events[code]) if timestamp >= cutoff}
+
+        overlap = Counter()
+        for product in products:
+            overlap.update(self.product_users[product].keys())
+        overlap.pop(code, None)
+        return [user for user, _ in overlap.most_common(n_neighbors)]
+
+    def recommend(self, user_id, limit=10, n_neighbors=20, neighbor_days=30):
+        """Products the user's nearest neighbors interacted with recently, weighted by event type"""
+        code = self.user_codes.get(user_id)
+        if code is None:
+            return []
+        own = self.user_items(user_id)
+        neighbor_cutoff = to_timestamp(utc_now() - timedelta(days=neighbor_days))
+
+        scores = Counter()
+        for neighbor in self.similar_users(user_id, n_neighbors):
+            for timestamp, product, weight in list(self.user_events[neighbor]):
+                if timestamp >= neighbor_cutoff:
+                    scores[product] += weight
+
+        recommendations = []
+        for product, _ in scores.most_common():
+            product_id = self.product_ids[product]
+            if product_id in own:
+                continue
+            recommendations.append(product_id)
+            if len(recommendations) >= limit:
+                break
+        return recommendations
+
+    def stats(self):
+        return {
+            'users': len(self.user_ids),
+            'products': len(self.product_ids),
+            'watermark': self.watermark.isoformat() + 'Z' if self.watermark else None
+        }
+
+    def _refresh(self, events):
+        until = utc_now() - INGEST_LAG
+        since = self.watermark or until - timedelta(days=self.days)
+        cursor = events.find(
+            {'createdAt': {'$gt': since, '$lte': until}, 'productId': {'$ne': None}},
+            {'_id': 0, 'userId': 1, 'sessionId': 1, 'productId': 1, 'eventType': 1, 'createdAt': 1},
+            batch_size=10000
+        ).sort('createdAt', 1)
+        for event in cursor:
+            user_id = event.get('userId') or event.get('sessionId')
+            if user_id:
+                self._add(str(user_id), str(event['productId']),
+                          self.weights.get(event.get('eventType'), 1), to_timestamp(event.get('createdAt')))
+        self.watermark = until
+
+        if time.monotonic() - self.expired_at >= EXPIRE_SECONDS:
+            self._expire(to_timestamp(until - timedelta(days=self.days)))
+            self.expired_at = time.monotonic()
+
+    def _add(self, user_id, product_id, weight, timestamp):
+        user = self.user_codes.get(user_id)
+        if user is None:
+            user = self.user_codes[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.user_events.append(deque(maxlen=self.max_user_events))
+        product = self.product_codes.get(product_id)
+        if product is None:
+            product = self.product_codes[product_id] = len(self.product_ids)
+            self.product_ids.append(product_id)
+            self.product_users.append({})
+
+        self.user_events[user].append((timestamp, product, weight))
+
+        # Move the user to the most recent end, dropping the oldest interactor when full
+        interactors = self.product_users[product]
+        interactors.pop(user, None)
+        interactors[user] = timestamp
+        if len(interactors) > self.max_product_users:
+            del interactors[next(iter(interactors))]
+
+    def _expire(self, cutoff):
+        """Drop events older than cutoff from both indexes; interned IDs stay valid"""
+        for user, user_events in enumerate(self.user_events):
+            while user_events and user_events[0][0] < cutoff:
+                _, product, _ = user_events.popleft()
+                interactors = self.product_users[product]
+                if interactors.get(user, cutoff) < cutoff:
+                    del interactors[user]
@@ -0,0 +1,167 @@
+"""Prometheus metrics in the text exposition format, without a client library.
+
+Histograms are filled from the hot path (`with histogram.time('stage'):` or
+as a decorator); gauges and counters are callables read at scrape time, so
+model size or cache counters cost nothing until /metrics is requested.
+Every pre-fork worker keeps its own registry, and the pid label on
+ml_process_info tells scrapes of different workers apart.
+"""
+import bisect
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from scipy.sparse import issparse
+
+# Upper bounds in seconds, from sub-millisecond lookups to full training runs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Histogram:
+    """Latency histogram with one label, e.g. ml_stage_seconds{stage="..."}"""
+
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> [per-bucket counts (last is +Inf), sum]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    @contextmanager
+    def time(self, label_value):
+        """Observe the wall time of a block; also usable as a decorator"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {label_value: (list(counts), total) for label_value, (counts, total) in self.series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _labels([(self.label, label_value), ('le', _number(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels([(self.label, label_value)])
+            lines.append(f'{self.name}_sum{labels} {total!r}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Callback:
+    """Gauge or counter whose samples come from a function at scrape time.
+
+    The function returns a number, or a dict mapping label values to numbers
+    (label names the dimension). None values are skipped.
+    """
+
+    def __init__(self, name, documentation, function, kind='gauge', label=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.kind = kind
+        self.label = label
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return lines
+        samples = value.items() if isinstance(value, dict) else [(None, value)]
+        for label_value, sample in samples:
+            if sample is None:
+                continue
+            labels = _labels([(self.label, label_value)]) if label_value is not None else ''
+            lines.append(f'{self.name}{labels} {_number(sample)}')
+        return lines
+
+
+class Metrics:
+    """Registry of histograms and scrape-time callbacks"""
+
+    def __init__(self):
+        self.metrics = []
+        self.gauge('ml_process_info', 'Process serving this scrape', lambda: {os.getpid(): 1}, label='pid')
+        self.gauge('ml_process_resident_memory_bytes', 'Resident set size', resident_memory_bytes)
+
+    def histogram(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, documentation, label, buckets)
+        self.metrics.append(histogram)
+        return histogram
+
+    def gauge(self, name, documentation, function, label=None):
+        self.metrics.append(Callback(name, documentation, function, 'gauge', label))
+
+    def counter(self, name, documentation, function, label=None):
+        self.metrics.append(Callback(name, documentation, function, 'counter', label))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def resident_memory_bytes():
+    """Current RSS from /proc, or the peak RSS where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def nbytes(value):
+    """Bytes held by NumPy arrays and scipy sparse matrices inside value"""
+    if value is None:
+        return 0
+    if issparse(value):
+        return sum(getattr(value, part).nbytes for part in ('data', 'indices', 'indptr') if hasattr(value, part))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(item) for item in value)
+    return 0
@@ -0,0 +1,66 @@
+import numpy as np
+
+from clock import utc_now
+
+
+class ModelSnapshot:
+    """One immutable generation of the trained recommendation model.
+
+    Training builds a complete snapshot off to the side and the engine
+    publishes it with a single reference swap, so a request that grabs
+    engine.model once sees matrices, indexes and features from the same
+    generation. Nothing reachable from a published snapshot may be mutated;
+    incremental training copies what it changes and shares the rest.
+    """
+
+    def __init__(self, generation=0, user_item_matrix=None, user_ids=None, product_ids=None,
+                 event_matrices=None, cooccurrence=None, item_ids=None, item_vectors=None,
+                 item_index=None, stats=None, item_user_matrix=None, user_norms=None, trained_at=None,
+                 factors=None, user_neighbors=None):
+        self.generation = generation
+        self.trained_at = trained_at or (utc_now() if generation else None)
+        self.stats = stats or {}
+
+        self.user_item_matrix = user_item_matrix
+        self.user_ids = user_ids
+        self.product_ids = product_ids
+        self.event_matrices = event_matrices or {}
+        self.cooccurrence = cooccurrence or {}
+
+        # Content model: product IDs of the feature rows, their vectors and the ANN index
+        self.item_ids = item_ids
+        self.item_vectors = item_vectors
+        self.item_index = item_index
+
+        # Implicit ALS factors (factorization.ImplicitALS), rows aligned with user_ids/product_ids
+        self.factors = factors
+
+        # Precomputed (neighbors, similarities) of every user row (user_neighbors.py), or None
+        self.user_neighbors = user_neighbors
+
+        # Derived lookup structures
+        if user_item_matrix is None:
+            self.user_index = {}
+            self.product_index = {}
+            self.item_user_matrix = None
+            self.user_norms = None
+        else:
+            self.user_index = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+            self.product_index = {product_id: col for col, product_id in enumerate(product_ids.tolist())}
+            # Item-major copy so user overlaps only touch the items a user has
+            if item_user_matrix is None:
+                item_user_matrix = user_item_matrix.T.tocsr()
+            if user_norms is None:
+                user_norms = np.sqrt(np.asarray(user_item_matrix.multiply(user_item_matrix).sum(axis=1)).ravel())
+            self.item_user_matrix = item_user_matrix
+            self.user_norms = user_norms
+
+    def describe(self):
+        """Summary used by the status endpoints"""
+        return {
+            'generation': self.generation,
+            'trainedAt': self.trained_at.isoformat() + 'Z' if self.trained_at else None,
+            'users': self.user_item_matrix.shape[0] if self.user_item_matrix is not None else 0,
+            'products': len(self.product_ids) if self.product_ids is not None else 0,
+            'interactions': int(self.user_item_matrix.nnz) if self.user_item_matrix is not None else 0
+        }
@@ -0,0 +1,283 @@
+"""Versioned on-disk model artifacts.
+
+Each published generation is written to its own directory under the model
+root as plain .npy files plus a manifest.json describing them:
+
+    models/
+        CURRENT                     name of the newest complete version
+        v000012-20261017T200044/
+            manifest.json
+            user_item_matrix.data.npy
+            user_item_matrix.indices.npy
+            ...
+
+Loading memory-maps every array (np.load(mmap_mode='r')), so startup only
+rebuilds the ID dictionaries and all worker processes on the host share one
+copy of the matrices through the page cache. CURRENT is replaced atomically
+after a version is fully written, so readers never see a partial model.
+Processes sharing a model root serialize training through training_lock().
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+
+from ann_index import IVFIndex
+from clock import utc_now
+from event_loader import EventLog, InternTable
+from factorization import ImplicitALS
+from model_snapshot import ModelSnapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'train.lock'
+
+
+def _save_value(directory, name, value, manifest):
+    """Write an ndarray or CSR matrix as .npy files and record it in the manifest"""
+    if issparse(value):
+        value = value.tocsr()
+        if not value.has_canonical_format:
+            value = value.copy()
+            value.sum_duplicates()
+        for part in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(directory, f'{name}.{part}.npy'), getattr(value, part))
+        manifest['arrays'][name] = {'kind': 'csr', 'shape': list(value.shape)}
+    else:
+        value = np.asarray(value)
+        if value.dtype == object:
+            # IDs are stored fixed-width so they can be memory-mapped too
+            value = value.astype(str)
+        np.save(os.path.join(directory, f'{name}.npy'), value)
+        manifest['arrays'][name] = {'kind': 'ndarray'}
+
+
+def _load_value(directory, name, spec):
+    if spec['kind'] == 'csr':
+        parts = [np.load(os.path.join(directory, f'{name}.{part}.npy'), mmap_mode='r')
+                 for part in ('data', 'indices', 'indptr')]
+        matrix = csr_matrix(tuple(parts), shape=tuple(spec['shape']), copy=False)
+        # Saved canonical; flag it so scipy never tries to sort the read-only buffers
+        matrix.has_sorted_indices = True
+        matrix.has_canonical_format = True
+        return matrix
+    return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+
+def save_snapshot(snapshot, model_dir, events=None, watermark=None, last_full_train=None, keep=3):
+    """Persist snapshot (and optionally the training event log) as a new version.
+
+    Returns the version directory name. Older versions beyond keep are removed.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    stamp = (snapshot.trained_at or utc_now()).strftime('%Y%m%dT%H%M%S')
+    version = f'v{snapshot.generation:06d}-{stamp}'
+    final_dir = os.path.join(model_dir, version)
+    work_dir = final_dir + '.tmp'
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+
+    manifest = {
+        'formatVersion': FORMAT_VERSION,
+        'generation': snapshot.generation,
+        'trainedAt': snapshot.trained_at.isoformat() if snapshot.trained_at else None,
+        'stats': snapshot.stats,
+        'arrays': {},
+        'eventMatrices': list(snapshot.event_matrices),
+        'cooccurrence': list(snapshot.cooccurrence),
+        'itemIndex': None,
+        'factorization': None,
+        'training': None,
+    }
+
+    values = {}
+    if snapshot.user_item_matrix is not None:
+        values.update({
+            'user_item_matrix': snapshot.user_item_matrix,
+            'item_user_matrix': snapshot.item_user_matrix,
+            'user_norms': snapshot.user_norms,
+            'user_ids': snapshot.user_ids,
+            'product_ids': snapshot.product_ids,
+        })
+    for event_type, matrix in snapshot.event_matrices.items():
+        values[f'events_{event_type}'] = matrix
+    for event_type, (neighbors, counts) in snapshot.cooccurrence.items():
+        values[f'cooccurrence_{event_type}.neighbors'] = neighbors
+        values[f'cooccurrence_{event_type}.counts'] = counts
+    if snapshot.item_index is not None:
+        values['item_ids'] = np.asarray(snapshot.item_ids, dtype=object)
+        values['item_vectors'] = snapshot.item_vectors
+        for name, value in snapshot.item_index.to_arrays().items():
+            values[f'item_index.{name}'] = value
+        manifest['itemIndex'] = {'nProbe': snapshot.item_index.n_probe}
+    if snapshot.user_neighbors is not None:
+        values['user_neighbors.neighbors'], values['user_neighbors.similarities'] = snapshot.user_neighbors
+    if snapshot.factors is not None:
+        values['als.user_factors'] = snapshot.factors.user_factors
+        values['als.item_factors'] = snapshot.factors.item_factors
+        manifest['factorization'] = {
+            'regularization': snapshot.factors.regularization,
+            'alpha': snapshot.factors.alpha,
+        }
+    if events is not None:
+        user_codes, product_codes, event_codes, timestamps = events.columns()
+        values.update({
+            'log.user_codes': user_codes,
+            'log.product_codes': product_codes,
+            'log.event_codes': event_codes,
+            'log.timestamps': timestamps,
+            'log.user_ids': events.users.to_array(),
+            'log.product_ids': events.products.to_array(),
+        })
+        manifest['training'] = {
+            'watermark': watermark.isoformat() if watermark else None,
+            'lastFullTrain': last_full_train.isoformat() if last_full_train else None,
+        }
+
+    for name, value in values.items():
+        _save_value(work_dir, name, value, manifest)
+    with open(os.path.join(work_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    os.replace(work_dir, final_dir)
+    _write_current(model_dir, version)
+    _prune(model_dir, keep)
+    return version
+
+
+def current_version(model_dir):
+    """Name of the newest complete version, or None"""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version if os.path.isdir(os.path.join(model_dir, version)) else None
+
+
+def load_snapshot(model_dir, version=None, with_training_state=False):
+    """Memory-map a persisted version back into a ModelSnapshot.
+
+    Returns (snapshot, training_state) where training_state is a dict with
+    the event log and watermarks when requested and present, else None.
+    """
+    version = version or current_version(model_dir)
+    if version is None:
+        return None, None
+    directory = os.path.join(model_dir, version)
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['formatVersion'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format {manifest['formatVersion']} in {version}")
+
+    arrays = manifest['arrays']
+
+    def load(name):
+        return _load_value(directory, name, arrays[name]) if name in arrays else None
+
+    event_matrices = {event_type: load(f'events_{event_type}') for event_type in manifest['eventMatrices']}
+    cooccurrence = {
+        event_type: (load(f'cooccurrence_{event_type}.neighbors'), load(f'cooccurrence_{event_type}.counts'))
+        for event_type in manifest['cooccurrence']
+    }
+
+    item_ids = item_vectors = item_index = None
+    if manifest['itemIndex'] is not None:
+        item_ids = pd.Index(load('item_ids'))
+        item_vectors = load('item_vectors')
+        item_index = IVFIndex.from_arrays(
+            {name: load(f'item_index.{name}') for name in ('vectors', 'centroids', 'list_offsets', 'list_items')},
+            n_probe=manifest['itemIndex']['nProbe']
+        )
+
+    factors = None
+    if manifest.get('factorization') is not None:
+        factors = ImplicitALS.from_factors(
+            load('als.user_factors'), load('als.item_factors'), **manifest['factorization']
+        )
+
+    user_neighbors = None
+    if 'user_neighbors.neighbors' in arrays:
+        user_neighbors = (load('user_neighbors.neighbors'), load('user_neighbors.similarities'))
+
+    snapshot = ModelSnapshot(
+        manifest['generation'], load('user_item_matrix'), load('user_ids'), load('product_ids'),
+        event_matrices, cooccurrence, item_ids, item_vectors, item_index,
+        stats=manifest['stats'],
+        item_user_matrix=load('item_user_matrix'),
+        user_norms=load('user_norms'),
+        trained_at=datetime.fromisoformat(manifest['trainedAt']) if manifest['trainedAt'] else None,
+        factors=factors,
+        user_neighbors=user_neighbors
+    )
+
+    training_state = None
+    if with_training_state and manifest['training'] is not None:
+        events = EventLog()
+        events.users = _intern_table(load('log.user_ids'))
+        events.products = _intern_table(load('log.product_ids'))
+        # Read-only maps are fine: EventLog reallocates before appending or compacting
+        events.user_codes = load('log.user_codes')
+        events.product_codes = load('log.product_codes')
+        events.event_codes = load('log.event_codes')
+        events.timestamps = load('log.timestamps')
+        events.size = len(events.user_codes)
+        training = manifest['training']
+        training_state = {
+            'events': events,
+            'watermark': datetime.fromisoformat(training['watermark']) if training['watermark'] else None,
+            'last_full_train': datetime.fromisoformat(training['lastFullTrain']) if training['lastFullTrain'] else None,
+        }
+
+    return snapshot, training_state
+
+
+@contextmanager
+def training_lock(model_dir):
+    """Exclusive cross-process lock on the model root, held while training.
+
+    Blocks until any other worker process has finished publishing, so each
+    run starts from the newest persisted version.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, LOCK_FILE), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _intern_table(ids):
+    table = InternTable()
+    table.ids = ids.tolist()
+    table.codes = {key: code for code, key in enumerate(table.ids)}
+    return table
+
+
+def _write_current(model_dir, version):
+    path = os.path.join(model_dir, CURRENT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(path + '.tmp', path)
+
+
+def _prune(model_dir, keep):
+    versions = sorted(
+        name for name in os.listdir(model_dir)
+        if name.startswith('v') and os.path.isdir(os.path.join(model_dir, name)) and not name.endswith('.tmp')
+    )
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
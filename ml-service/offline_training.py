@@ -0,0 +1,84 @@
+"""Export events to columnar snapshots and train from them off-box.
+
+Usage:
+    python offline_training.py export --out /data/ml-snapshot
+    python offline_training.py export --out /data/ml-snapshot --days 7 --overwrite
+    python offline_training.py train --snapshot /data/ml-snapshot
+
+export writes one partition per complete UTC day (up to yesterday) that is
+not in the snapshot yet, within the last --days days, plus a fresh product
+catalog; run it daily to keep appending. Reads prefer a secondary so the
+primary is not loaded. train builds a full model from the snapshot alone
+(no MongoDB needed) into MODEL_DIR, whose CURRENT file the serving workers
+poll, so the version directory can be copied to serving hosts as-is.
+Setting TRAINING_SNAPSHOT_DIR makes the service itself train from a snapshot.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReadPreference
+
+from app import MODEL_DIR, TRAINING_WINDOW_DAYS, db, engine
+from data_source import SnapshotSource, export_events, export_products
+from clock import utc_now
+
+
+def export(args):
+    source_db = db.client.get_database(db.name, read_preference=ReadPreference.SECONDARY_PREFERRED)
+    existing = {day for day, _ in SnapshotSource(args.out).partitions()}
+    today = utc_now().date()
+
+    for offset in range(args.days, 0, -1):
+        day = today - timedelta(days=offset)
+        if day in existing and not args.overwrite:
+            continue
+        start = time.perf_counter()
+        count = export_events(source_db, args.out, day)
+        print(f'{day}: {count} events in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+    count = export_products(source_db, args.out)
+    print(f'{count} products', file=sys.stderr)
+
+
+def train(args):
+    source = SnapshotSource(args.snapshot)
+    partitions = source.partitions()
+    if not partitions:
+        sys.exit(f'No event partitions in {args.snapshot}')
+
+    # Replay up to the end of the newest partition, not up to now
+    until = datetime.fromisoformat(args.until) if args.until else datetime.combine(
+        partitions[-1][0] + timedelta(days=1), datetime.min.time()
+    )
+    engine.source = source
+    start = time.perf_counter()
+    stats = engine.train('full', until=min(until, utc_now()))
+    print(f"Model generation {stats['generation']} ({stats['version']}) in {MODEL_DIR}: "
+          f"{stats['events']} events, {stats['users']} users, {stats['products']} products "
+          f'in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='append daily event partitions and refresh products')
+    export_parser.add_argument('--out', required=True, help='snapshot directory')
+    export_parser.add_argument('--days', type=int, default=TRAINING_WINDOW_DAYS,
+                               help='how many past days to make sure are exported')
+    export_parser.add_argument('--overwrite', action='store_true', help='re-export days that already exist')
+    export_parser.set_defaults(run=export)
+
+    train_parser = commands.add_parser('train', help='train a full model from a snapshot into MODEL_DIR')
+    train_parser.add_argument('--snapshot', required=True, help='snapshot directory')
+    train_parser.add_argument('--until', help='end of the training window (ISO datetime, UTC)')
+    train_parser.set_defaults(run=train)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Compact in-process copy of the product fields recommendations read.
+
+Products are loaded once in bulk into parallel arrays (array module, no
+NumPy) indexed by a dense row per product, with category, brand and status
+interned to small ints. Later refreshes only fetch products whose
+updatedAt moved past the newest one seen; a periodic full reload drops
+deleted products.
+
+The card fields of hydrated recommendation responses (name, start of the
+description, first image) are kept alongside, in plain lists, together
+with the category names when the refresh is given `categories`; the few
+names are re-read on every refresh so renames show up too.
+"""
+from array import array
+
+from background_refresh import BackgroundRefresh
+
+CATALOG_PROJECTION = {
+    'category': 1, 'brand': 1, 'status': 1, 'price': 1, 'discount': 1, 'stock': 1, 'updatedAt': 1,
+    'name': 1, 'description': 1, 'images': {'$slice': 1}
+}
+
+# Cards show a line or two of the description; the rest is not kept
+DESCRIPTION_CHARS = 200
+
+
+class CatalogTable:
+    """One generation of catalog columns; replaced wholesale on full reloads"""
+
+    def __init__(self):
+        self.ids = []
+        self.rows = {}
+        self.labels = {'category': [], 'brand': [], 'status': []}
+        self.label_codes = {'category': {}, 'brand': {}, 'status': {}}
+        self.category = array('i')
+        self.brand = array('i')
+        self.status = array('i')
+        self.price = array('d')
+        self.discount = array('d')
+        self.stock = array('q')
+        # Card fields, only read when a response is hydrated
+        self.name = []
+        self.description = []
+        self.image = []
+        self.updated_at = None
+        # Upserts applied so far, so derived state can tell whether it is stale
+        self.changes = 0
+
+    def upsert(self, product):
+        product_id = str(product['_id'])
+        values = (
+            self._code('category', str(product['category']) if product.get('category') else None),
+            self._code('brand', product.get('brand') or None),
+            self._code('status', product.get('status')),
+            float(product.get('price') or 0),
+            float(product.get('discount') or 0),
+            int(product.get('stock') or 0),
+        )
+        images = product.get('images') or []
+        values += (
+            product.get('name'),
+            (product.get('description') or '')[:DESCRIPTION_CHARS],
+            images[0] if images else None,
+        )
+        columns = (
+            self.category, self.brand, self.status, self.price, self.discount, self.stock,
+            self.name, self.description, self.image
+        )
+
+        row = self.rows.get(product_id)
+        if row is None:
+            # Incremental refreshes upsert into the live table: readers find a product
+            # through ids or rows, so those are published only once every column has its value
+            row = len(self.ids)
+            for column, value in zip(columns, values):
+                column.append(value)
+            self.ids.append(product_id)
+            self.rows[product_id] = row
+        else:
+            for column, value in zip(columns, values):
+                column[row] = value
+        self.changes += 1
+
+        updated_at = product.get('updatedAt')
+        if updated_at and (self.updated_at is None or updated_at > self.updated_at):
+            self.updated_at = updated_at
+
+    def _code(self, field, value):
+        """Interned code of a label, -1 for missing"""
+        if value is None:
+            return -1
+        codes = self.label_codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = len(self.labels[field])
+            codes[value] = code
+            self.labels[field].append(value)
+        return code
+
+
+class ProductCatalog(BackgroundRefresh):
+    """Product lookups for recommendation requests without Mongo round trips"""
+
+    name = 'product catalog'
+
+    def __init__(self, refresh_seconds=60, full_reload_seconds=3600):
+        super().__init__(refresh_seconds, full_reload_seconds)
+        self.table = CatalogTable()
+        self.by_discount = {}
+        # category ID -> name, for hydrated responses
+        self.category_names = {}
+
+    def get(self, product_id):
+        """Dict of the cached fields for a product, or None if unknown"""
+        table = self.table
+        row = table.rows.get(str(product_id))
+        if row is None:
+            return None
+        return {
+            'category': self._label(table, 'category', table.category[row]),
+            'brand': self._label(table, 'brand', table.brand[row]),
+            'status': self._label(table, 'status', table.status[row]),
+            'price': table.price[row],
+            'discount': table.discount[row],
+            'stock': table.stock[row]
+        }
+
+    def summaries(self, product_ids, published_only=False):
+        """Product-shaped cards of product_ids, aligned with them: None for unknown (or unpublished) products"""
+        table = self.table
+        published = table.label_codes['status'].get('Published')
+        results = []
+        for product_id in product_ids:
+            row = table.rows.get(product_id)
+            if row is None or (published_only and table.status[row] != published):
+                results.append(None)
+                continue
+            category = self._label(table, 'category', table.category[row])
+            image = table.image[row]
+            results.append({
+                '_id': product_id,
+                'name': table.name[row],
+                'description': table.description[row],
+                'price': table.price[row],
+                'discount': table.discount[row],
+                'stock': table.stock[row],
+                'images': [image] if image else [],
+                'category': {'_id': category, 'name': self.category_names.get(category)} if category else None
+            })
+        return results
+
+    def published_by_discount(self, categories=None, exclude=(), limit=10):
+        """Published product IDs, highest discount first, optionally within categories"""
+        table = self.table
+        if categories is None:
+            candidates = self._ranked(table, None)
+        else:
+            candidates = []
+            for category in categories:
+                code = table.label_codes['category'].get(str(category))
+                if code is not None:
+                    candidates.extend(self._ranked(table, code)[:limit + len(exclude)])
+            candidates.sort(key=lambda row: table.discount[row], reverse=True)
+
+        result = []
+        for row in candidates:
+            product_id = table.ids[row]
+            if product_id in exclude:
+                continue
+            result.append(product_id)
+            if len(result) >= limit:
+                break
+        return result
+
+    def stats(self):
+        return {
+            'products': len(self.table.ids),
+            'categories': len(self.category_names),
+            'updatedAt': self.table.updated_at.isoformat() + 'Z' if self.table.updated_at else None
+        }
+
+    def _refresh(self, products, categories=None):
+        if self.full_reload_due():
+            table = CatalogTable()
+            for product in products.find({}, CATALOG_PROJECTION, batch_size=10000):
+                table.upsert(product)
+            self.table = table
+            self.loaded()
+        else:
+            table = self.table
+            if table.updated_at is not None:
+                for product in products.find({'updatedAt': {'$gt': table.updated_at}}, CATALOG_PROJECTION):
+                    table.upsert(product)
+        self.by_discount = {}
+        if categories is not None:
+            self.category_names = {
+                str(category['_id']): category.get('name') for category in categories.find({}, {'name': 1})
+            }
+
+    def _ranked(self, table, category_code):
+        """Published rows sorted by discount, per category, rebuilt after each refresh"""
+        by_discount = self.by_discount
+        if not by_discount:
+            published = table.label_codes['status'].get('Published')
+            rows = sorted(
+                (row for row in range(len(table.ids)) if table.status[row] == published),
+                key=lambda row: table.discount[row], reverse=True
+            )
+            by_discount = {None: rows}
+            for row in rows:
+                by_discount.setdefault(table.category[row], []).append(row)
+            self.by_discount = by_discount
+        return by_discount.get(category_code, [])
+
+    @staticmethod
+    def _label(table, field, code):
+        return table.labels[field][code] if code >= 0 else None
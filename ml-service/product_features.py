@@ -0,0 +1,95 @@
+import zlib
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+from sklearn.preprocessing import StandardScaler
+
+NUMERIC_FEATURES = ('price', 'discount', 'stock', 'rating')
+# Heavy-tailed fields are log-scaled before standardizing
+LOG_FEATURES = ('price', 'stock')
+CATEGORICAL_FEATURES = ('category', 'brand')
+
+# Relative weight of each block in the cosine similarity
+DEFAULT_WEIGHTS = {'numeric': 1.0, 'category': 1.0, 'brand': 1.0}
+
+
+class ProductFeaturizer:
+    """Sparse CSR product features for the content model.
+
+    Numeric fields are standardized (price and stock on a log scale) and
+    the block is scaled to about unit norm, so price no longer outweighs
+    everything else. Category and brand are one-hot columns from a
+    vocabulary fitted on the catalog; when there are more than
+    max_vocabulary distinct values, the rarer ones share hash_buckets
+    hashed columns. Every row has at most len(NUMERIC_FEATURES) + 2
+    non-zeros regardless of how many brands there are.
+    """
+
+    def __init__(self, max_vocabulary=5000, hash_buckets=1024, weights=None):
+        self.max_vocabulary = max_vocabulary
+        self.hash_buckets = hash_buckets
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.scaler = None
+        self.vocabularies = {}
+        self.buckets = {}
+
+    def fit(self, products):
+        """Fit the numeric scaling and the categorical vocabularies on a product list"""
+        self.scaler = StandardScaler().fit(self._numeric(products))
+        for name in CATEGORICAL_FEATURES:
+            counts = Counter(label for label in (self._label(product, name) for product in products) if label)
+            self.vocabularies[name] = {
+                label: column for column, (label, _) in enumerate(counts.most_common(self.max_vocabulary))
+            }
+            self.buckets[name] = self.hash_buckets if len(counts) > self.max_vocabulary else 0
+        return self
+
+    def transform(self, products):
+        """CSR matrix with one float32 row per product"""
+        n_rows = len(products)
+        numeric = self.scaler.transform(self._numeric(products))
+        numeric *= self.weights['numeric'] / np.sqrt(len(NUMERIC_FEATURES))
+        blocks = [csr_matrix(numeric.astype(np.float32))]
+
+        for name in CATEGORICAL_FEATURES:
+            vocabulary = self.vocabularies[name]
+            buckets = self.buckets[name]
+            rows, columns = [], []
+            for row, product in enumerate(products):
+                label = self._label(product, name)
+                if not label:
+                    continue
+                column = vocabulary.get(label)
+                if column is None:
+                    if not buckets:
+                        continue
+                    # crc32 rather than hash() so columns agree across processes
+                    column = len(vocabulary) + zlib.crc32(label.encode('utf-8')) % buckets
+                rows.append(row)
+                columns.append(column)
+            blocks.append(csr_matrix(
+                (np.full(len(rows), self.weights[name], dtype=np.float32), (rows, columns)),
+                shape=(n_rows, len(vocabulary) + buckets)
+            ))
+
+        return hstack(blocks, format='csr', dtype=np.float32)
+
+    def fit_transform(self, products):
+        return self.fit(products).transform(products)
+
+    @staticmethod
+    def _numeric(products):
+        values = np.array(
+            [[float(product.get(name) or 0) for name in NUMERIC_FEATURES] for product in products],
+            dtype=np.float64
+        ).reshape(len(products), len(NUMERIC_FEATURES))
+        for name in LOG_FEATURES:
+            column = NUMERIC_FEATURES.index(name)
+            values[:, column] = np.log1p(np.maximum(values[:, column], 0))
+        return values
+
+    @staticmethod
+    def _label(product, name):
+        value = product.get(name)
+        return str(value) if value is not None else ''
@@ -0,0 +1,80 @@
+"""Sampling profiler for a running worker.
+
+A background thread snapshots every other thread's Python stack with
+sys._current_frames() at a fixed interval and counts identical stacks.
+The result is in the folded format read by flamegraph.pl and speedscope:
+one `thread;outer;...;inner count` line per distinct stack. Sampling
+costs one stack walk per thread per interval and nothing when stopped.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Collects folded stacks while running; one profile at a time per process"""
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.ignore = set()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, ignore=(), interval=None):
+        """Start sampling; threads whose idents are in ignore (e.g. the caller) are skipped"""
+        with self.lock:
+            if self.running:
+                raise RuntimeError('Profiler is already running')
+            if interval is not None:
+                self.interval = interval
+            self.stacks = Counter()
+            self.samples = 0
+            self.ignore = set(ignore)
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop sampling and return the folded stacks"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        return self.folded()
+
+    def profile(self, seconds, interval=None):
+        """Sample the other threads of this process for seconds and return the folded stacks"""
+        self.start(ignore={threading.get_ident()}, interval=interval)
+        self.stop_event.wait(seconds)
+        return self.stop()
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self.ignore:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
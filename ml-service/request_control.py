@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised by AdmissionControl.admit() when a request is shed"""
+
+
+class SingleFlight:
+    """Shares one in-flight computation among identical concurrent requests.
+
+    The first request for a key submits the work to the executor; requests
+    for the same key arriving before it finishes get the same future. The
+    key is forgotten once the work is done, so results are never served
+    from here after the fact (that is the result cache's job).
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def submit(self, key, function, *args):
+        with self.lock:
+            future = self.flights.get(key)
+            if future is not None:
+                self.followers += 1
+                return future
+            future = self.executor.submit(function, *args)
+            self.flights[key] = future
+            self.leaders += 1
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    def stats(self):
+        with self.lock:
+            return {'inFlight': len(self.flights), 'computed': self.leaders, 'coalesced': self.followers}
+
+    def _finish(self, key, future):
+        with self.lock:
+            if self.flights.get(key) is future:
+                del self.flights[key]
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop.
+
+    The first request for a key starts the coroutine as a task; identical
+    requests arriving before it finishes await the same task. Callers that
+    give up should await it through asyncio.shield() so the task keeps
+    running for the others (and the result cache).
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def submit(self, key, function, *args):
+        task = self.flights.get(key)
+        if task is not None:
+            self.followers += 1
+            return task
+        task = asyncio.ensure_future(function(*args))
+        self.flights[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    def stats(self):
+        return {'inFlight': len(self.flights), 'computed': self.leaders, 'coalesced': self.followers}
+
+    def _finish(self, key, task):
+        if self.flights.get(key) is task:
+            del self.flights[key]
+        # Every waiter may have timed out; mark a failure as retrieved so it is not logged as lost
+        if not task.cancelled():
+            task.exception()
+
+
+class AdmissionControl:
+    """Bounds the requests waiting on scoring; past max_pending new ones are shed.
+
+    Admitted requests wait at most their deadline budget, but the work they
+    gave up on keeps running, so backlog() (e.g. computations in flight) is
+    held to the same bound. Together they keep the queue, and with it
+    latency, from growing without limit under overload. max_pending=0
+    admits everything.
+    """
+
+    def __init__(self, max_pending=256, backlog=None):
+        self.max_pending = max_pending
+        self.backlog = backlog or (lambda: 0)
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.shed = 0
+        self.fallbacks = 0
+
+    @contextmanager
+    def admit(self):
+        with self.lock:
+            if self.max_pending and max(self.pending, self.backlog()) >= self.max_pending:
+                self.shed += 1
+                raise Overloaded(f'{self.pending} requests already waiting')
+            self.pending += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def record_fallback(self):
+        """Count a request answered with the fallback after missing its deadline"""
+        with self.lock:
+            self.fallbacks += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': self.pending,
+                'maxPending': self.max_pending,
+                'shed': self.shed,
+                'deadlineFallbacks': self.fallbacks
+            }
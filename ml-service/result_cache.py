@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Bounded LRU cache with a TTL for per-user recommendation results.
+
+    Entries belong to one model generation: the first lookup or store for a
+    newer generation drops everything cached for the previous one, so a
+    freshly published model is never answered from stale results.
+    max_entries=0 disables caching.
+    """
+
+    def __init__(self, max_entries=100000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, generation):
+        """Cached value for key under generation, or None"""
+        if not self.max_entries:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            self._check_generation(generation)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self.entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, generation, value):
+        if not self.max_entries:
+            return
+        with self.lock:
+            self._check_generation(generation)
+            if generation != self.generation:
+                # Computed on an older model that has since been replaced
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Counters for the status endpoints"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'entries': len(self.entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else None,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _check_generation(self, generation):
+        # Generations only move forward; a late request on an old snapshot
+        # must not wipe the entries of the newer one
+        if self.generation is None or generation > self.generation:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.generation = generation
@@ -0,0 +1,98 @@
+"""Recent activity of live sessions, fed by POST /events.
+
+Trained models only know users and sessions seen before the last /train,
+so a new shopper gets trending products however much they browse. The
+backend forwards each tracked event here as it happens; every session
+keeps a ring buffer of its last max_items (product, event type, time)
+entries, which the engines expand through item neighbors on the next
+request. Sessions are kept in least-recently-active order and evicted
+when idle past idle_seconds or beyond max_sessions, so memory stays
+bounded however many anonymous visitors there are.
+
+The buffer lives in one process: behind several gunicorn workers each
+worker only sees the events forwarded to it, and callers should fall back
+to the stored events when a session has none here.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class SessionActivity:
+    """Per-session ring buffers of recent events, with LRU eviction of idle sessions"""
+
+    def __init__(self, max_sessions=100000, max_items=50, idle_seconds=1800):
+        self.max_sessions = max_sessions
+        self.max_items = max_items
+        self.idle_seconds = idle_seconds
+        # session ID -> [deque of (product ID, event type, timestamp), events recorded, last event time]
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.recorded = 0
+        self.evicted = 0
+
+    def record(self, session_id, product_id, event_type, timestamp=None):
+        """Append one event to a session's buffer"""
+        timestamp = timestamp or time.time()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = [deque(maxlen=self.max_items), 0, timestamp]
+            else:
+                self.sessions.move_to_end(session_id)
+            # IDs repeat across sessions; keep one string per product
+            session[0].append((sys.intern(product_id), event_type, timestamp))
+            session[1] += 1
+            session[2] = timestamp
+            self.recorded += 1
+            self._evict(timestamp)
+
+    def recent(self, session_id):
+        """(product ID, event type, timestamp) of a session's buffered events, newest first"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or self._idle(session, time.time()):
+                return []
+            return list(reversed(session[0]))
+
+    def version(self, session_id):
+        """Events recorded for a session so far; changes whenever its buffer does"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return session[1] if session is not None else 0
+
+    def seed_weights(self, session_id, event_weights, decay=0.85):
+        """Weight per buffered product: event weight, decayed by recency, summed.
+
+        The newest event counts in full and each older one decay times less,
+        so the products a shopper is looking at now dominate. Products are
+        in order of their latest event, newest first.
+        """
+        weights = {}
+        for position, (product_id, event_type, _) in enumerate(self.recent(session_id)):
+            weights[product_id] = weights.get(product_id, 0) + event_weights.get(event_type, 1) * decay ** position
+        return weights
+
+    def stats(self):
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'maxSessions': self.max_sessions,
+                'maxItems': self.max_items,
+                'idleSeconds': self.idle_seconds,
+                'recorded': self.recorded,
+                'evicted': self.evicted
+            }
+
+    def _idle(self, session, now):
+        return self.idle_seconds and now - session[2] > self.idle_seconds
+
+    def _evict(self, now):
+        # Least recently active first, so stop at the first session still in use
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if len(self.sessions) <= self.max_sessions and not self._idle(session, now):
+                break
+            self.sessions.popitem(last=False)
+            self.evicted += 1
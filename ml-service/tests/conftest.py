@@ -0,0 +1,44 @@
+"""Fixtures shared by the ML service tests.
+
+Tests run the real engine against mongomock, filled with a small dataset
+from benchmarks/synthetic.py. Usage (from ml-service/):
+    pip install -r requirements.txt -r tests/requirements.txt
+    python -m pytest tests
+"""
+import os
+import sys
+
+import mongomock
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+from benchmarks.synthetic import populate  # noqa: E402
+
+SCALE = {'users': 200, 'sessions': 400, 'products': 150, 'categories': 6, 'events': 6000}
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """app.py on a fresh mongomock database and model directory, with fast training settings"""
+    import app
+
+    db = mongomock.MongoClient()['ecommerce']
+    populate(db, SCALE, seed=7, days=30)
+    monkeypatch.setattr(app, 'db', db)
+    monkeypatch.setattr(app, 'MODEL_DIR', str(tmp_path / 'models'))
+    monkeypatch.setattr(app, 'ALS_ITERATIONS', 2)
+    monkeypatch.setattr(app, 'ALS_INCREMENTAL_ITERATIONS', 1)
+    monkeypatch.setattr(app, 'NEIGHBOR_PROCESSES', 1)
+    return app
+
+
+@pytest.fixture
+def engine(service, monkeypatch):
+    """A fully trained engine, also serving the app's routes"""
+    engine = service.RecommendationEngine()
+    engine.train('full')
+    monkeypatch.setattr(service, 'engine', engine)
+    return engine
@@ -0,0 +1,48 @@
+"""IVF index results against its own exact search."""
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from ann_index import IVFIndex
+
+
+@pytest.fixture
+def vectors():
+    # Clustered rows, like product features: 20 centers plus noise
+    rng = np.random.default_rng(5)
+    centers = rng.normal(size=(20, 32))
+    return (centers[rng.integers(0, 20, 2000)] + 0.3 * rng.normal(size=(2000, 32))).astype(np.float32)
+
+
+def test_probing_every_list_is_exact(vectors):
+    index = IVFIndex(n_lists=16).fit(vectors)
+    for query in vectors[:20]:
+        np.testing.assert_array_equal(index.search(query, 10, n_probe=16), index.exact_search(query, 10))
+
+
+def test_recall_grows_with_n_probe(vectors):
+    index = IVFIndex(n_lists=32).fit(vectors)
+    queries = vectors[::50]
+    low, high = index.recall_at_k(queries, 10, n_probe=1), index.recall_at_k(queries, 10, n_probe=8)
+    assert low <= high
+    assert high >= 0.9
+
+
+def test_exclude_and_allowed_filter_rows(vectors):
+    index = IVFIndex(n_lists=16).fit(vectors)
+    query = vectors[0]
+    exact = index.exact_search(query, 5)
+
+    assert not set(index.search(query, 5, n_probe=16, exclude=exact[:2])) & set(exact[:2])
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[1::2] = True
+    result = index.search(query, 5, n_probe=16, allowed=allowed)
+    assert len(result) == 5 and allowed[result].all()
+
+
+def test_sparse_input_and_round_trip():
+    features = sparse_random(300, 50, density=0.1, format='csr', dtype=np.float32, random_state=2)
+    index = IVFIndex(n_lists=8).fit(features)
+    restored = IVFIndex.from_arrays(index.to_arrays(), n_probe=8)
+    for row in range(0, 300, 30):
+        np.testing.assert_array_equal(restored.search(features[row], 5), index.search(features[row], 5, n_probe=8))
@@ -0,0 +1,28 @@
+"""Batch scoring must agree with the single-user hybrid path."""
+import json
+
+
+def test_batch_matches_single_user(engine):
+    user_ids = engine.model.user_ids.tolist()[:60]
+    for result in engine.batch_recommendations(user_ids, 10, block_size=16):
+        expected = engine.hybrid_recommendations(result['userId'], 10)
+        if result['method'] == 'hybrid':
+            assert result['productIds'][:len(expected)] == expected
+
+
+def test_batch_route_streams_one_line_per_user(service, engine):
+    user_ids = engine.model.user_ids.tolist()[:5] + ['unknown-user']
+    response = service.app.test_client().post(
+        '/recommendations/personalized/batch', json={'userIds': user_ids, 'limit': 4}
+    )
+
+    assert response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result['userId'] for result in results] == user_ids
+    assert all(len(result['productIds']) == 4 for result in results)
+    assert results[-1]['method'] == 'cold_start'
+
+
+def test_batch_route_requires_users(service, engine):
+    response = service.app.test_client().post('/recommendations/personalized/batch', json={})
+    assert response.status_code == 400
@@ -0,0 +1,101 @@
+"""Eligibility masks over a model's products, kept in step with `products`."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import mongomock
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from clock import utc_now
+from eligibility import ProductEligibility
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()['ecommerce']
+    db.products.insert_many([
+        {'_id': 'shoe', 'status': 'Published', 'stock': 3, 'category': 'shoes', 'updatedAt': NOW},
+        {'_id': 'bag', 'status': 'Published', 'stock': 1, 'category': 'bags', 'updatedAt': NOW},
+        {'_id': 'sold-out', 'status': 'Published', 'stock': 0, 'category': 'shoes', 'updatedAt': NOW},
+        {'_id': 'draft', 'status': 'Draft', 'stock': 5, 'category': 'bags', 'updatedAt': NOW},
+    ])
+    return db
+
+
+def model(generation=1):
+    """Stand-in for a ModelSnapshot: product columns, content rows in another order"""
+    return SimpleNamespace(
+        generation=generation,
+        product_ids=np.array(['shoe', 'bag', 'sold-out', 'draft', 'not-in-catalog']),
+        item_ids=np.array(['draft', 'shoe']),
+    )
+
+
+def update(db, product_id, minutes=1, **fields):
+    db.products.update_one(
+        {'_id': product_id}, {'$set': dict(fields, updatedAt=NOW + timedelta(minutes=minutes))}, upsert=True
+    )
+
+
+def test_masks_follow_status_stock_and_category(db):
+    eligibility = ProductEligibility()
+    eligibility.ensure_fresh(db.products)
+
+    masks = eligibility.masks(model())
+    assert masks.products.tolist() == [True, True, False, False, False]
+    assert masks.items.tolist() == [False, True]
+    assert eligibility.masks(model(), 'bags').products.tolist() == [False, True, False, False, False]
+    assert not eligibility.masks(model(), 'unknown').products.any()
+
+    assert eligibility.allows('shoe') and eligibility.allows('shoe', 'shoes')
+    assert not eligibility.allows('shoe', 'bags') and not eligibility.allows('draft')
+    assert eligibility.stats()['eligible'] == 2
+
+
+def test_delta_refresh_updates_masks(db):
+    eligibility = ProductEligibility()
+    eligibility.ensure_fresh(db.products)
+    masks = eligibility.masks(model())
+    version = eligibility.stats()['version']
+
+    # Nothing changed: the same masks are served
+    eligibility.refresh(db.products)
+    assert eligibility.masks(model()) is masks
+
+    update(db, 'shoe', status='Archived')
+    update(db, 'draft', status='Published')
+    update(db, 'not-in-catalog', status='Published', stock=2, category='bags')
+    eligibility.refresh(db.products)
+
+    assert eligibility.stats()['version'] == version + 1
+    assert eligibility.masks(model()).products.tolist() == [False, True, False, True, True]
+    assert eligibility.masks(model()).items.tolist() == [True, False]
+
+
+def test_full_reload_drops_deleted_products(db):
+    eligibility = ProductEligibility(full_reload_seconds=0)
+    eligibility.ensure_fresh(db.products)
+    assert eligibility.masks(model()).products[1]
+
+    db.products.delete_one({'_id': 'bag'})
+    eligibility.refresh(db.products)
+    assert eligibility.masks(model()).products.tolist() == [True, False, False, False, False]
+
+
+def test_recommendations_skip_products_made_ineligible(service, engine, monkeypatch):
+    monkeypatch.setattr(service, 'PERSONALIZED_BUDGET_MS', 0)
+    client = service.app.test_client()
+    user_id = engine.model.user_ids[0]
+    before = client.post('/recommendations/personalized', json={'userId': user_id}).get_json()['productIds']
+
+    later = utc_now() + timedelta(seconds=1)
+    for product_id in before[:3]:
+        service.db.products.update_one({'_id': ObjectId(product_id)}, {'$set': {'status': 'Archived', 'updatedAt': later}})
+    engine.eligibility.refresh(service.db.products, service.db.categories)
+
+    after = client.post('/recommendations/personalized', json={'userId': user_id}).get_json()['productIds']
+    assert len(after) == len(before)
+    assert not set(after) & set(before[:3])
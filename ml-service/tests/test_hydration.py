@@ -0,0 +1,59 @@
+"""Hydrated responses: product summaries aligned with productIds."""
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from product_catalog import ProductCatalog
+
+
+@pytest.fixture
+def products():
+    db = mongomock.MongoClient()['ecommerce']
+    db.categories.insert_one({'_id': 'shoes', 'name': 'Shoes'})
+    db.products.insert_many([
+        {'_id': 'shoe', 'name': 'Runner', 'description': 'x' * 500, 'price': 50, 'discount': 10, 'stock': 3,
+         'images': ['runner.jpg', 'side.jpg'], 'category': 'shoes', 'status': 'Published',
+         'updatedAt': datetime(2024, 6, 1)},
+        {'_id': 'draft', 'name': 'Draft', 'status': 'Draft', 'updatedAt': datetime(2024, 6, 1)},
+    ])
+    catalog = ProductCatalog()
+    catalog.ensure_fresh(db.products, db.categories)
+    return catalog
+
+
+def test_summaries_stay_aligned_with_ids(products):
+    shoe, unknown, draft = products.summaries(['shoe', 'unknown', 'draft'])
+
+    assert shoe['name'] == 'Runner' and shoe['images'] == ['runner.jpg']
+    assert shoe['category'] == {'_id': 'shoes', 'name': 'Shoes'}
+    assert len(shoe['description']) == 200
+    assert unknown is None
+    assert draft['name'] == 'Draft' and draft['images'] == [] and draft['category'] is None
+    assert products.summaries(['shoe', 'draft'], published_only=True)[1] is None
+
+
+def test_routes_hydrate_on_request(service, engine, monkeypatch):
+    monkeypatch.setattr(service, 'PERSONALIZED_BUDGET_MS', 0)
+    client = service.app.test_client()
+    names = {str(product['_id']): product['name'] for product in service.db.products.find({}, {'name': 1})}
+    requests = [
+        ('/recommendations/personalized', {'userId': engine.model.user_ids[0]}),
+        ('/recommendations/trending', {}),
+        ('/recommendations/also-viewed', {'productId': engine.model.product_ids[0]}),
+    ]
+    for path, body in requests:
+        assert 'products' not in client.post(path, json=body).get_json()
+
+        response = client.post(path, json=dict(body, hydrate=True)).get_json()
+        assert response['productIds']
+        assert [product['_id'] for product in response['products']] == response['productIds']
+        assert [product['name'] for product in response['products']] == \
+            [names[product_id] for product_id in response['productIds']]
+
+
+def test_unknown_ids_keep_their_slot(engine):
+    product_id = engine.model.product_ids[0]
+    hydrated = engine.hydrate({'productIds': ['unknown', product_id]})
+    assert hydrated['products'][0] is None
+    assert hydrated['products'][1]['_id'] == product_id
@@ -0,0 +1,87 @@
+"""Single-flight coalescing and admission control for personalized requests."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from request_control import AdmissionControl, AsyncSingleFlight, Overloaded, SingleFlight
+
+
+def test_identical_requests_share_one_computation():
+    release = threading.Event()
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        flights = SingleFlight(executor)
+        first, second = flights.submit('key', compute, 21), flights.submit('key', compute, 21)
+        other = flights.submit('other', compute, 1)
+        assert first is second
+        release.set()
+        assert (first.result(5), other.result(5)) == (42, 2)
+
+        # Once done (callbacks run just after result() returns), the key is
+        # forgotten and the next request computes again
+        while flights.stats()['inFlight']:
+            time.sleep(0.001)
+        assert flights.submit('key', compute, 21).result(5) == 42
+    assert sorted(calls) == [1, 21, 21]
+    assert flights.stats() == {'inFlight': 0, 'computed': 3, 'coalesced': 1}
+
+
+def test_async_requests_share_one_task():
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        if value < 0:
+            raise ValueError(value)
+        return value * 2
+
+    async def main():
+        flights = AsyncSingleFlight()
+        results = await asyncio.gather(*(flights.submit('key', compute, 21) for _ in range(3)))
+        with pytest.raises(ValueError):
+            await asyncio.gather(flights.submit('bad', compute, -1), flights.submit('bad', compute, -1))
+        return results, flights.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == [42, 42, 42]
+    assert calls == [21, -1]
+    assert stats == {'inFlight': 0, 'computed': 2, 'coalesced': 3}
+
+
+def test_requests_past_max_pending_are_shed():
+    admission = AdmissionControl(max_pending=2)
+    with admission.admit(), admission.admit():
+        with pytest.raises(Overloaded):
+            with admission.admit():
+                pass
+    # Slots are released when requests finish
+    with admission.admit():
+        assert admission.stats()['pending'] == 1
+    assert admission.stats()['shed'] == 1
+
+
+def test_backlog_counts_against_max_pending():
+    backlog = [2]
+    admission = AdmissionControl(max_pending=2, backlog=lambda: backlog[0])
+    with pytest.raises(Overloaded):
+        with admission.admit():
+            pass
+    backlog[0] = 1
+    with admission.admit():
+        pass
+
+
+def test_zero_max_pending_admits_everything():
+    admission = AdmissionControl(max_pending=0, backlog=lambda: 1000)
+    with admission.admit(), admission.admit():
+        assert admission.stats()['pending'] == 2
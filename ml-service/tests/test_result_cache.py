@@ -0,0 +1,56 @@
+"""Result cache keyed by model generation, with LRU eviction and a TTL."""
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable stand-in for time.monotonic() in result_cache"""
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_newer_generation_drops_older_entries():
+    cache = ResultCache()
+    cache.put('user', 1, ['a'])
+    assert cache.get('user', 1) == ['a']
+
+    assert cache.get('user', 2) is None
+    cache.put('other', 2, ['b'])
+    assert cache.stats()['invalidations'] == 1
+
+    # A late request still on generation 1 neither reads nor wipes generation 2
+    assert cache.get('other', 1) == ['b']
+    cache.put('user', 1, ['stale'])
+    assert cache.get('user', 2) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(ttl=60)
+    cache.put('user', 1, ['a'])
+    clock[0] += 59
+    assert cache.get('user', 1) == ['a']
+    clock[0] += 2
+    assert cache.get('user', 1) is None
+    assert cache.stats()['expired'] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1, 'a')
+    cache.put('b', 1, 'b')
+    cache.get('a', 1)
+    cache.put('c', 1, 'c')
+    assert cache.get('b', 1) is None
+    assert (cache.get('a', 1), cache.get('c', 1)) == ('a', 'c')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_zero_entries_disables_caching():
+    cache = ResultCache(max_entries=0)
+    cache.put('user', 1, ['a'])
+    assert cache.get('user', 1) is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,70 @@
+"""Recent-activity buffers of live sessions."""
+import pytest
+
+import session_activity
+from session_activity import SessionActivity
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable stand-in for time.time() in session_activity"""
+    now = [1000.0]
+    monkeypatch.setattr(session_activity.time, 'time', lambda: now[0])
+    return now
+
+
+def test_buffer_keeps_the_newest_events(clock):
+    sessions = SessionActivity(max_items=3)
+    for product_id in 'abcd':
+        sessions.record('s1', product_id, 'view')
+
+    assert [product_id for product_id, _, _ in sessions.recent('s1')] == ['d', 'c', 'b']
+    assert sessions.version('s1') == 4
+    assert sessions.recent('unknown') == [] and sessions.version('unknown') == 0
+
+
+def test_seed_weights_decay_with_age(clock):
+    sessions = SessionActivity()
+    sessions.record('s1', 'a', 'purchase')
+    sessions.record('s1', 'b', 'view')
+    sessions.record('s1', 'a', 'view')
+
+    weights = sessions.seed_weights('s1', {'purchase': 10, 'view': 1}, decay=0.5)
+    assert list(weights) == ['a', 'b']
+    assert weights == {'a': pytest.approx(1 + 10 * 0.25), 'b': pytest.approx(0.5)}
+
+
+def test_idle_sessions_are_hidden_and_evicted(clock):
+    sessions = SessionActivity(idle_seconds=60)
+    sessions.record('old', 'a', 'view')
+    clock[0] += 61
+    assert sessions.recent('old') == []
+
+    sessions.record('new', 'b', 'view')
+    assert sessions.stats()['sessions'] == 1 and sessions.stats()['evicted'] == 1
+
+
+def test_least_recently_active_session_is_evicted(clock):
+    sessions = SessionActivity(max_sessions=2)
+    sessions.record('s1', 'a', 'view')
+    sessions.record('s2', 'b', 'view')
+    sessions.record('s1', 'c', 'view')
+    sessions.record('s3', 'd', 'view')
+
+    assert sessions.recent('s2') == []
+    assert [product_id for product_id, _, _ in sessions.recent('s1')] == ['c', 'a']
+    assert sessions.stats()['evicted'] == 1
+
+
+def test_forwarded_events_drive_recommendations_for_new_sessions(service, engine, monkeypatch):
+    monkeypatch.setattr(service, 'PERSONALIZED_BUDGET_MS', 0)
+    client = service.app.test_client()
+    seeds = engine.model.product_ids[:2].tolist()
+    events = [{'sessionId': 'session_new', 'productId': product_id, 'eventType': 'view'} for product_id in seeds]
+
+    response = client.post('/events', json={'events': events + [{'sessionId': 'session_new'}]})
+    assert response.status_code == 202 and response.get_json() == {'accepted': 2}
+
+    result = client.post('/recommendations/personalized', json={'sessionId': 'session_new'}).get_json()
+    assert result['method'] == 'session'
+    assert len(result['productIds']) == 10
@@ -0,0 +1,124 @@
+"""Incremental training must end where a full rebuild over the same window does."""
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from clock import utc_now
+
+
+def interactions(model, matrix):
+    """{(user ID, product ID): weight} of a model's user-item shaped matrix"""
+    coo = matrix.tocoo()
+    return {
+        (model.user_ids[row], model.product_ids[col]): round(float(value), 4)
+        for row, col, value in zip(coo.row, coo.col, coo.data)
+    }
+
+
+def neighbor_similarities(model):
+    """{user ID: sorted similarities of its precomputed neighbors}"""
+    neighbors, similarities = model.user_neighbors
+    return {
+        user_id: sorted(np.round(similarities[row][neighbors[row] >= 0], 4).tolist())
+        for row, user_id in enumerate(model.user_ids.tolist())
+        if len(model.user_item_matrix[row].indices)
+    }
+
+
+def full_rebuild(service, until, directory):
+    """A fresh engine's full training run over the window ending at until"""
+    service.MODEL_DIR = str(directory)
+    engine = service.RecommendationEngine()
+    engine.train('full', until)
+    return engine
+
+
+def assert_same_model(incremental, full):
+    assert len(incremental.events) == len(full.events)
+    assert interactions(incremental.model, incremental.model.user_item_matrix) == \
+        interactions(full.model, full.model.user_item_matrix)
+    for event_type, matrix in full.model.event_matrices.items():
+        assert interactions(incremental.model, incremental.model.event_matrices[event_type]) == \
+            interactions(full.model, matrix)
+    assert neighbor_similarities(incremental.model) == neighbor_similarities(full.model)
+
+
+@pytest.fixture
+def window(service, monkeypatch):
+    """(first, second) training ends 3 days apart in a 20 day window, so the second run expires events"""
+    monkeypatch.setattr(service, 'TRAINING_WINDOW_DAYS', 20)
+    second = utc_now()
+    return second - timedelta(days=3), second
+
+
+def test_incremental_matches_full_rebuild(service, window, tmp_path):
+    first, second = window
+    engine = service.RecommendationEngine()
+    engine.train('full', first)
+    stats = engine.train('incremental', second)
+
+    assert stats['mode'] == 'incremental'
+    assert stats['newEvents'] > 0 and stats['expiredEvents'] > 0
+    assert_same_model(engine, full_rebuild(service, second, tmp_path / 'full'))
+
+
+def test_failed_incremental_run_leaves_training_state(service, window, tmp_path, monkeypatch):
+    first, second = window
+    engine = service.RecommendationEngine()
+    engine.train('full', first)
+    events, watermark, generation = len(engine.events), engine.watermark, engine.model.generation
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('neighbor update failed')
+
+    update_user_neighbors = service.update_user_neighbors
+    monkeypatch.setattr(service, 'update_user_neighbors', fail)
+    with pytest.raises(RuntimeError):
+        engine.train('incremental', second)
+    assert (len(engine.events), engine.watermark, engine.model.generation) == (events, watermark, generation)
+
+    # The retry folds in the same events exactly once
+    monkeypatch.setattr(service, 'update_user_neighbors', update_user_neighbors)
+    engine.train('incremental', second)
+    assert_same_model(engine, full_rebuild(service, second, tmp_path / 'full'))
+
+
+def test_incremental_after_reload_matches_full_rebuild(service, window, tmp_path):
+    first, second = window
+    service.RecommendationEngine().train('full', first)
+
+    # A new process: the model and event log are memory-mapped from MODEL_DIR
+    engine = service.RecommendationEngine()
+    assert engine.load_model(with_training_state=True)
+    engine.train('incremental', second)
+    assert_same_model(engine, full_rebuild(service, second, tmp_path / 'full'))
+
+
+def test_incremental_after_foreign_hot_swap_matches_full_rebuild(service, window, tmp_path):
+    first, second = window
+    worker_a, worker_b = service.RecommendationEngine(), service.RecommendationEngine()
+    worker_b.train('full', first - timedelta(days=3))
+    worker_a.train('incremental', first)
+
+    # The watcher swaps in the version worker A published, without its event log
+    assert worker_b.load_model(with_training_state=False)
+    stats = worker_b.train('incremental', second)
+
+    assert stats['mode'] == 'incremental'
+    assert_same_model(worker_b, full_rebuild(service, second, tmp_path / 'full'))
+
+
+def test_incremental_with_foreign_event_log_trains_full(service, window, tmp_path, monkeypatch):
+    first, second = window
+    worker_a, worker_b = service.RecommendationEngine(), service.RecommendationEngine()
+    worker_b.train('full', first - timedelta(days=3))
+    worker_a.train('incremental', first)
+    assert worker_b.load_model(with_training_state=False)
+
+    # Even without the reload, the stale event log is never folded into worker A's model
+    monkeypatch.setattr(worker_b, 'sync_training_state', lambda: None)
+    stats = worker_b.train('incremental', second)
+
+    assert stats['mode'] == 'full'
+    assert_same_model(worker_b, full_rebuild(service, second, tmp_path / 'full'))
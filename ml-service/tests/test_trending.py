@@ -0,0 +1,74 @@
+"""Trending windows, weights and categories from the in-memory counters."""
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import trending
+from trending import TrendingCounters, parse_window
+
+NOW = datetime(2024, 6, 1, 12, 30)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable stand-in for utc_now() in trending"""
+    now = [NOW]
+    monkeypatch.setattr(trending, 'utc_now', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()['ecommerce']
+    db.products.insert_many([
+        {'_id': 'recent', 'category': 'shoes', 'updatedAt': NOW},
+        {'_id': 'older', 'category': 'bags', 'updatedAt': NOW},
+    ])
+    events = [('recent', 'view', 2)] * 4 + [('older', 'purchase', 30)]
+    db.events.insert_many([
+        {'productId': product_id, 'eventType': event_type, 'createdAt': NOW - timedelta(hours=hours)}
+        for product_id, event_type, hours in events
+    ])
+    return db
+
+
+def test_parse_window():
+    assert [parse_window(window) for window in (6, '24h', '7d', '12')] == [6, 24, 168, 12]
+
+
+def test_windows_weights_and_categories(db, clock):
+    counters = TrendingCounters(max_hours=7 * 24)
+    counters.ensure_fresh(db.events, db.products)
+
+    assert counters.top(window='24h') == ['recent']
+    # One purchase (10) outweighs four views (4) over the whole week
+    assert counters.top(window='7d') == ['older', 'recent']
+    assert counters.top(weights={'view': 1}) == ['recent']
+    assert counters.top(category='bags') == ['older']
+    assert counters.top(allowed=lambda product_id: product_id != 'older') == ['recent']
+
+
+def test_refresh_folds_in_new_events_once(db, clock):
+    counters = TrendingCounters(max_hours=7 * 24)
+    counters.ensure_fresh(db.events, db.products)
+
+    clock[0] += timedelta(minutes=10)
+    db.events.insert_many([
+        {'productId': 'older', 'eventType': 'view', 'createdAt': NOW + timedelta(minutes=5)} for _ in range(3)
+    ])
+    counters.refresh(db.events, db.products)
+    counters.refresh(db.events, db.products)
+
+    # Three new views of 'older' against four of 'recent'; counted twice they would be six
+    assert counters.top(window='24h') == ['recent', 'older']
+
+
+def test_events_leave_the_ring(db, clock):
+    counters = TrendingCounters(max_hours=24)
+    counters.ensure_fresh(db.events, db.products)
+    assert counters.top() == ['recent']
+
+    clock[0] += timedelta(hours=23)
+    counters.refresh(db.events, db.products)
+    assert counters.top() == []
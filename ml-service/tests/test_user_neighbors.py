@@ -0,0 +1,60 @@
+"""Precomputed user neighbors against a brute-force cosine top-k and live scoring."""
+import copy
+
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from user_neighbors import build_user_neighbors, update_user_neighbors
+
+K = 5
+
+
+@pytest.fixture
+def user_items():
+    return sparse_random(120, 60, density=0.05, format='csr', dtype=np.float32, random_state=3)
+
+
+def brute_force(user_items, k):
+    dense = user_items.toarray()
+    norms = np.linalg.norm(dense, axis=1)
+    norms[norms == 0] = 1
+    similarities = (dense @ dense.T) / np.outer(norms, norms)
+    np.fill_diagonal(similarities, 0)
+    return -np.sort(-similarities, axis=1)[:, :k]
+
+
+def test_neighbors_match_brute_force(user_items):
+    neighbors, similarities = build_user_neighbors(user_items, k=K, processes=1)
+    np.testing.assert_allclose(similarities, brute_force(user_items, K), atol=1e-5)
+    assert ((neighbors >= 0) == (similarities > 0)).all()
+
+
+def test_process_pool_matches_serial(user_items):
+    serial = build_user_neighbors(user_items, k=K, processes=1)
+    pooled = build_user_neighbors(user_items, k=K, block_size=16, processes=2)
+    np.testing.assert_array_equal(serial[0], pooled[0])
+    np.testing.assert_allclose(serial[1], pooled[1])
+
+
+def test_update_matches_rebuild(user_items):
+    index = build_user_neighbors(user_items, k=K, processes=1)
+    updated = user_items.tolil()
+    updated[[2, 40], [7, 13]] = 1
+    updated = updated.tocsr()
+
+    neighbors, similarities = update_user_neighbors(index, user_items, updated, np.array([2, 40]), k=K, processes=1)
+    np.testing.assert_allclose(similarities, brute_force(updated, K), atol=1e-5)
+    # The published index is left untouched
+    np.testing.assert_array_equal(index[1], build_user_neighbors(user_items, k=K, processes=1)[1])
+
+
+def test_precomputed_neighbors_match_live(engine):
+    model = engine.model
+    live = copy.copy(model)
+    live.user_neighbors = None
+    for row in range(len(model.user_ids)):
+        # Equal similarities may come in either order
+        _, precomputed = engine.similar_users(row, 10, model=model)
+        _, computed = engine.similar_users(row, 10, model=live)
+        np.testing.assert_allclose(precomputed, computed, rtol=1e-5)
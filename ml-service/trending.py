@@ -0,0 +1,154 @@
+"""Sliding-window trending scores kept in memory.
+
+Event counts are bucketed per hour in a ring of max_hours buckets and
+refreshed incrementally from events newer than a createdAt watermark, so
+serving trending products never runs an aggregation over `events`.
+Rankings for each (window, weights, category) are computed once per
+refresh and answered from the cached sorted list until the next one.
+
+Pure Python on purpose: app-simple.py uses it without NumPy.
+"""
+from collections import defaultdict
+from itertools import islice
+from datetime import timedelta
+
+from background_refresh import BackgroundRefresh
+from clock import EPOCH, INGEST_LAG, utc_now
+
+# Weights of the original 7-day trending aggregation
+DEFAULT_WEIGHTS = {'purchase': 10, 'add_to_cart': 3, 'view': 1}
+
+# Distinct (window, weights, category) rankings kept between refreshes
+MAX_RANKINGS = 256
+
+
+def parse_window(window):
+    """Hours in a window given as an int or a string like '24h' or '7d'"""
+    if isinstance(window, (int, float)):
+        return int(window)
+    window = str(window).strip().lower()
+    if window.endswith('d'):
+        return int(window[:-1]) * 24
+    if window.endswith('h'):
+        return int(window[:-1])
+    return int(window)
+
+
+class TrendingCounters(BackgroundRefresh):
+    """Per-hour ring buffer of per-product event counts.
+
+    ensure_fresh(events, products) folds in events newer than the watermark
+    and rolls the window forward.
+    """
+
+    name = 'trending counters'
+
+    def __init__(self, max_hours=7 * 24, weights=None, refresh_seconds=60):
+        super().__init__(refresh_seconds)
+        self.max_hours = max_hours
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+
+        # buckets[hour % max_hours] holds {event_type: {product_id: count}} for bucket_hours[i]
+        self.buckets = [defaultdict(lambda: defaultdict(int)) for _ in range(max_hours)]
+        self.bucket_hours = [None] * max_hours
+        self.current_hour = None
+        self.watermark = None
+        self.categories = {}
+        self.products_watermark = None
+
+        self.rankings = {}
+
+    def top(self, k=10, window=None, weights=None, category=None, allowed=None):
+        """The k highest scoring product IDs over the last window hours.
+
+        weights maps event types to weights (default: self.weights);
+        category restricts results to products in that category. allowed is
+        an optional predicate on product IDs; rejected ones are skipped.
+        """
+        hours = min(parse_window(window) if window is not None else self.max_hours, self.max_hours)
+        weights = self.weights if weights is None else weights
+        key = (hours, tuple(sorted(weights.items())), str(category) if category else None)
+
+        ranking = self.rankings.get(key)
+        if ranking is None:
+            with self.lock:
+                ranking = self.rankings.get(key)
+                if ranking is None:
+                    ranking = self._rank(hours, weights, key[2])
+                    if len(self.rankings) >= MAX_RANKINGS:
+                        self.rankings.clear()
+                    self.rankings[key] = ranking
+        if allowed is None:
+            return ranking[:k]
+        return list(islice((product_id for product_id in ranking if allowed(product_id)), k))
+
+    def stats(self):
+        return {
+            'watermark': self.watermark.isoformat() + 'Z' if self.watermark else None,
+            'hours': sum(1 for hour in self.bucket_hours if hour is not None),
+            'categories': len(self.categories),
+            'rankings': len(self.rankings)
+        }
+
+    def _refresh(self, events, products):
+        until = utc_now() - INGEST_LAG
+        self._advance(self._hour(until))
+
+        since = self.watermark or until - timedelta(hours=self.max_hours)
+        cursor = events.find(
+            {'createdAt': {'$gt': since, '$lte': until}, 'productId': {'$ne': None}},
+            {'_id': 0, 'productId': 1, 'eventType': 1, 'createdAt': 1},
+            batch_size=10000
+        )
+        oldest_hour = self.current_hour - self.max_hours
+        for event in cursor:
+            hour = self._hour(event['createdAt'])
+            if hour <= oldest_hour:
+                continue
+            slot = hour % self.max_hours
+            if self.bucket_hours[slot] != hour:
+                self.buckets[slot].clear()
+                self.bucket_hours[slot] = hour
+            self.buckets[slot][event.get('eventType')][str(event['productId'])] += 1
+        self.watermark = until
+
+        # Category lookups for per-category windows, refreshed by updatedAt
+        query = {'updatedAt': {'$gt': self.products_watermark}} if self.products_watermark else {}
+        for product in products.find(query, {'category': 1, 'updatedAt': 1}):
+            self.categories[str(product['_id'])] = str(product.get('category', ''))
+            updated_at = product.get('updatedAt')
+            if updated_at and (self.products_watermark is None or updated_at > self.products_watermark):
+                self.products_watermark = updated_at
+
+        self.rankings = {}
+
+    def _advance(self, hour):
+        """Move the ring to hour, clearing buckets that fell out of the window"""
+        self.current_hour = hour
+        oldest_hour = hour - self.max_hours
+        for slot, bucket_hour in enumerate(self.bucket_hours):
+            if bucket_hour is not None and bucket_hour <= oldest_hour:
+                self.buckets[slot].clear()
+                self.bucket_hours[slot] = None
+
+    def _rank(self, hours, weights, category):
+        scores = defaultdict(float)
+        oldest_hour = self.current_hour - hours
+        for slot, bucket_hour in enumerate(self.bucket_hours):
+            if bucket_hour is None or bucket_hour <= oldest_hour:
+                continue
+            for event_type, counts in self.buckets[slot].items():
+                weight = weights.get(event_type, 0)
+                if not weight:
+                    continue
+                for product_id, count in counts.items():
+                    scores[product_id] += weight * count
+
+        if category is not None:
+            scores = {pid: score for pid, score in scores.items() if self.categories.get(pid) == category}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [product_id for product_id, score in ranked if score > 0]
+
+    @staticmethod
+    def _hour(value):
+        return int((value - EPOCH).total_seconds() // 3600)
@@ -0,0 +1,166 @@
+"""Top-k most similar users of every user, precomputed at training time.
+
+The cosine similarity between two users is their weighted overlap divided
+by the product of their row norms. For a block of user rows it is one
+sparse product with the item-major matrix, so the rows are split into
+blocks scored in a process pool, one core each. The inputs are written
+once as .npy files and memory-mapped by every worker, so only row numbers
+and the result arrays cross process boundaries. Results are dense
+(n_users, k) arrays: int32 neighbor rows padded with -1 and float32
+similarities padded with 0, best first, so serving a user's neighbors is
+one row lookup.
+
+Workers are spawned rather than forked: training runs next to request and
+watcher threads, and a forked child could inherit a lock one of them held.
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Inputs memory-mapped by a pool worker, per input directory
+_worker_inputs = {}
+
+
+def build_user_neighbors(user_items, rows=None, k=10, block_size=1024, block_nnz=20_000_000, processes=None):
+    """(neighbors, similarities) of the given user rows (default: all), shape (len(rows), k).
+
+    Blocks run on min(processes, blocks) processes, default one per CPU;
+    a single block is scored in the calling process.
+    """
+    user_items = user_items.tocsr()
+    rows = np.arange(user_items.shape[0]) if rows is None else np.asarray(rows)
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    similarities = np.zeros((len(rows), k), dtype=np.float32)
+    bounds = _blocks(user_items, rows, block_size, block_nnz)
+    processes = min(processes or os.cpu_count() or 1, len(bounds))
+
+    if processes <= 1:
+        inputs = _derive_inputs(user_items)
+        for start, end in bounds:
+            neighbors[start:end], similarities[start:end] = _block_neighbors(inputs, rows[start:end], k)
+        return neighbors, similarities
+
+    with tempfile.TemporaryDirectory(prefix='user-neighbors-') as directory:
+        _write_inputs(directory, user_items)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            blocks = (rows[start:end] for start, end in bounds)
+            results = pool.map(partial(_worker_block, directory, k), blocks)
+            for (start, end), (block_neighbors, block_similarities) in zip(bounds, results):
+                neighbors[start:end] = block_neighbors
+                similarities[start:end] = block_similarities
+    return neighbors, similarities
+
+
+def update_user_neighbors(index, previous, user_items, changed_users, k=10, block_size=1024,
+                          block_nnz=20_000_000, processes=None):
+    """Return a neighbor index with the rows whose similarities may have changed recomputed.
+
+    index is the (neighbors, similarities) pair built from previous, the
+    user-item matrix before the update; it is left untouched since it may
+    belong to a published model. Every user sharing an item with a changed
+    user, before or after the update, is recomputed.
+    """
+    if index is None:
+        return build_user_neighbors(user_items, None, k, block_size, block_nnz, processes)
+
+    # Copy, padding rows for users seen for the first time
+    neighbors, similarities = index
+    extra = user_items.shape[0] - len(neighbors)
+    neighbors = np.vstack([neighbors, np.full((extra, neighbors.shape[1]), -1, dtype=np.int32)])
+    similarities = np.vstack([similarities, np.zeros((extra, similarities.shape[1]), dtype=np.float32)])
+
+    items = np.union1d(previous[changed_users].indices, user_items[changed_users].indices)
+    affected = np.union1d(changed_users, user_items.T.tocsr()[items].indices)
+    if len(affected):
+        neighbors[affected], similarities[affected] = build_user_neighbors(
+            user_items, affected, neighbors.shape[1], block_size, block_nnz, processes
+        )
+    return neighbors, similarities
+
+
+def _blocks(user_items, rows, block_size, block_nnz):
+    """Ranges of positions in rows with at most block_size rows and about block_nnz overlap entries.
+
+    A row's overlap with other users is bounded by the summed popularity of
+    its items, so blocks of users with popular items get fewer rows.
+    """
+    popularity = np.bincount(user_items.indices, minlength=user_items.shape[1])
+    block = user_items[rows]
+    work = np.bincount(
+        np.repeat(np.arange(len(rows)), np.diff(block.indptr)), weights=popularity[block.indices], minlength=len(rows)
+    )
+    cumulative = np.concatenate([[0], np.cumsum(work)])
+    bounds = []
+    start = 0
+    while start < len(rows):
+        end = int(np.searchsorted(cumulative, cumulative[start] + block_nnz, side='right')) - 1
+        end = min(max(end, start + 1), start + block_size, len(rows))
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _derive_inputs(user_items):
+    item_users = user_items.T.tocsr()
+    norms = np.sqrt(np.asarray(user_items.multiply(user_items).sum(axis=1)).ravel())
+    return user_items, item_users, norms
+
+
+def _write_inputs(directory, user_items):
+    user_items, item_users, norms = _derive_inputs(user_items)
+    for name, matrix in (('user_items', user_items), ('item_users', item_users)):
+        for part in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(directory, f'{name}.{part}.npy'), getattr(matrix, part))
+        np.save(os.path.join(directory, f'{name}.shape.npy'), np.array(matrix.shape))
+    np.save(os.path.join(directory, 'norms.npy'), norms)
+
+
+def _read_inputs(directory):
+    def load(name):
+        return np.load(os.path.join(directory, name), mmap_mode='r')
+
+    matrices = [
+        csr_matrix(
+            tuple(load(f'{name}.{part}.npy') for part in ('data', 'indices', 'indptr')),
+            shape=tuple(load(f'{name}.shape.npy')), copy=False
+        )
+        for name in ('user_items', 'item_users')
+    ]
+    return matrices[0], matrices[1], load('norms.npy')
+
+
+def _worker_block(directory, k, rows):
+    """Pool entry point: memory-map the inputs once per process, then score a block"""
+    inputs = _worker_inputs.get(directory)
+    if inputs is None:
+        _worker_inputs.clear()
+        inputs = _worker_inputs[directory] = _read_inputs(directory)
+    return _block_neighbors(inputs, rows, k)
+
+
+def _block_neighbors(inputs, rows, k):
+    """Top-k cosine neighbors of a block of user rows, excluding each user itself"""
+    user_items, item_users, norms = inputs
+    overlap = (user_items[rows] @ item_users).tocsr()
+    overlap.sort_indices()
+    counts = np.diff(overlap.indptr)
+    row_of_entry = np.repeat(np.arange(len(rows)), counts)
+    similarities = overlap.data / (norms[overlap.indices] * norms[rows[row_of_entry]])
+    similarities[overlap.indices == rows[row_of_entry]] = 0
+
+    # Best first within each row; the rank of an entry is its offset from the row start
+    order = np.lexsort((-similarities, row_of_entry))
+    rank = np.arange(len(order)) - overlap.indptr[row_of_entry]
+    keep = (rank < k) & (similarities[order] > 0)
+
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), k), dtype=np.float32)
+    neighbors[row_of_entry[keep], rank[keep]] = overlap.indices[order][keep]
+    scores[row_of_entry[keep], rank[keep]] = similarities[order][keep]
+    return neighbors, scores